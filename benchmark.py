@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import numpy as np
+import pandas as pd
+from pymatgen.core.lattice import Lattice
+from pymatgen.core.structure import Structure
+
+# Offline benchmarks on the structures already stored in data/, no API key needed
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RECORDED_CSV = os.path.join(REPO_DIR, "data", "chalcogenides_20250106_1538.csv")
+DEFAULT_BASELINE = os.path.join(REPO_DIR, "data", "benchmark_baseline.json")
+MODEL_FEATURES = ['volume', 'density', 'nsites', 'avg_coordination', 'electronegativity_diff', 'radii_ratio']
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat=3):
+    # Best-of-n wall time, like asv/timeit, to keep noise out of the comparison
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'best_s': min(times), 'median_s': statistics.median(times)}
+
+
+def recorded_frame(limit=None):
+    df = pd.read_csv(RECORDED_CSV)
+    return df.head(limit) if limit else df
+
+
+def synthetic_structure(nsites):
+    # Zincblende ZnS conventional cell (8 sites) repeated until it has about nsites sites
+    base = Structure(
+        Lattice.cubic(5.41),
+        ['Zn'] * 4 + ['S'] * 4,
+        [[0, 0, 0], [0, 0.5, 0.5], [0.5, 0, 0.5], [0.5, 0.5, 0],
+         [0.25, 0.25, 0.25], [0.25, 0.75, 0.75], [0.75, 0.25, 0.75], [0.75, 0.75, 0.25]]
+    )
+    repeats = max(1, round((nsites / len(base)) ** (1 / 3)))
+    return base * (repeats, repeats, repeats)
+
+
+@benchmark('featurize_recorded')
+def bench_featurize_recorded(args):
+    from featurizer import featurize_dataframe
+    df = recorded_frame(args.limit)
+    result = measure(lambda: featurize_dataframe(df, n_workers=1), repeat=args.repeat)
+    result['items'] = len(df)
+    result['items_per_s'] = len(df) / result['best_s']
+    return result
+
+
+@benchmark('featurize_synthetic')
+def bench_featurize_synthetic(args):
+    from featurizer import StructureFeaturizer
+    results = {}
+    for nsites in args.nsites:
+        structure = synthetic_structure(nsites)
+        # all_sites is what featurization costs without the symmetry-orbit shortcut
+        for use_symmetry in (True, False):
+            featurizer = StructureFeaturizer(use_symmetry=use_symmetry)
+            timing = measure(lambda: featurizer.featurize(structure), repeat=args.repeat)
+            timing['nsites'] = len(structure)
+            results[f"{len(structure)}_sites_{'symmetry' if use_symmetry else 'all_sites'}"] = timing
+    return results
+
+
+@benchmark('load_formats')
+def bench_load_formats(args):
+    from featurizer import load_structure
+    from structure_store import StructureStore, write_structure_store
+
+    df = recorded_frame()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        store_path = os.path.join(tmp_dir, "store")
+        write_structure_store(df, store_path)
+        scalar_csv = os.path.join(tmp_dir, "scalars.csv")
+        df.drop(columns=['structure']).to_csv(scalar_csv, index=False)
+
+        def csv_with_structures():
+            for value in pd.read_csv(RECORDED_CSV)['structure']:
+                load_structure(value)
+
+        def store_with_structures():
+            store = StructureStore(store_path)
+            for _ in store.structures():
+                pass
+
+        return {
+            'csv_table': measure(lambda: pd.read_csv(RECORDED_CSV), repeat=args.repeat),
+            'csv_scalars_only': measure(lambda: pd.read_csv(scalar_csv), repeat=args.repeat),
+            'store_table': measure(lambda: StructureStore(store_path), repeat=args.repeat),
+            'csv_structures': measure(csv_with_structures, repeat=args.repeat),
+            'store_structures': measure(store_with_structures, repeat=args.repeat)
+        }
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+@benchmark('model')
+def bench_model(args):
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import StandardScaler
+
+    df = recorded_frame()
+    X = StandardScaler().fit_transform(df[MODEL_FEATURES].fillna(df[MODEL_FEATURES].mean()))
+    # The recorded snapshot has no band gaps, the target only has to be a stable regression problem
+    y = df['avg_bond_length'].fillna(df['avg_bond_length'].mean()).to_numpy()
+    model = RandomForestRegressor(n_estimators=100, random_state=42)
+
+    train = measure(lambda: model.fit(X, y), repeat=args.repeat)
+    X_batch = np.repeat(X, 40, axis=0)
+    predict = measure(lambda: model.predict(X_batch), repeat=args.repeat)
+    predict['rows'] = len(X_batch)
+    predict['rows_per_s'] = len(X_batch) / predict['best_s']
+    return {'train': train, 'predict': predict}
+
+
+@benchmark('collect_replay')
+def bench_collect_replay(args):
+    # The collector's query -> record path on recorded Materials Project responses, no network.
+    # Skipped until a collect run has recorded every metal-chalcogen search
+    from config import CATIONS, CHALCOGENS
+    from feature_engineering import DataCollector, FIELDS
+    from mp_cache import CachedMPRester, ResponseCache, query_key
+
+    cache = ResponseCache(mode='replay')
+    pairs = [(metal, chalcogen) for metal in CATIONS for chalcogen in CHALCOGENS]
+    missing = [
+        f"{metal}-{chalcogen}" for metal, chalcogen in pairs
+        if cache.get(query_key('summary', {'elements': [metal, chalcogen], 'num_elements': 2, 'fields': FIELDS}), ignore_ttl=True) is None
+    ]
+    if missing:
+        print(f"⚠️ Skipping collect_replay, no recorded responses for {', '.join(missing)}")
+        return {}
+
+    collector = DataCollector(use_cache=False, mp_cache='replay')
+
+    def replay():
+        with CachedMPRester(cache=cache) as mpr:
+            return sum(1 for _, records in collector.iter_chemsys(mpr) for _ in records)
+
+    result = measure(replay, repeat=args.repeat)
+    result['items'] = replay()
+    return result
+
+
+def flatten(results, prefix=''):
+    # {'model': {'train': {'best_s': ..}}} -> {'model.train': best_s}
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict) and 'best_s' in value:
+            flat[prefix + key] = value['best_s']
+        elif isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+    return flat
+
+
+def compare(results, baseline, threshold):
+    current, previous = flatten(results), flatten(baseline['results'])
+    regressions = 0
+    print(f"\n📊 Compared with baseline from {baseline['created']} ({baseline['machine']})")
+    for name in sorted(current):
+        if name not in previous:
+            continue
+        ratio = current[name] / previous[name]
+        flag = '❌' if ratio > threshold else '✅'
+        regressions += ratio > threshold
+        print(f"{flag} {name:<50} {previous[name]:9.4f}s -> {current[name]:9.4f}s ({ratio:.2f}x)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for featurization, storage and models")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="Run a subset")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=64, help="Recorded structures to featurize")
+    parser.add_argument('--nsites', type=int, nargs='+', default=[8, 64, 216], help="Synthetic supercell sizes")
+    parser.add_argument('--output', help="Write results as JSON")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=1.25, help="Slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"⏱️ Running {name}...")
+        results[name] = BENCHMARKS[name](args)
+
+    for name, value in sorted(flatten(results).items()):
+        print(f"  {name:<50} {value:9.4f}s")
+
+    run = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': f"{platform.node()} {platform.machine()} {os.cpu_count()} cpus, Python {platform.python_version()}",
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    regressions = 0
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"\n✅ Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+    raise SystemExit(1 if regressions else 0)
@@ -0,0 +1,66 @@
+import time
+_START = time.perf_counter()
+
+import sys
+import argparse
+import importlib
+
+# One entry point for the whole project. Each subcommand names the module whose main()
+# it runs, and that module (with its pymatgen/sklearn/matplotlib imports) is only
+# loaded once the subcommand is known
+SUBCOMMANDS = {
+    'collect': ('feature_engineering', [], "Collect and featurize chalcogenides from the Materials Project"),
+    'featurize': ('featurizer', [], "Compute structural features for a CSV"),
+    'analyze': ('view_data', [], "Correlation, clustering and trend plots"),
+    'train': ('ml_analysis', [], "Train, search and save band gap models"),
+    'predict': ('model_artifacts', ['predict'], "Score candidates with a saved model"),
+    'similar': ('similarity_index', [], "Build and query the feature similarity index"),
+    'mp-cache': ('mp_cache', [], "List or clear recorded Materials Project responses"),
+    'models': ('model_artifacts', ['list'], "List saved models and versions")
+}
+
+
+def show_config():
+    from config import SETTINGS, SOURCES, config_path
+    print(f"Config file: {config_path() or 'none'}")
+    for key, value in SETTINGS.items():
+        if key == 'api_key' and value:
+            value = value[:4] + '…'
+        print(f"  {key:<12} {value!s:<40} ({SOURCES[key]})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='chalco', description="Chalcogenide collection, featurization, analysis and modelling",
+        epilog="Run 'chalco <command> --help' for the options of each command."
+    )
+    parser.add_argument('command', choices=sorted(SUBCOMMANDS) + ['config'])
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="Passed on to the command")
+    parser.add_argument('--quiet-startup', action='store_true', help="Don't print the startup timing line")
+    args = parser.parse_args(argv)
+
+    if args.command == 'config':
+        show_config()
+        print(f"⏱️ Startup {1000 * (time.perf_counter() - _START):.0f} ms")
+        return
+
+    module_name, prefix, _ = SUBCOMMANDS[args.command]
+    import_start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    imported = time.perf_counter()
+
+    from instrumentation import get_profiler
+    profiler = get_profiler()
+    profiler.add_time('cli_startup', import_start - _START)
+    profiler.add_time(f"import_{module_name}", imported - import_start)
+    if not args.quiet_startup:
+        print(f"⏱️ Startup {1000 * (imported - _START):.0f} ms "
+              f"({1000 * (imported - import_start):.0f} ms importing {module_name})")
+
+    # So --help and errors read 'chalco train ...' rather than 'chalco.py ...'
+    sys.argv[0] = f"chalco {args.command}"
+    module.main(prefix + args.args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,105 @@
+import os
+import json
+import glob
+from datetime import datetime
+from config import DATA_DIR
+
+CHECKPOINT_DIR = os.path.join(DATA_DIR, "checkpoints")
+
+
+class RunCheckpoint:
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self._written = {unit: set(ids) for unit, ids in state['written'].items()}
+
+    @classmethod
+    def create(cls, run_id, output, incremental=False, retry=None):
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        state = {
+            'run_id': run_id,
+            'output': output,
+            'incremental': incremental,
+            # Failures a --retry-failed run is redoing, so resuming it redoes the same ones
+            'retry': retry,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'finished': False,
+            'completed': [],
+            'written': {},
+            'rows_written': 0,
+            'batches_written': 0,
+            'failures': []
+        }
+        checkpoint = cls(os.path.join(CHECKPOINT_DIR, f"{run_id}.json"), state)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(path, json.load(f))
+
+    @classmethod
+    def latest(cls):
+        # Most recent run that didn't finish, or None
+        for path in sorted(glob.glob(os.path.join(CHECKPOINT_DIR, "*.json")), reverse=True):
+            if path.endswith("_failures.json"):
+                continue
+            checkpoint = cls.load(path)
+            if not checkpoint.state['finished']:
+                return checkpoint
+        return None
+
+    @property
+    def run_id(self):
+        return self.state['run_id']
+
+    @property
+    def manifest_path(self):
+        return os.path.join(CHECKPOINT_DIR, f"{self.run_id}_failures.json")
+
+    def save(self):
+        self.state['written'] = {unit: sorted(ids) for unit, ids in self._written.items()}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def is_completed(self, unit):
+        return unit in self.state['completed']
+
+    def is_written(self, unit, material_id):
+        return material_id in self._written.get(unit, ())
+
+    def record_batch(self, unit, material_ids, failures=()):
+        self._written.setdefault(unit, set()).update(str(material_id) for material_id in material_ids)
+        self.state['rows_written'] += len(material_ids)
+        self.state['batches_written'] += 1
+        self.state['failures'].extend(failures)
+        self.save()
+
+    def record_failure(self, failure):
+        self.state['failures'].append(failure)
+        self.save()
+
+    def complete(self, unit):
+        if unit not in self.state['completed']:
+            self.state['completed'].append(unit)
+        # Ids are only needed to resume a unit that stopped half way
+        self._written.pop(unit, None)
+        self.save()
+
+    def finish(self):
+        self.state['finished'] = True
+        self.save()
+        self.write_failure_manifest()
+
+    def write_failure_manifest(self):
+        with open(self.manifest_path, 'w') as f:
+            json.dump({'run_id': self.run_id, 'failures': self.state['failures']}, f, indent=2)
+        return self.manifest_path
+
+
+def load_failure_manifest(path):
+    with open(path) as f:
+        return json.load(f)['failures']
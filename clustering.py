@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import IncrementalPCA
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+from instrumentation import get_profiler
+
+# Chunked clustering for frames too big to standardize, project or cluster in one go.
+# Everything is fitted with partial_fit over row chunks, so the fitting itself only works
+# on chunk_size rows at a time. The feature matrix is still held in memory, once: it's
+# built in a single copy and standardized in place
+
+
+def iter_chunks(n_rows, chunk_size):
+    for start in range(0, n_rows, chunk_size):
+        yield slice(start, min(start + chunk_size, n_rows))
+
+
+def clustering_matrix(numeric_df):
+    # Drop columns that are all NaN or constant, fill the remaining gaps with the column mean.
+    # Column stats come from the frame itself, the only copy made is the float64 matrix
+    columns = [column for column, std in numeric_df.std().items() if std > 0]
+    X = numeric_df[columns].to_numpy(dtype=np.float64)
+    np.copyto(X, np.nanmean(X, axis=0), where=np.isnan(X))
+    return X, columns
+
+
+def standardize_chunked(X, chunk_size, copy=True):
+    # copy=False overwrites X with the scaled values instead of allocating a second matrix
+    scaler = StandardScaler()
+    for rows in iter_chunks(len(X), chunk_size):
+        scaler.partial_fit(X[rows])
+    scaled = np.empty_like(X) if copy else X
+    for rows in iter_chunks(len(X), chunk_size):
+        scaled[rows] = scaler.transform(X[rows])
+    return scaled
+
+
+def project_chunked(X, n_components=2, chunk_size=10000):
+    # IncrementalPCA needs each chunk to hold at least n_components rows
+    pca = IncrementalPCA(n_components=n_components)
+    for rows in iter_chunks(len(X), max(chunk_size, n_components)):
+        if rows.stop - rows.start >= n_components:
+            pca.partial_fit(X[rows])
+    projected = np.empty((len(X), n_components))
+    for rows in iter_chunks(len(X), chunk_size):
+        projected[rows] = pca.transform(X[rows])
+    return projected, pca
+
+
+def predict_chunked(model, X, chunk_size):
+    labels = np.empty(len(X), dtype=np.int32)
+    for rows in iter_chunks(len(X), chunk_size):
+        labels[rows] = model.predict(X[rows])
+    return labels
+
+
+def fit_k(X, k, sample_idx, chunk_size=10000, epochs=3, random_state=42):
+    model = MiniBatchKMeans(n_clusters=k, batch_size=min(chunk_size, 4096), random_state=random_state, n_init=3)
+    for _ in range(epochs):
+        for rows in iter_chunks(len(X), chunk_size):
+            # partial_fit needs at least k rows to seed the centers
+            if rows.stop - rows.start >= k:
+                model.partial_fit(X[rows])
+
+    # Inertia over all rows, silhouette only on the sample since it's O(n^2)
+    inertia = 0.0
+    for rows in iter_chunks(len(X), chunk_size):
+        inertia -= model.score(X[rows])
+    sample_labels = model.predict(X[sample_idx])
+    silhouette = silhouette_score(X[sample_idx], sample_labels) if len(np.unique(sample_labels)) > 1 else np.nan
+    return {'k': k, 'inertia': inertia, 'silhouette': silhouette}, model
+
+
+def sweep_k(X, ks=range(2, 11), sample_size=5000, chunk_size=10000, n_jobs=-1, backend='threading', random_state=42):
+    # Every k trains on the same chunks and is scored on the same sample, in parallel
+    rng = np.random.default_rng(random_state)
+    sample_idx = np.sort(rng.choice(len(X), size=min(sample_size, len(X)), replace=False))
+    ks = [k for k in ks if 1 < k < len(X)]
+
+    with get_profiler().stage('cluster_sweep'):
+        results = Parallel(n_jobs=n_jobs, backend=backend)(
+            delayed(fit_k)(X, k, sample_idx, chunk_size, random_state=random_state) for k in ks
+        )
+    scores = pd.DataFrame([score for score, _ in results])
+    models = {score['k']: model for score, model in results}
+    return scores, models
+
+
+def best_k(scores):
+    # Highest silhouette on the sample; falls back to the smallest k if none could be scored
+    scored = scores.dropna(subset=['silhouette'])
+    if scored.empty:
+        return int(scores['k'].min())
+    return int(scored.loc[scored['silhouette'].idxmax(), 'k'])
@@ -0,0 +1,95 @@
+import os
+
+# Settings are resolved in this order: CHALCO_* environment variables, then a TOML
+# file (the path in CHALCO_CONFIG, else chalco.toml in the working directory or next
+# to this file), then the defaults below. Only the standard library is imported here
+# so every entry point can load config without paying for the heavy packages
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILENAME = "chalco.toml"
+
+DEFAULTS = {
+    'api_key': None,
+    'data_dir': os.path.join(REPO_DIR, "data"),
+    'chalcogens': ["S", "Se", "Te"],
+    'cations': ["Cu", "Zn", "Cd"],
+    'max_samples': 100,
+    # Materials Project responses: record, replay (offline), refresh or off, see mp_cache.py
+    'mp_cache': 'record',
+    'mp_cache_ttl': 7 * 24 * 3600
+}
+
+ENV_VARS = {
+    'api_key': ['CHALCO_API_KEY', 'MP_API_KEY'],
+    'data_dir': ['CHALCO_DATA_DIR'],
+    'chalcogens': ['CHALCO_CHALCOGENS'],
+    'cations': ['CHALCO_CATIONS'],
+    'max_samples': ['CHALCO_MAX_SAMPLES'],
+    'mp_cache': ['CHALCO_MP_CACHE'],
+    'mp_cache_ttl': ['CHALCO_MP_CACHE_TTL']
+}
+
+
+def _from_env(key, value):
+    # Lists are comma separated in the environment, e.g. CHALCO_CATIONS=Cu,Zn
+    if isinstance(DEFAULTS[key], list):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    if isinstance(DEFAULTS[key], int):
+        return int(value)
+    return value
+
+
+def config_path(environ=None):
+    environ = os.environ if environ is None else environ
+    if environ.get('CHALCO_CONFIG'):
+        return environ['CHALCO_CONFIG']
+    for directory in (os.getcwd(), REPO_DIR):
+        path = os.path.join(directory, CONFIG_FILENAME)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_toml(path):
+    try:
+        import tomllib
+    except ImportError:
+        # Python < 3.11
+        import tomli as tomllib
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+
+def load_config(path=None, environ=None):
+    # Returns (settings, sources), sources says where each value came from
+    environ = os.environ if environ is None else environ
+    settings = dict(DEFAULTS)
+    sources = {key: 'default' for key in DEFAULTS}
+
+    path = path or config_path(environ)
+    if path is not None:
+        values = read_toml(path)
+        unknown = sorted(set(values) - set(DEFAULTS))
+        if unknown:
+            raise ValueError(f"Unknown settings {unknown} in {path}, expected some of {sorted(DEFAULTS)}")
+        for key, value in values.items():
+            settings[key] = value
+            sources[key] = path
+
+    for key, names in ENV_VARS.items():
+        for name in names:
+            if environ.get(name):
+                settings[key] = _from_env(key, environ[name])
+                sources[key] = f"${name}"
+                break
+
+    settings['data_dir'] = os.path.expanduser(settings['data_dir'])
+    return settings, sources
+
+
+SETTINGS, SOURCES = load_config()
+
+API_KEY = SETTINGS['api_key']
+DATA_DIR = SETTINGS['data_dir']
+CHALCOGENS = SETTINGS['chalcogens']
+CATIONS = SETTINGS['cations']
+MAX_SAMPLES = SETTINGS['max_samples']
@@ -0,0 +1,234 @@
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from scipy.stats import rankdata, t as t_dist
+from instrumentation import get_profiler
+
+# Whole-matrix Pearson/Spearman with p-values. Missing values are handled with
+# pairwise masks: each pair uses exactly the rows where both columns are present,
+# for Spearman that includes ranking again over the shared rows, unless the gaps
+# form too many different patterns (see MAX_EXACT_PATTERNS)
+
+
+def pairwise_pearson(X):
+    # Sums restricted to each pair's shared rows, as matrix products:
+    # S[i, j] = sum of x_i over rows where j is present too, and so on.
+    # Columns are centered first, otherwise a large offset swamps the variance
+    # in cross - sums * sums / n and r comes out as noise
+    X = np.asarray(X, dtype=np.float64)
+    present = (~np.isnan(X)).astype(np.float64)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        X = X - np.nan_to_num(np.nanmean(X, axis=0))
+    values = np.where(present > 0, X, 0.0)
+
+    n = present.T @ present
+    sums = values.T @ present
+    squares = (values ** 2).T @ present
+    cross = values.T @ values
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = cross - sums * sums.T / n
+        var_i = squares - sums ** 2 / n
+        r = cov / np.sqrt(var_i * var_i.T)
+    r = np.clip(r, -1.0, 1.0)
+    np.fill_diagonal(r, np.where(np.diag(var_i) > 0, 1.0, np.nan))
+    return r, n
+
+
+def p_values(r, n):
+    # Two-sided test of r = 0 with n - 2 degrees of freedom, as scipy's pearsonr
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dof = n - 2
+        t = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r)))
+        p = 2 * t_dist.sf(np.abs(t), dof)
+    p = np.where(np.abs(r) >= 1.0, 0.0, p)
+    return np.where((dof > 0) & ~np.isnan(r), p, np.nan)
+
+
+def column_ranks(X):
+    # Average ranks per column, NaN stays NaN
+    return rankdata(np.asarray(X, dtype=np.float64), axis=0, nan_policy='omit')
+
+
+# Past this many distinct missing-value patterns the Spearman re-ranking would cost a
+# rank pass per pair of patterns, so the single-pass ranks are kept (approximate)
+MAX_EXACT_PATTERNS = 16
+
+
+def missing_patterns(X):
+    # Distinct present/missing masks over the columns and which one each column has
+    patterns, labels = np.unique(~np.isnan(X).T, axis=0, return_inverse=True)
+    return patterns, labels.ravel()
+
+
+def spearman_is_exact(X, max_patterns=None):
+    # Pairs whose Spearman r ranks over exactly the shared rows. Columns with the same
+    # missing-value pattern always do; across patterns only when there are few enough
+    patterns, labels = missing_patterns(np.asarray(X, dtype=np.float64))
+    if len(patterns) <= (max_patterns or MAX_EXACT_PATTERNS):
+        return np.ones((len(labels), len(labels)), dtype=bool)
+    return labels[:, None] == labels[None, :]
+
+
+def pairwise_spearman(X, max_patterns=None):
+    # Pearson on the ranks. Two columns with the same missing-value pattern share all
+    # their rows, so one ranking pass covers them. Columns with different patterns are
+    # ranked again over the rows both patterns have, one pass per pair of patterns for
+    # all their columns at once. With more than max_patterns patterns (gaps scattered
+    # independently per column) that's skipped and those pairs are approximate:
+    # each column stays ranked over its own rows, see spearman_is_exact
+    X = np.asarray(X, dtype=np.float64)
+    r, n = pairwise_pearson(column_ranks(X))
+    patterns, labels = missing_patterns(X)
+    if len(patterns) > (max_patterns or MAX_EXACT_PATTERNS):
+        return r, n
+    for a in range(len(patterns)):
+        for b in range(a + 1, len(patterns)):
+            rows = patterns[a] & patterns[b]
+            cols_a, cols_b = np.flatnonzero(labels == a), np.flatnonzero(labels == b)
+            if rows.sum() > 1:
+                block = pairwise_pearson(column_ranks(X[rows][:, np.concatenate([cols_a, cols_b])]))[0][:len(cols_a), len(cols_a):]
+            else:
+                block = np.nan
+            r[np.ix_(cols_a, cols_b)] = block
+            r[np.ix_(cols_b, cols_a)] = np.transpose(block)
+    return r, n
+
+
+def correlation_matrices(X, method='pearson'):
+    r, n = pairwise_spearman(X) if method == 'spearman' else pairwise_pearson(X)
+    return r, p_values(r, n), n
+
+
+def benjamini_hochberg(p):
+    # q-values for screening many pairs at once
+    p = np.asarray(p, dtype=np.float64)
+    q = np.full(p.shape, np.nan)
+    valid = ~np.isnan(p)
+    if not valid.any():
+        return q
+    order = np.argsort(p[valid])
+    ranked = p[valid][order] * valid.sum() / np.arange(1, valid.sum() + 1)
+    ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+    q_valid = np.empty(valid.sum())
+    q_valid[order] = np.minimum(ranked, 1.0)
+    q[valid] = q_valid
+    return q
+
+
+def _bootstrap_block(X, method, seed, n_boot):
+    rng = np.random.default_rng(seed)
+    samples = np.empty((n_boot, X.shape[1], X.shape[1]))
+    for b in range(n_boot):
+        rows = rng.integers(0, len(X), len(X))
+        samples[b] = correlation_matrices(X[rows], method)[0]
+    return samples
+
+
+def bootstrap_ci(X, method='pearson', n_boot=1000, alpha=0.05, n_workers=None, seed=0):
+    # Percentile intervals. Resamples are split into one block per thread; the
+    # matrix products release the GIL, so the blocks really run side by side
+    X = np.asarray(X, dtype=np.float64)
+    n_workers = n_workers or os.cpu_count()
+    blocks = [len(block) for block in np.array_split(np.arange(n_boot), n_workers) if len(block)]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    with get_profiler().stage('correlation_bootstrap'), ThreadPoolExecutor(max_workers=n_workers) as pool:
+        samples = np.concatenate(list(pool.map(_bootstrap_block, [X] * len(blocks), [method] * len(blocks), seeds, blocks)))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lower = np.nanpercentile(samples, 100 * alpha / 2, axis=0)
+        upper = np.nanpercentile(samples, 100 * (1 - alpha / 2), axis=0)
+    return lower, upper
+
+
+def correlation_table(df, targets=None, bootstrap=0, alpha=0.05, n_workers=None):
+    # Long table with one row per (feature, target) pair: r, p, q and n for both
+    # methods, plus bootstrap intervals when bootstrap > 0. Without targets every pair is listed once
+    numeric = df.select_dtypes(include=[np.number])
+    columns = list(numeric.columns)
+    X = numeric.to_numpy(dtype=np.float64)
+
+    with get_profiler().stage('correlation_matrices'):
+        results = {method: correlation_matrices(X, method) for method in ('pearson', 'spearman')}
+    if bootstrap:
+        for method in ('pearson', 'spearman'):
+            results[method] += bootstrap_ci(X, method, n_boot=bootstrap, alpha=alpha, n_workers=n_workers)
+
+    if targets is None:
+        pairs = [(i, j) for i in range(len(columns)) for j in range(i + 1, len(columns))]
+    else:
+        target_idx = [columns.index(target) for target in targets if target in columns]
+        pairs, seen = [], set()
+        for j in target_idx:
+            for i in range(len(columns)):
+                # Target vs target pairs are listed once
+                if i != j and frozenset((i, j)) not in seen:
+                    seen.add(frozenset((i, j)))
+                    pairs.append((i, j))
+    rows_i = np.array([i for i, _ in pairs], dtype=int)
+    rows_j = np.array([j for _, j in pairs], dtype=int)
+
+    table = pd.DataFrame({
+        'feature': [columns[i] for i in rows_i],
+        'target': [columns[j] for j in rows_j],
+        'n': results['pearson'][2][rows_i, rows_j].astype(int)
+    })
+    for method, values in results.items():
+        table[f"{method}_r"] = values[0][rows_i, rows_j]
+        table[f"{method}_p"] = values[1][rows_i, rows_j]
+        table[f"{method}_q"] = benjamini_hochberg(table[f"{method}_p"])
+        if method == 'spearman':
+            table['spearman_exact'] = spearman_is_exact(X)[rows_i, rows_j]
+        if bootstrap:
+            table[f"{method}_ci_low"] = values[3][rows_i, rows_j]
+            table[f"{method}_ci_high"] = values[4][rows_i, rows_j]
+    return table.sort_values('pearson_r', key=np.abs, ascending=False, ignore_index=True)
+
+
+def check_against_scipy(df, atol=1e-8):
+    # Compare every pair with scipy's pearsonr/spearmanr on the pair's complete rows
+    from scipy.stats import pearsonr, spearmanr
+    numeric = df.select_dtypes(include=[np.number]).dropna()
+    numeric = numeric.loc[:, numeric.std() > 0]
+    X = numeric.to_numpy(dtype=np.float64)
+    worst = 0.0
+    for method, reference in (('pearson', pearsonr), ('spearman', spearmanr)):
+        r, p, _ = correlation_matrices(X, method)
+        for i in range(X.shape[1]):
+            for j in range(i + 1, X.shape[1]):
+                expected = reference(X[:, i], X[:, j])
+                worst = max(worst, abs(r[i, j] - expected[0]), abs(p[i, j] - expected[1]))
+    return worst <= atol, worst
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Screen every feature/target correlation in a CSV")
+    parser.add_argument('input', nargs='?', default=os.path.join(DATA_DIR, "chalcogenides_20250106_1734.csv"))
+    parser.add_argument('--targets', nargs='*', default=['band_gap', 'formation_energy_per_atom'])
+    parser.add_argument('--bootstrap', type=int, default=0, help="Bootstrap resamples for confidence intervals")
+    parser.add_argument('--output', help="Write the pair table as CSV")
+    parser.add_argument('--check', action='store_true', help="Verify against scipy on the complete rows")
+    parser.add_argument('--max-patterns', type=int, default=MAX_EXACT_PATTERNS,
+                        help="Spearman ranks each pair over its shared rows only while the columns have at most this many "
+                             "distinct missing-value patterns; beyond that pairs with different gaps are approximate "
+                             "(spearman_exact is False)")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    if args.check:
+        ok, worst = check_against_scipy(df)
+        print(f"{'✅' if ok else '❌'} Matches scipy pearsonr/spearmanr, max abs difference {worst:.2e}")
+    MAX_EXACT_PATTERNS = args.max_patterns
+    table = correlation_table(df, targets=args.targets or None, bootstrap=args.bootstrap)
+    if not table['spearman_exact'].all():
+        print(f"⚠️ {(~table['spearman_exact']).sum()} Spearman pairs are approximate, the gaps form more than {args.max_patterns} patterns")
+    print(table.head(20).to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"✅ Saved {len(table)} pairs to {args.output}")
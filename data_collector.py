@@ -1,21 +1,23 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-from mp_api.client import MPRester
 import json
 from datetime import datetime
 import os
 from pymatgen.core.structure import Structure
-from pymatgen.analysis.local_env import CrystalNN
-from pymatgen.core.periodic_table import Element
+from featurizer import get_featurizer
+from element_table import chemistry_features
+from mp_query import QueryScheduler, SUMMARY_FIELDS
+from mp_cache import CachedMPRester, MODES as MP_CACHE_MODES
 from config import API_KEY, CHALCOGENS, CATIONS, MAX_SAMPLES, DATA_DIR
 
 class DataCollector:
-    def __init__(self):
+    def __init__(self, query_workers=4, mp_cache=None):
         print("Starting up my data collector...")
         if not os.path.exists(DATA_DIR):
             print(f"Creating my data directory at {DATA_DIR}")
             os.makedirs(DATA_DIR)
         self.api_key = API_KEY
+        self.query_workers = query_workers
+        self.mp_cache = mp_cache
 
     def get_compounds(self):
         print("\n🔍 Looking for compounds with these elements:")
@@ -24,84 +26,62 @@ class DataCollector:
 
         try:
             compounds_data = []
-            with MPRester(self.api_key) as mpr:
-                for metal in CATIONS:
-                    for chalcogen in CHALCOGENS:
-                        print(f"\nLooking for {metal}-{chalcogen} compounds...")
-
-                        entries = mpr.summary.search(
-                            elements=[metal, chalcogen],
-                            num_elements=2,
-                            fields=[
-                                "material_id", "formula_pretty", "volume", "density", "symmetry",
-                                "nsites", "elements", "chemsys", "band_gap", "formation_energy_per_atom",
-                                "structure"
-                            ]
-                        )
-
-                        print(f"Found {len(entries)} compounds")
-
-                        for entry in entries:
-                            symmetry_data = getattr(entry, 'symmetry', None)
-                            crystal_system = getattr(symmetry_data, 'crystal_system', 'Unknown') if symmetry_data else 'Unknown'
-
-                            structure = Structure.from_dict(entry.structure.as_dict()) if entry.structure else None
-
-                            avg_coordination, avg_bond_length, electronegativity_diff, radii_ratio, avg_atomic_mass = None, None, None, None, None
-                            packing_efficiency, symmetry_deviation = None, None
-
-                            if structure:
-                                try:
-                                    nn = CrystalNN()
-                                    coordination_numbers = [nn.get_cn(structure, i) for i in range(len(structure))]
-                                    avg_coordination = sum(coordination_numbers) / len(coordination_numbers)
-
-                                    bond_lengths = []
-                                    for i in range(len(structure)):
-                                        neighbors = nn.get_nn_info(structure, i)
-                                        for n in neighbors:
-                                            dist = structure.get_distance(i, n['site_index'])
-                                            bond_lengths.append(dist)
-                                    avg_bond_length = sum(bond_lengths) / len(bond_lengths)
-
-                                    elements = [Element(el) for el in entry.elements]
-                                    electronegativity_diff = max([e.X for e in elements]) - min([e.X for e in elements])
-                                    radii_ratio = max([e.atomic_radius for e in elements]) / min([e.atomic_radius for e in elements])
-                                    avg_atomic_mass = sum([e.atomic_mass for e in elements]) / len(elements)
-
-                                    # Additional features
-                                    packing_efficiency = entry.density / (sum([e.atomic_mass for e in elements]) / len(elements))
-                                    symmetry_deviation = 1 if crystal_system not in ['Cubic', 'Hexagonal'] else 0
-
-                                except Exception as e:
-                                    print(f"Error calculating features for {entry.material_id}: {e}")
-
-                            data = {
-                                'material_id': entry.material_id,
-                                'formula': entry.formula_pretty,
-                                'volume': entry.volume,
-                                'density': entry.density,
-                                'crystal_system': crystal_system,
-                                'nsites': entry.nsites,
-                                'elements': ', '.join([str(el) for el in entry.elements]),
-                                'chemsys': entry.chemsys,
-                                'band_gap': entry.band_gap,
-                                'formation_energy_per_atom': entry.formation_energy_per_atom,
-                                'avg_coordination': avg_coordination,
-                                'avg_bond_length': avg_bond_length,
-                                'electronegativity_diff': electronegativity_diff,
-                                'radii_ratio': radii_ratio,
-                                'avg_atomic_mass': avg_atomic_mass,
-                                'packing_efficiency': packing_efficiency,
-                                'symmetry_deviation': symmetry_deviation
-                            }
-                            compounds_data.append(data)
+            pairs = [(metal, chalcogen) for metal in CATIONS for chalcogen in CHALCOGENS]
+            with CachedMPRester(self.api_key, mode=self.mp_cache) as mpr:
+                scheduler = QueryScheduler(mpr.summary.search, fields=SUMMARY_FIELDS, max_workers=self.query_workers)
+                print(f"\nLooking for {len(pairs)} metal-chalcogen systems...")
+
+                for metal, chalcogen, entries, error in scheduler.run(pairs):
+                    if error is not None:
+                        print(f"❌ {metal}-{chalcogen} query failed: {error}")
+                        continue
+
+                    print(f"Found {len(entries)} {metal}-{chalcogen} compounds")
+
+                    for entry in entries:
+                        symmetry_data = getattr(entry, 'symmetry', None)
+                        crystal_system = getattr(symmetry_data, 'crystal_system', 'Unknown') if symmetry_data else 'Unknown'
+
+                        structure = Structure.from_dict(entry.structure.as_dict()) if entry.structure else None
+
+                        avg_coordination, avg_bond_length, symmetry_deviation = None, None, None
+
+                        if structure:
+                            try:
+                                structure_features = get_featurizer().featurize(structure)
+                                avg_coordination = structure_features['avg_coordination']
+                                avg_bond_length = structure_features['avg_bond_length']
+                                symmetry_deviation = 1 if crystal_system not in ['Cubic', 'Hexagonal'] else 0
+
+                            except Exception as e:
+                                print(f"Error calculating features for {entry.material_id}: {e}")
+
+                        data = {
+                            'material_id': entry.material_id,
+                            'formula': entry.formula_pretty,
+                            'volume': entry.volume,
+                            'density': entry.density,
+                            'crystal_system': crystal_system,
+                            'nsites': entry.nsites,
+                            'elements': ', '.join([str(el) for el in entry.elements]),
+                            'chemsys': entry.chemsys,
+                            'band_gap': entry.band_gap,
+                            'formation_energy_per_atom': entry.formation_energy_per_atom,
+                            'avg_coordination': avg_coordination,
+                            'avg_bond_length': avg_bond_length,
+                            'symmetry_deviation': symmetry_deviation
+                        }
+                        compounds_data.append(data)
 
             if not compounds_data:
                 print("No compounds found!")
                 return None
 
             df = pd.DataFrame(compounds_data)
+
+            # Elemental descriptors for every row in one vectorized pass
+            df = df.join(chemistry_features(df))
+            df = df[[column for column in df.columns if column != 'symmetry_deviation'] + ['symmetry_deviation']]
             print(f"\nProcessed {len(df)} total compounds")
             return df
 
@@ -127,6 +107,11 @@ class DataCollector:
         print(df['chemsys'].value_counts())
 
 if __name__ == "__main__":
-    collector = DataCollector()
+    import argparse
+    parser = argparse.ArgumentParser(description="Collect chalcogenides from the Materials Project")
+    parser.add_argument('--mp-cache', choices=MP_CACHE_MODES, help="Materials Project response cache mode (default from config)")
+    args = parser.parse_args()
+
+    collector = DataCollector(mp_cache=args.mp_cache)
     compounds_df = collector.get_compounds()
     collector.save_data(compounds_df)
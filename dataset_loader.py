@@ -0,0 +1,163 @@
+import os
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from instrumentation import get_profiler
+from config import DATA_DIR
+
+DEFAULT_CACHE_DIR = os.path.join(DATA_DIR, "dataset_cache")
+SCHEMA_VERSION = 1
+
+# Explicit column types for the collected CSVs. Floats are read as float32, the few
+# low-cardinality text columns as categoricals, and the integer columns come in as
+# float32 and are narrowed once we know they have no gaps
+FLOAT_COLUMNS = [
+    'volume', 'density', 'band_gap', 'formation_energy_per_atom', 'avg_coordination', 'avg_bond_length',
+    'electronegativity_diff', 'radii_ratio', 'avg_atomic_mass', 'packing_efficiency', 'weighted_atomic_mass'
+]
+INTEGER_COLUMNS = {'nsites': np.int32, 'symmetry_deviation': np.int8}
+CATEGORICAL_COLUMNS = ['chemsys', 'crystal_system', 'metal', 'chalcogen']
+TEXT_COLUMNS = ['material_id', 'formula', 'elements', 'structure', 'last_updated']
+
+# Not loaded unless asked for by name, the structure JSON is most of the file
+HEAVY_COLUMNS = ['structure']
+
+# Files bigger than this are read in chunks so parsing never holds the raw text of the whole file
+CHUNK_BYTES = 256 * 1024 * 1024
+DEFAULT_CHUNKSIZE = 200000
+
+# Bytes hashed into the sidecar key along with the file's size and mtime
+HEAD_BYTES = 64 * 1024
+
+
+def csv_dtypes(columns, downcast=True):
+    dtypes = {}
+    for column in columns:
+        if column in CATEGORICAL_COLUMNS:
+            dtypes[column] = 'category'
+        elif column in TEXT_COLUMNS:
+            dtypes[column] = str
+        elif column in FLOAT_COLUMNS or column in INTEGER_COLUMNS:
+            dtypes[column] = np.float32 if downcast else np.float64
+    return dtypes
+
+
+def _finish_types(df, downcast=True):
+    # Integer columns without gaps get their narrow type back, unknown float columns are downcast
+    for column, dtype in INTEGER_COLUMNS.items():
+        if column in df.columns and not df[column].isna().any():
+            df[column] = df[column].astype(dtype if downcast else np.int64)
+    if downcast:
+        for column in df.columns:
+            if df[column].dtype == np.float64:
+                df[column] = df[column].astype(np.float32)
+    return df
+
+
+def select_columns(path, columns=None):
+    # Requested columns that the file actually has, in file order. Without a request
+    # everything but the heavy columns is loaded
+    header = list(pd.read_csv(path, nrows=0).columns)
+    if columns is None:
+        return [column for column in header if column not in HEAVY_COLUMNS]
+    return [column for column in header if column in set(columns)]
+
+
+def iter_dataset(path, columns=None, chunksize=DEFAULT_CHUNKSIZE, downcast=True):
+    # Typed chunks for callers that can stream, e.g. to aggregate a file that won't fit in memory
+    columns = select_columns(path, columns)
+    reader = pd.read_csv(path, usecols=columns, dtype=csv_dtypes(columns, downcast), chunksize=chunksize)
+    for chunk in reader:
+        yield _finish_types(chunk[columns], downcast)
+
+
+def _concat_chunks(chunks, downcast=True):
+    # Every chunk has its own categories, union them so the columns stay categorical
+    if len(chunks) == 1:
+        return chunks[0]
+    categorical = [column for column in chunks[0].columns if isinstance(chunks[0][column].dtype, pd.CategoricalDtype)]
+    merged = {column: union_categoricals([chunk[column] for chunk in chunks], sort_categories=True) for column in categorical}
+    df = pd.concat([chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True)
+    for column in categorical:
+        df[column] = pd.Categorical(merged[column])
+    return _finish_types(df[chunks[0].columns], downcast)
+
+
+def file_stamp(path, head_bytes=HEAD_BYTES):
+    # Size, mtime and a hash of the first bytes: an edit that keeps the mtime (or lands in
+    # the same second) still changes the stamp unless it keeps the size and header too
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        head = hashlib.sha256(f.read(head_bytes)).hexdigest()
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{head}"
+
+
+def sidecar_path(path, columns, downcast=True, cache_dir=DEFAULT_CACHE_DIR):
+    # <csv name>-<which load>-<which version of the file>.parquet
+    load_key = hashlib.sha256(repr((os.path.abspath(path), list(columns), downcast, SCHEMA_VERSION)).encode()).hexdigest()
+    file_key = hashlib.sha256(file_stamp(path).encode()).hexdigest()
+    return os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}-{load_key[:12]}-{file_key[:12]}.parquet")
+
+
+def load_dataset(path, columns=None, downcast=True, chunksize=None, use_cache=True, cache_dir=DEFAULT_CACHE_DIR):
+    # Column-projected, typed CSV load. The parsed frame is kept as a parquet sidecar,
+    # reused for as long as the CSV's size, mtime and header are unchanged.
+    # downcast=True reads every float as float32, pass False where full precision matters
+    profiler = get_profiler()
+    columns = select_columns(path, columns)
+    sidecar = sidecar_path(path, columns, downcast, cache_dir)
+    if use_cache and os.path.exists(sidecar):
+        with profiler.stage('dataset_sidecar_read'):
+            try:
+                return pd.read_parquet(sidecar)
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable dataset cache {sidecar}: {e}")
+
+    if chunksize is None and os.path.getsize(path) > CHUNK_BYTES:
+        chunksize = DEFAULT_CHUNKSIZE
+    with profiler.stage('csv_read'):
+        if chunksize:
+            df = _concat_chunks(list(iter_dataset(path, columns, chunksize, downcast)), downcast)
+        else:
+            df = pd.read_csv(path, usecols=columns, dtype=csv_dtypes(columns, downcast))
+            df = _finish_types(df[columns], downcast)
+
+    if use_cache:
+        with profiler.stage('dataset_sidecar_write'):
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, sidecar)
+            # Sidecars of earlier versions of the file are never read again
+            for stale in glob.glob(f"{glob.escape(sidecar.rsplit('-', 1)[0])}-*.parquet"):
+                if stale != sidecar:
+                    os.remove(stale)
+    return df
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare a typed, projected load of a CSV with a plain read_csv")
+    parser.add_argument('input', nargs='?', default=os.path.join(DATA_DIR, "chalcogenides_20250106_1538.csv"))
+    parser.add_argument('--columns', nargs='+', help="Default: everything but the structure column")
+    parser.add_argument('--chunksize', type=int)
+    args = parser.parse_args()
+
+    def timed_load(load):
+        start = time.perf_counter()
+        df = load()
+        return df, time.perf_counter() - start
+
+    plain, plain_s = timed_load(lambda: pd.read_csv(args.input))
+    typed, typed_s = timed_load(lambda: load_dataset(args.input, args.columns, chunksize=args.chunksize, use_cache=False))
+    load_dataset(args.input, args.columns, chunksize=args.chunksize)
+    cached, cached_s = timed_load(lambda: load_dataset(args.input, args.columns, chunksize=args.chunksize))
+
+    for label, df, seconds in (('read_csv', plain, plain_s), ('typed', typed, typed_s), ('sidecar', cached, cached_s)):
+        print(f"{label:<9} {len(df.columns):3d} columns {df.memory_usage(deep=True).sum() / 1e6:8.2f} MB {1000 * seconds:8.1f} ms")
+    assert cached.dtypes.equals(typed.dtypes), "Sidecar changed the column types"
+    print(typed.dtypes.to_string())
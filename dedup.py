@@ -0,0 +1,153 @@
+import json
+from joblib import Parallel, delayed
+from featurizer import load_structure, FEATURIZER_VERSION
+from instrumentation import get_profiler
+
+# Structures are bucketed by (reduced formula, spacegroup, nsites) and StructureMatcher
+# only runs inside a bucket, against one representative per equivalence class. Every
+# material maps to the representative of its class, and only representatives are featurized.
+# The matcher doesn't rescale: the same prototype with a different lattice constant has
+# different bond lengths, so it's a different class
+
+
+def match_bucket(matcher, representatives, items):
+    # items are (material_id, reduced structure) from one bucket; each is matched against
+    # the bucket's representatives and becomes a new representative if nothing fits
+    representatives = list(representatives)
+    assignments, new_representatives = [], []
+    for material_id, reduced in items:
+        for rep_id, rep_structure in representatives:
+            if matcher.fit(reduced, rep_structure, skip_structure_reduction=True):
+                assignments.append((material_id, rep_id))
+                break
+        else:
+            representatives.append((material_id, reduced))
+            new_representatives.append((material_id, reduced))
+            assignments.append((material_id, material_id))
+    return assignments, new_representatives
+
+
+class Deduplicator:
+    def __init__(self, store_path=None, symprec=0.1, ltol=0.05, stol=0.1, angle_tol=5):
+        from pymatgen.analysis.structure_matcher import StructureMatcher
+        self.store_path = store_path
+        self.symprec = symprec
+        self.matcher = StructureMatcher(ltol=ltol, stol=stol, angle_tol=angle_tol, scale=False)
+        self.representatives = {}   # bucket -> [(material_id, reduced structure)]
+        self.classes = {}           # material_id -> (representative_id, bucket)
+        self.features = {}          # representative_id -> structure features
+        self._loaded_buckets = set()
+        self._unsaved = []
+        self._unsaved_features = {}
+
+    def bucket(self, structure):
+        from spglib import SpglibError
+        from pymatgen.symmetry.analyzer import SpacegroupAnalyzer, SymmetryUndeterminedError
+        try:
+            spacegroup = SpacegroupAnalyzer(structure, symprec=self.symprec).get_space_group_number()
+        except (SymmetryUndeterminedError, SpglibError):
+            # No spacegroup found: such structures still only meet others with the same formula and size
+            spacegroup = 0
+        return f"{structure.composition.reduced_formula}|{spacegroup}|{len(structure)}"
+
+    def reduce(self, structure):
+        # StructureMatcher.fit reduces both structures on every call; doing it once per
+        # structure and fitting with skip_structure_reduction makes a bucket scan much cheaper
+        return structure.get_primitive_structure().get_reduced_structure()
+
+    def _load_bucket(self, bucket):
+        # Representatives from earlier runs, with the features already stored for them
+        if self.store_path is None or bucket in self._loaded_buckets:
+            return
+        self._loaded_buckets.add(bucket)
+        from material_store import MaterialStore
+        with MaterialStore(self.store_path) as store:
+            for representative_id, data, features in store.class_representatives(bucket, FEATURIZER_VERSION):
+                if any(rep_id == representative_id for rep_id, _ in self.representatives.get(bucket, [])):
+                    continue
+                record = json.loads(data)
+                reduced = self.reduce(load_structure(record['structure']))
+                self.representatives.setdefault(bucket, []).append((representative_id, reduced))
+                self.classes.setdefault(representative_id, (representative_id, bucket))
+                # Only features saved by this featurizer version are reused
+                if features is not None:
+                    self.features[representative_id] = json.loads(features)
+
+    def assign(self, material_id, structure):
+        # Returns the representative material_id for this structure's class
+        return self.assign_all([material_id], [structure], n_jobs=1)[0]
+
+    def assign_all(self, material_ids, structures, n_jobs=-1, backend='loky'):
+        # Buckets never compare against each other, so each bucket is matched as its own job
+        material_ids = [str(material_id) for material_id in material_ids]
+        profiler = get_profiler()
+        with profiler.stage('dedup'):
+            pending, queued = {}, set()
+            for material_id, structure in zip(material_ids, structures):
+                # An id seen before (or twice in this batch) is trivially the same class
+                if material_id in self.classes or material_id in queued:
+                    continue
+                queued.add(material_id)
+                structure = load_structure(structure)
+                bucket = self.bucket(structure)
+                self._load_bucket(bucket)
+                pending.setdefault(bucket, []).append((material_id, self.reduce(structure)))
+
+            buckets = list(pending)
+            results = Parallel(n_jobs=n_jobs if len(buckets) > 1 else 1, backend=backend)(
+                delayed(match_bucket)(self.matcher, self.representatives.get(bucket, []), pending[bucket])
+                for bucket in buckets
+            )
+            for bucket, (assignments, new_representatives) in zip(buckets, results):
+                self.representatives.setdefault(bucket, []).extend(new_representatives)
+                for material_id, representative_id in assignments:
+                    self.classes[material_id] = (representative_id, bucket)
+                    self._unsaved.append((material_id, representative_id, bucket))
+
+        representatives = [self.classes[material_id][0] for material_id in material_ids]
+        profiler.count('dedup_duplicates', sum(rep != material_id for material_id, rep in zip(material_ids, representatives)))
+        return representatives
+
+    def set_features(self, representative_id, features):
+        self.features[representative_id] = features
+        self._unsaved_features[representative_id] = features
+
+    def save(self):
+        # Class mapping for everything assigned since the last save, and the features
+        # computed for representatives, tagged with the featurizer version
+        if self.store_path is None or not (self._unsaved or self._unsaved_features):
+            return 0
+        from material_store import MaterialStore
+        with MaterialStore(self.store_path) as store:
+            n = store.save_classes(self._unsaved)
+            store.save_class_features(self._unsaved_features, FEATURIZER_VERSION)
+        self._unsaved = []
+        self._unsaved_features = {}
+        return n
+
+    def stats(self):
+        n_classes = len({rep for rep, _ in self.classes.values()})
+        return {'materials': len(self.classes), 'classes': n_classes, 'buckets': len(self.representatives)}
+
+
+if __name__ == "__main__":
+    import argparse
+    from material_store import DEFAULT_STORE_PATH
+    from structure_store import read_csv_with_structures
+
+    parser = argparse.ArgumentParser(description="Group the structures in a CSV into equivalence classes")
+    parser.add_argument('input', help="CSV with material_id and structure columns, or a collection snapshot with its structure store")
+    parser.add_argument('--store', nargs='?', const=DEFAULT_STORE_PATH, help="Save the class mapping to the material store")
+    parser.add_argument('--output', help="Write material_id -> representative_id as CSV")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Buckets matched in parallel")
+    args = parser.parse_args()
+
+    df = read_csv_with_structures(args.input)
+    dedup = Deduplicator(store_path=args.store)
+    df['representative_id'] = dedup.assign_all(df['material_id'], df['structure'], n_jobs=args.n_jobs)
+    stats = dedup.stats()
+    print(f"🧬 {stats['materials']} materials, {stats['classes']} equivalence classes in {stats['buckets']} buckets")
+    if args.store:
+        print(f"💾 Saved {dedup.save()} class assignments to {args.store}")
+    if args.output:
+        df[['material_id', 'representative_id']].to_csv(args.output, index=False)
@@ -0,0 +1,67 @@
+import itertools
+import numpy as np
+from pymatgen.core.lattice import Lattice
+
+# The 27 lattice translations around the home cell
+IMAGES = np.array(list(itertools.product([-1, 0, 1], repeat=3)), dtype=np.float64)
+
+
+def neighbor_distances(lattice_matrix, frac_coords, centers, neighbors, images):
+    # Length of each bond center -> neighbor + image, all in one call.
+    # images are the integer cell offsets CrystalNN reports for each neighbor
+    lattice_matrix = np.asarray(lattice_matrix, dtype=np.float64)
+    frac_coords = np.asarray(frac_coords, dtype=np.float64)
+    delta = frac_coords[neighbors] + np.asarray(images, dtype=np.float64) - frac_coords[centers]
+    return np.linalg.norm(delta @ lattice_matrix, axis=1)
+
+
+def minimum_image_distances(lattice_matrix, frac_coords, centers, neighbors):
+    # Shortest periodic distance for each (center, neighbor) pair. Work in the
+    # LLL-reduced basis, where wrapping the fractional difference and checking
+    # the 27 surrounding images is enough even for long, skewed cells
+    lattice_matrix = np.asarray(lattice_matrix, dtype=np.float64)
+    reduced_matrix = Lattice(lattice_matrix).lll_matrix
+    frac_coords = np.asarray(frac_coords, dtype=np.float64) @ lattice_matrix @ np.linalg.inv(reduced_matrix)
+    delta = frac_coords[neighbors] - frac_coords[centers]
+    delta -= np.round(delta)
+    candidates = (delta[:, None, :] + IMAGES[None, :, :]) @ reduced_matrix
+    return np.linalg.norm(candidates, axis=2).min(axis=1)
+
+
+def check_against_pymatgen(structure, n_pairs=200, seed=0, atol=1e-6):
+    # Compare minimum_image_distances with Structure.get_distance on random site pairs
+    rng = np.random.default_rng(seed)
+    centers = rng.integers(0, len(structure), n_pairs)
+    neighbors = rng.integers(0, len(structure), n_pairs)
+    ours = minimum_image_distances(structure.lattice.matrix, structure.frac_coords, centers, neighbors)
+    theirs = np.array([structure.get_distance(i, j) for i, j in zip(centers, neighbors)])
+    max_error = float(np.abs(ours - theirs).max())
+    return max_error <= atol, max_error
+
+
+if __name__ == "__main__":
+    import argparse
+    from pymatgen.core.structure import Structure
+    from featurizer import load_structure
+    from structure_store import read_csv_with_structures
+
+    parser = argparse.ArgumentParser(description="Check the distance kernel against pymatgen's get_distance")
+    parser.add_argument('input', nargs='?', default="data/chalcogenides_20250106_1538.csv")
+    parser.add_argument('--random', type=int, default=50, help="Extra random triclinic cells to check")
+    args = parser.parse_args()
+
+    structures = [load_structure(value) for value in read_csv_with_structures(args.input)['structure']]
+    rng = np.random.default_rng(42)
+    for _ in range(args.random):
+        lengths = rng.uniform(3, 12, 3)
+        angles = rng.uniform(60, 120, 3)
+        n_sites = int(rng.integers(1, 12))
+        structures.append(Structure(Lattice.from_parameters(*lengths, *angles), ['Cu'] * n_sites, rng.random((n_sites, 3))))
+
+    worst, failures = 0.0, 0
+    for structure in structures:
+        ok, max_error = check_against_pymatgen(structure)
+        worst = max(worst, max_error)
+        failures += not ok
+    print(f"{'✅' if failures == 0 else '❌'} {len(structures)} structures checked, "
+          f"{failures} mismatches, max error {worst:.2e} Å")
@@ -0,0 +1,93 @@
+import ast
+import warnings
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pymatgen.core.composition import Composition
+from pymatgen.core.periodic_table import Element
+
+MAX_Z = 118
+PROPERTIES = ['X', 'atomic_radius', 'atomic_mass']
+CHEMISTRY_COLUMNS = [
+    'electronegativity_diff', 'radii_ratio', 'avg_atomic_mass', 'packing_efficiency', 'weighted_atomic_mass'
+]
+
+
+@lru_cache(maxsize=None)
+def element_table():
+    # Property arrays indexed by atomic number; index 0 is NaN and used as padding
+    table = {name: np.full(MAX_Z + 1, np.nan) for name in PROPERTIES}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for z in range(1, MAX_Z + 1):
+            element = Element.from_Z(z)
+            for name in PROPERTIES:
+                value = getattr(element, name)
+                if value is not None:
+                    table[name][z] = float(value)
+    return table
+
+
+def _element_key(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            value = ast.literal_eval(value)
+        else:
+            value = [el.strip() for el in value.split(',') if el.strip()]
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ()
+    return tuple(str(el) for el in value)
+
+
+def _padded(rows, dtype, fill):
+    width = max((len(row) for row in rows), default=0) or 1
+    out = np.full((len(rows), width), fill, dtype=dtype)
+    for i, row in enumerate(rows):
+        out[i, :len(row)] = row
+    return out
+
+
+def element_matrix(elements):
+    # Parse each distinct element list once, then broadcast back to the rows;
+    # CSV strings are factorized as-is and in-memory lists become tuples
+    hashable = elements.map(lambda value: value if isinstance(value, str) else _element_key(value))
+    codes, uniques = pd.factorize(hashable)
+    z_unique = _padded([[Element(el).Z for el in _element_key(key)] for key in uniques], np.int16, 0)
+    return z_unique[codes]
+
+
+def composition_matrix(formulas):
+    # (n, k) atomic numbers and atom fractions from each row's formula
+    codes, uniques = pd.factorize(formulas.fillna(''))
+    compositions = [Composition(formula).fractional_composition if formula else {} for formula in uniques]
+    z_unique = _padded([[el.Z for el in comp] for comp in compositions], np.int16, 0)
+    fractions_unique = _padded([[comp[el] for el in comp] for comp in compositions], np.float64, 0.0)
+    return z_unique[codes], fractions_unique[codes]
+
+
+def chemistry_features(df):
+    table = element_table()
+    z = element_matrix(df['elements'])
+    electronegativity = table['X'][z]
+    radius = table['atomic_radius'][z]
+    mass = table['atomic_mass'][z]
+
+    with warnings.catch_warnings():
+        # Rows without elements are all-NaN and should just come out as NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        avg_atomic_mass = np.nanmean(mass, axis=1)
+        features = pd.DataFrame({
+            'electronegativity_diff': np.nanmax(electronegativity, axis=1) - np.nanmin(electronegativity, axis=1),
+            'radii_ratio': np.nanmax(radius, axis=1) / np.nanmin(radius, axis=1),
+            'avg_atomic_mass': avg_atomic_mass,
+            'packing_efficiency': df['density'].to_numpy(dtype=np.float64) / avg_atomic_mass
+        }, index=df.index)
+
+    if 'formula' in df.columns:
+        z_formula, fractions = composition_matrix(df['formula'])
+        weighted = (np.nan_to_num(table['atomic_mass'][z_formula]) * fractions).sum(axis=1)
+        features['weighted_atomic_mass'] = np.where(z_formula.any(axis=1), weighted, np.nan)
+    else:
+        features['weighted_atomic_mass'] = np.nan
+    return features
@@ -0,0 +1,142 @@
+import ast
+import os
+import json
+import hashlib
+import argparse
+from pymatgen.core.structure import Structure
+from config import DATA_DIR
+
+DEFAULT_CACHE_DIR = os.path.join(DATA_DIR, "feature_cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Bumped whenever the hashed payload changes, so old entries stop matching instead of colliding
+KEY_FORMAT = 2
+
+
+def _oxidation_state(species, decimals):
+    # As text so plain elements (no oxidation state) sort next to ions; 2 and 2.0 are the same state
+    oxi = species.get('oxidation_state')
+    return "" if oxi is None else repr(round(float(oxi), decimals))
+
+
+def _rounded(value, decimals):
+    if isinstance(value, float):
+        return round(value, decimals)
+    if isinstance(value, (list, tuple)):
+        return [_rounded(x, decimals) for x in value]
+    return value
+
+
+def structure_hash(structure, version, decimals=4):
+    # Hash the lattice and sorted (species with oxidation states, wrapped fractional coords,
+    # site properties) so the key doesn't depend on site order or how the structure was serialized
+    if isinstance(structure, Structure):
+        structure = structure.as_dict()
+    elif isinstance(structure, str):
+        structure = ast.literal_eval(structure)
+
+    lattice = [[round(x, decimals) for x in row] for row in structure['lattice']['matrix']]
+    sites = []
+    for site in structure['sites']:
+        species = sorted((sp['element'], _oxidation_state(sp, decimals), round(sp['occu'], decimals)) for sp in site['species'])
+        abc = [round(round(x % 1.0, decimals) % 1.0, decimals) for x in site['abc']]
+        properties = json.dumps({name: _rounded(value, decimals) for name, value in (site.get('properties') or {}).items()},
+                                sort_keys=True, default=str)
+        sites.append([species, abc, properties])
+    sites.sort()
+
+    payload = json.dumps({'format': KEY_FORMAT, 'version': str(version), 'lattice': lattice, 'sites': sites}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class FeatureCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, structure, version):
+        return structure_hash(structure, version)
+
+    def _path(self, key):
+        # Shard on the first two hex chars to keep directories small
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                features = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Touch so eviction drops the least recently used entries first
+        os.utime(path)
+        return features
+
+    def put(self, key, features):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(features, f)
+        os.replace(tmp_path, path)
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def stats(self):
+        entries = self._entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        return {
+            'cache_dir': self.cache_dir,
+            'entries': len(entries),
+            'total_bytes': total_bytes,
+            'max_bytes': self.max_bytes,
+            'oldest_access': min((mtime for mtime, _, _ in entries), default=None),
+            'newest_access': max((mtime for mtime, _, _ in entries), default=None)
+        }
+
+    def prune(self, max_bytes=None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries())
+        total_bytes = sum(size for _, size, _ in entries)
+
+        removed = 0
+        for _, size, path in entries:
+            if total_bytes <= max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        return self.prune(max_bytes=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or prune the structure feature cache")
+    parser.add_argument('command', choices=['stats', 'prune', 'clear'])
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024,
+                        help="Size limit to prune down to")
+    args = parser.parse_args()
+
+    cache = FeatureCache(args.cache_dir, max_bytes=int(args.max_mb * 1024 * 1024))
+    if args.command == 'stats':
+        stats = cache.stats()
+        print(f"\n📦 Feature cache at {stats['cache_dir']}")
+        print(f"Entries: {stats['entries']}")
+        print(f"Size: {stats['total_bytes'] / 1024 / 1024:.2f} MB of {stats['max_bytes'] / 1024 / 1024:.2f} MB")
+    elif args.command == 'prune':
+        removed = cache.prune()
+        print(f"🧹 Removed {removed} entries, {cache.stats()['total_bytes'] / 1024 / 1024:.2f} MB left")
+    else:
+        removed = cache.clear()
+        print(f"🧹 Cleared {removed} entries")
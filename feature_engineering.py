@@ -1,21 +1,37 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-from mp_api.client import MPRester
 import json
 from datetime import datetime
 import os
-from pymatgen.core.structure import Structure
-from pymatgen.analysis.local_env import CrystalNN
-from pymatgen.core.periodic_table import Element
+import argparse
+from featurizer import make_pool
+from pipeline import batched, featurize_stage, run_pipeline, CsvSink, StoreSink, StructureStoreSink
+from structure_store import store_path_for, write_structure_store
+from mp_query import QueryScheduler
+from mp_cache import CachedMPRester, MODES as MP_CACHE_MODES
+from feature_cache import FeatureCache
+from material_store import MaterialStore, DEFAULT_STORE_PATH
+from checkpoint import RunCheckpoint, load_failure_manifest
+from instrumentation import get_profiler, timed, profile_hook
 from config import API_KEY, CHALCOGENS, CATIONS, MAX_SAMPLES, DATA_DIR
 
+FIELDS = ["material_id", "formula_pretty", "volume", "density", "symmetry", "nsites", "elements", "chemsys", "structure", "last_updated"]
+
 class DataCollector:
-    def __init__(self):
+    def __init__(self, n_workers=None, chunksize=8, use_cache=True, query_workers=4, store_path=None,
+                 batch_size=256, use_dedup=False, mp_cache=None):
         print("Starting up my data collector...")
         if not os.path.exists(DATA_DIR):
             print(f"Creating my data directory at {DATA_DIR}")
             os.makedirs(DATA_DIR)
         self.api_key = API_KEY
+        self.n_workers = n_workers
+        self.chunksize = chunksize
+        self.query_workers = query_workers
+        self.store_path = store_path or DEFAULT_STORE_PATH
+        self.batch_size = batch_size
+        self.feature_cache = FeatureCache() if use_cache else None
+        self.use_dedup = use_dedup
+        self.mp_cache = mp_cache
 
     def flatten_results(self, results, fields):
         flat_data = []
@@ -27,106 +43,121 @@ class DataCollector:
             flat_data.append(flat_entry)
         return flat_data
 
-    def get_compounds(self):
+    @timed('entry_to_record')
+    def entry_to_record(self, entry, metal, chalcogen):
+        # Safely access symmetry data
+        symmetry_data = getattr(entry, 'symmetry', None)
+        crystal_system = None
+        if symmetry_data:
+            crystal_system = str(getattr(symmetry_data, 'crystal_system', None))
+
+        # Convert elements to strings explicitly
+        elements = [str(e) for e in getattr(entry, 'elements', [])]
+
+        return {
+            'material_id': getattr(entry, 'material_id', None),
+            'formula': getattr(entry, 'formula_pretty', None),
+            'volume': getattr(entry, 'volume', None),
+            'density': getattr(entry, 'density', None),
+            'crystal_system': crystal_system,
+            'nsites': getattr(entry, 'nsites', None),
+            'elements': elements,
+            'chemsys': getattr(entry, 'chemsys', None),
+            'metal': metal,
+            'chalcogen': chalcogen,
+            'structure': json.loads(getattr(entry, 'structure').to_json()) if getattr(entry, 'structure', None) else None,
+            'last_updated': str(getattr(entry, 'last_updated', None))
+        }
+
+    def iter_chemsys(self, mpr, incremental=False, checkpoint=None, pairs=None):
+        # Yields (unit, records) per metal-chalcogen system, unit being e.g. "Cu-S"
+        known_versions = {}
+        if incremental:
+            with MaterialStore(self.store_path) as store:
+                known_versions = store.known_versions()
+            print(f"Incremental mode: {len(known_versions)} materials already in the store")
+
+        pairs = pairs or [(metal, chalcogen) for metal in CATIONS for chalcogen in CHALCOGENS]
+        if checkpoint is not None:
+            remaining = [(metal, chalcogen) for metal, chalcogen in pairs if not checkpoint.is_completed(f"{metal}-{chalcogen}")]
+            if len(remaining) < len(pairs):
+                print(f"Resuming: {len(pairs) - len(remaining)} systems already done")
+            pairs = remaining
+
+        # Incremental runs only list ids first and fetch full documents for the delta
+        scheduler = QueryScheduler(
+            mpr.materials.summary.search,
+            fields=["material_id", "last_updated"] if incremental else FIELDS,
+            max_workers=self.query_workers
+        )
+        print(f"\nLooking for {len(pairs)} metal-chalcogen systems...")
+
+        for metal, chalcogen, entries, error in scheduler.run(pairs):
+            unit = f"{metal}-{chalcogen}"
+            if error is not None:
+                print(f"❌ {unit} query failed: {error}")
+                if checkpoint is not None:
+                    checkpoint.record_failure({
+                        'material_id': None, 'error': str(error), 'unit': unit, 'stage': 'query',
+                        'metal': metal, 'chalcogen': chalcogen
+                    })
+                continue
+
+            print(f"Found {len(entries)} {unit} compounds")
+            if incremental:
+                changed_ids = [
+                    str(entry.material_id) for entry in entries
+                    if known_versions.get(str(entry.material_id)) != str(getattr(entry, 'last_updated', None))
+                ]
+                print(f"{len(changed_ids)} new or changed since the last run")
+                entries = scheduler.call(label=unit, material_ids=changed_ids, fields=FIELDS) if changed_ids else []
+
+            # Records stream into featurization while the remaining queries are still in flight
+            yield unit, (self.entry_to_record(entry, metal, chalcogen) for entry in entries)
+
+    def iter_records(self, mpr, incremental=False):
+        for _, records in self.iter_chemsys(mpr, incremental):
+            yield from records
+
+    def iter_retry(self, mpr, failures, checkpoint=None):
+        # Failed systems are queried again, failed materials are fetched by id on their own
+        failed_pairs = sorted({(f['metal'], f['chalcogen']) for f in failures if f['stage'] == 'query'})
+        if failed_pairs:
+            yield from self.iter_chemsys(mpr, pairs=failed_pairs, checkpoint=checkpoint)
+
+        systems = {f['material_id']: (f['metal'], f['chalcogen']) for f in failures if f['material_id']}
+        if checkpoint is not None and checkpoint.is_completed('retry'):
+            systems = {}
+        if systems:
+            print(f"\nRetrying {len(systems)} failed materials...")
+            scheduler = QueryScheduler(mpr.materials.summary.search, fields=FIELDS, max_workers=self.query_workers)
+            entries = scheduler.call(label='retry', material_ids=sorted(systems), fields=FIELDS)
+            yield 'retry', (self.entry_to_record(entry, *systems[str(entry.material_id)]) for entry in entries)
+
+    def get_compounds(self, incremental=False):
         print("\n🔍 Looking for compounds with these elements:")
         print(f"Chalcogens: {CHALCOGENS}")
         print(f"Metals: {CATIONS}")
 
         try:
-            compounds_data = []
-            with MPRester(self.api_key) as mpr:
-                for metal in CATIONS:
-                    for chalcogen in CHALCOGENS:
-                        print(f"\nLooking for {metal}-{chalcogen} compounds...")
-
-                        # Updated query using the correct endpoint
-                        entries = mpr.materials.summary.search(
-                            elements=[metal, chalcogen],
-                            num_elements=2,
-                            fields=["material_id", "formula_pretty", "volume", "density", "symmetry", "nsites", "elements", "chemsys", "structure"]
-                        )
-
-                        print(f"Found {len(entries)} compounds")
-
-                        for entry in entries:
-                            # Safely access symmetry data
-                            symmetry_data = getattr(entry, 'symmetry', None)
-                            crystal_system = None
-                            if symmetry_data:
-                                crystal_system = str(getattr(symmetry_data, 'crystal_system', None))
-
-                            # Convert elements to strings explicitly
-                            elements = [str(e) for e in getattr(entry, 'elements', [])]
-
-                            # Collect data
-                            data = {
-                                'material_id': getattr(entry, 'material_id', None),
-                                'formula': getattr(entry, 'formula_pretty', None),
-                                'volume': getattr(entry, 'volume', None),
-                                'density': getattr(entry, 'density', None),
-                                'crystal_system': crystal_system,
-                                'nsites': getattr(entry, 'nsites', None),
-                                'elements': elements,
-                                'chemsys': getattr(entry, 'chemsys', None),
-                                'metal': metal,
-                                'chalcogen': chalcogen,
-                                'structure': json.loads(getattr(entry, 'structure').to_json()) if getattr(entry, 'structure', None) else None
-                            }
-                            compounds_data.append(data)
-
-            if not compounds_data:
-                print("No compounds found!")
+            with CachedMPRester(self.api_key, mode=self.mp_cache) as mpr, make_pool(self.n_workers) as pool:
+                frames = list(featurize_stage(
+                    batched(self.iter_records(mpr, incremental), self.batch_size),
+                    pool=pool, chunksize=self.chunksize, cache=self.feature_cache, dedup=self.make_dedup(),
+                    n_workers=self.n_workers
+                ))
+
+            if not frames:
+                print("No new or changed compounds!" if incremental else "No compounds found!")
                 return None
 
-            # Convert to DataFrame
-            df = pd.DataFrame(compounds_data)
+            # Queries finish in any order, keep the output in CATIONS x CHALCOGENS order
+            df = pd.concat(frames, ignore_index=True)
+            pairs = [(metal, chalcogen) for metal in CATIONS for chalcogen in CHALCOGENS]
+            rank = pd.Series([pairs.index(pair) for pair in zip(df['metal'], df['chalcogen'])])
+            df = df.iloc[rank.sort_values(kind='stable').index].reset_index(drop=True)
             print(f"\nProcessed {len(df)} total compounds")
 
-            # Compute additional features
-            features = []
-            for index, row in df.iterrows():
-                try:
-                    structure = Structure.from_dict(row['structure'])
-                    nn = CrystalNN()
-
-                    # Average coordination
-                    coordination_numbers = [nn.get_cn(structure, i) for i in range(len(structure))]
-                    avg_coordination = sum(coordination_numbers) / len(coordination_numbers)
-
-                    # Average bond length
-                    bond_lengths = []
-                    for i in range(len(structure)):
-                        neighbors = nn.get_nn_info(structure, i)
-                        for n in neighbors:
-                            bond_lengths.append(n['weight'])
-                    avg_bond_length = sum(bond_lengths) / len(bond_lengths)
-
-                    # Chemical properties
-                    elements = [Element(el) for el in row['elements']]
-                    electronegativity_diff = max([e.X for e in elements]) - min([e.X for e in elements])
-                    radii_ratio = max([e.atomic_radius for e in elements]) / min([e.atomic_radius for e in elements])
-                    avg_atomic_mass = sum([e.atomic_mass for e in elements]) / len(elements)
-
-                    # New Features
-                    packing_efficiency = row['density'] / (sum([e.atomic_mass for e in elements]) / len(elements))
-                    symmetry_deviation = 1 if row['crystal_system'] not in ['Cubic', 'Hexagonal'] else 0
-
-                    features.append({
-                        'material_id': row['material_id'],
-                        'avg_coordination': avg_coordination,
-                        'avg_bond_length': avg_bond_length,
-                        'electronegativity_diff': electronegativity_diff,
-                        'radii_ratio': radii_ratio,
-                        'avg_atomic_mass': avg_atomic_mass,
-                        'packing_efficiency': packing_efficiency,
-                        'symmetry_deviation': symmetry_deviation
-                    })
-                except Exception as e:
-                    print(f"Error processing {row['material_id']}: {e}")
-
-            df_features = pd.DataFrame(features)
-            df = pd.merge(df, df_features, on='material_id', how='left')
-
             print("\nColumns in my dataset:")
             print(df.info())
 
@@ -137,18 +168,146 @@ class DataCollector:
             print("API Key being used:", self.api_key[:5] + "..." if self.api_key else "None")
             return None
 
-    def save_data(self, df):
+    def collect(self, incremental=False, resume=False, retry_failed=None):
+        # Streaming version of get_compounds + save_data: each batch is appended to disk
+        # as soon as it's featurized instead of building the whole dataset in memory
+        print("\n🔍 Looking for compounds with these elements:")
+        print(f"Chalcogens: {CHALCOGENS}")
+        print(f"Metals: {CATIONS}")
+
+        failures = None
+        if resume:
+            checkpoint = RunCheckpoint.latest()
+            if checkpoint is None:
+                print("❌ No unfinished run to resume!")
+                return
+            incremental = checkpoint.state['incremental']
+            failures = checkpoint.state.get('retry')
+            print(f"Resuming run {checkpoint.run_id} ({checkpoint.state['rows_written']} compounds already written)")
+        else:
+            run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M')
+            if retry_failed:
+                failures = load_failure_manifest(retry_failed)
+                run_id += "_retry"
+                output = f"{DATA_DIR}/chalcogenides_{timestamp}_retry.csv"
+            else:
+                output = f"{DATA_DIR}/chalcogenides_{timestamp}.csv"
+            checkpoint = RunCheckpoint.create(run_id, self.store_path if incremental else output, incremental, retry=failures)
+
+        if incremental:
+            sinks = [StoreSink(self.store_path, run_id=checkpoint.run_id)]
+        else:
+            sinks = [
+                # The structures go to the store only, they're most of the CSV
+                CsvSink(checkpoint.state['output'], append=resume, drop_columns=['structure']),
+                StructureStoreSink(store_path_for(checkpoint.state['output']), append=resume)
+            ]
+
+        try:
+            with CachedMPRester(self.api_key, mode=self.mp_cache) as mpr, make_pool(self.n_workers) as pool:
+                if failures is not None:
+                    units = self.iter_retry(mpr, failures, checkpoint=checkpoint)
+                else:
+                    units = self.iter_chemsys(mpr, incremental, checkpoint=checkpoint)
+                run_pipeline(
+                    units, sinks, batch_size=self.batch_size, pool=pool,
+                    chunksize=self.chunksize, cache=self.feature_cache, checkpoint=checkpoint, dedup=self.make_dedup(),
+                    n_workers=self.n_workers
+                )
+        except Exception as e:
+            print(f"❌ Error: {str(e)}")
+            print(f"Kept {sinks[0].rows} compounds written before the error, continue with --resume")
+            return
+
+        checkpoint.finish()
+        n_failures = len(checkpoint.state['failures'])
+        if n_failures:
+            print(f"\n⚠️ {n_failures} failures listed in {checkpoint.manifest_path}, retry with --retry-failed")
+
+        if incremental:
+            counts = sinks[0].counts
+            print(f"\n✅ Store updated: {counts['added']} added, {counts['updated']} updated, {counts['unchanged']} unchanged")
+            self.export_store()
+        elif checkpoint.state['rows_written']:
+            print(f"\n✅ Saved {checkpoint.state['rows_written']} compounds to {sinks[0].path}")
+        else:
+            print("❌ No data to save!")
+
+    def make_dedup(self):
+        # Class mapping lives in the store so later runs match against earlier representatives
+        if not self.use_dedup:
+            return None
+        from dedup import Deduplicator
+        return Deduplicator(store_path=self.store_path)
+
+    def export_store(self):
+        with MaterialStore(self.store_path) as store:
+            df_all = store.to_dataframe()
+        filename = f"{DATA_DIR}/chalcogenides_latest.csv"
+        if 'structure' in df_all.columns:
+            write_structure_store(df_all, store_path_for(filename))
+        df_all.drop(columns=['structure'], errors='ignore').to_csv(filename, index=False)
+        print(f"✅ Exported {len(df_all)} compounds to {filename}")
+
+        from similarity_index import refresh_saved_index
+        refreshed = refresh_saved_index(df_all)
+        if refreshed is not None:
+            print(f"🔎 Similarity index: {refreshed[0]} added, {refreshed[1]} updated")
+
+    def save_data(self, df, incremental=False):
         if df is None or len(df) == 0:
             print("❌ No data to save!")
             return
 
+        if incremental:
+            # Upsert into the store and refresh one deduplicated export instead of a new snapshot
+            with MaterialStore(self.store_path) as store:
+                counts = store.upsert(df.to_dict('records'))
+            print(f"\n✅ Store updated: {counts['added']} added, {counts['updated']} updated, {counts['unchanged']} unchanged")
+            self.export_store()
+            return
+
         timestamp = datetime.now().strftime('%Y%m%d_%H%M')
         filename = f"{DATA_DIR}/chalcogenides_{timestamp}.csv"
 
-        df.to_csv(filename, index=False)
+        write_structure_store(df, store_path_for(filename))
+        df.drop(columns=['structure']).to_csv(filename, index=False)
         print(f"\n✅ Saved {len(df)} compounds to {filename}")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collect and featurize chalcogenides from the Materials Project")
+    parser.add_argument('--incremental', action='store_true', help="Only fetch new or changed materials into the store")
+    parser.add_argument('--workers', type=int, default=None, help="Featurization processes, 1 runs serially")
+    parser.add_argument('--chunksize', type=int, default=8)
+    parser.add_argument('--no-cache', action='store_true', help="Recompute every structure")
+    parser.add_argument('--batch-size', type=int, default=256, help="Compounds featurized and written per batch")
+    parser.add_argument('--dedup', action='store_true', help="Featurize one structure per StructureMatcher equivalence class")
+    parser.add_argument('--mp-cache', choices=MP_CACHE_MODES, help="Materials Project response cache mode (default from config)")
+    parser.add_argument('--resume', action='store_true', help="Continue the last unfinished run from its checkpoint")
+    parser.add_argument('--retry-failed', metavar='MANIFEST', help="Only redo the failures listed in a manifest")
+    parser.add_argument('--report', help="Run report path, .json or .csv (default: <DATA_DIR>/reports/collect_<time>.json)")
+    parser.add_argument('--per-material', action='store_true', help="Keep per-material timings in the report (grows with the run)")
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], help="Also profile the whole run")
+    parser.add_argument('--profile-output', help="Where to dump the profile (default: print a summary)")
+    args = parser.parse_args(argv)
+    get_profiler().keep_materials = args.per_material
+
+    collector = DataCollector(
+        n_workers=args.workers, chunksize=args.chunksize, use_cache=not args.no_cache, batch_size=args.batch_size,
+        use_dedup=args.dedup, mp_cache=args.mp_cache
+    )
+    with profile_hook(args.profile_output, backend=args.profile):
+        collector.collect(incremental=args.incremental, resume=args.resume, retry_failed=args.retry_failed)
+
+    profiler = get_profiler()
+    profiler.print_summary()
+    if args.report:
+        profiler.write_report(args.report)
+        print(f"📝 Run report saved to {args.report}")
+    else:
+        profiler.save_report(f"{DATA_DIR}/reports", "collect")
+
+
 if __name__ == "__main__":
-    collector = DataCollector()
-    compounds_df = collector.get_compounds()
-    collector.save_data(compounds_df)
+    main()
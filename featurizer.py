@@ -0,0 +1,263 @@
+import ast
+import os
+import time
+import argparse
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from pymatgen.core.structure import Structure
+from element_table import chemistry_features
+from distances import neighbor_distances
+from instrumentation import get_profiler, peak_rss_mb
+
+FEATURE_COLUMNS = [
+    'material_id', 'avg_coordination', 'avg_bond_length', 'electronegativity_diff',
+    'radii_ratio', 'avg_atomic_mass', 'packing_efficiency', 'symmetry_deviation',
+    'weighted_atomic_mass'
+]
+
+# Bump whenever the structure features change so cached values are recomputed
+FEATURIZER_VERSION = 2
+
+# Columns each worker needs, chemistry features are computed in the parent in one vectorized pass
+INPUT_COLUMNS = ['material_id', 'structure']
+
+
+def load_structure(value):
+    if isinstance(value, Structure):
+        return value
+    # CSV snapshots store the structure dict as a Python repr string
+    if isinstance(value, str):
+        value = ast.literal_eval(value)
+    return Structure.from_dict(value)
+
+
+class StructureFeaturizer:
+    def __init__(self, use_symmetry=True, symprec=0.01):
+        # local_env pulls in most of scipy, so it's only loaded once a featurizer is built
+        from pymatgen.analysis.local_env import CrystalNN
+        self.nn = CrystalNN()
+        self.use_symmetry = use_symmetry
+        self.symprec = symprec
+        # Structures where symmetry detection failed and every site was featurized instead.
+        # Workers can't reach the parent's profiler, so _featurize_safe reports it in the timings
+        self.symmetry_fallbacks = 0
+
+    def site_orbits(self, structure):
+        # Map each symmetry-distinct site to how many sites share its orbit
+        equivalent_atoms = list(range(len(structure)))
+        if self.use_symmetry:
+            from spglib import SpglibError
+            from pymatgen.symmetry.analyzer import SpacegroupAnalyzer, SymmetryUndeterminedError
+            try:
+                dataset = SpacegroupAnalyzer(structure, symprec=self.symprec).get_symmetry_dataset()
+                equivalent_atoms = [int(i) for i in dataset.equivalent_atoms]
+            except (SymmetryUndeterminedError, SpglibError):
+                self.symmetry_fallbacks += 1
+
+        orbits = {}
+        for representative in equivalent_atoms:
+            orbits[representative] = orbits.get(representative, 0) + 1
+        return orbits
+
+    def site_neighbors(self, structure):
+        # One get_nn_info call per representative site; get_cn would repeat the same search
+        return {
+            representative: (multiplicity, self.nn.get_nn_info(structure, representative))
+            for representative, multiplicity in self.site_orbits(structure).items()
+        }
+
+    def featurize(self, structure):
+        n_sites = 0
+        centers, neighbor_indices, images, weights, multiplicities = [], [], [], [], []
+        for representative, (multiplicity, neighbors) in self.site_neighbors(structure).items():
+            n_sites += multiplicity
+            for n in neighbors:
+                centers.append(representative)
+                neighbor_indices.append(n['site_index'])
+                images.append(n['image'])
+                weights.append(n['weight'])
+                multiplicities.append(multiplicity)
+
+        # Averages over no bonds would be NaN; raising puts the material in the failure manifest
+        if not centers:
+            raise ValueError(f"CrystalNN found no neighbours in {structure.composition.reduced_formula}")
+
+        # Every bond length in one vectorized call, using the image CrystalNN found
+        multiplicities = np.array(multiplicities, dtype=np.float64)
+        distances = neighbor_distances(
+            structure.lattice.matrix, structure.frac_coords, np.array(centers, dtype=int),
+            np.array(neighbor_indices, dtype=int), np.array(images, dtype=np.float64).reshape(-1, 3)
+        )
+        n_bonds = multiplicities.sum()
+
+        return {
+            'avg_coordination': float(n_bonds / n_sites),
+            'avg_bond_length': float((multiplicities * distances).sum() / n_bonds),
+            'avg_bond_weight': float((multiplicities * np.array(weights)).sum() / n_bonds)
+        }
+
+
+# One featurizer (and CrystalNN) per process, shared by every structure it handles
+_featurizer = None
+
+
+def get_featurizer():
+    global _featurizer
+    if _featurizer is None:
+        _featurizer = StructureFeaturizer()
+    return _featurizer
+
+
+def _featurize_safe(row):
+    # Errors are returned rather than raised so one bad material can't kill the pool.
+    # Timings travel back with the result since the worker's profiler isn't the parent's
+    timings = {}
+    try:
+        start = time.perf_counter()
+        structure = load_structure(row['structure'])
+        timings['structure_from_dict_s'] = time.perf_counter() - start
+
+        featurizer = get_featurizer()
+        fallbacks = featurizer.symmetry_fallbacks
+        start = time.perf_counter()
+        structure_features = featurizer.featurize(structure)
+        timings['crystalnn_s'] = time.perf_counter() - start
+        if featurizer.symmetry_fallbacks > fallbacks:
+            timings['symmetry_fallback'] = True
+        return structure_features, None, timings
+    except Exception as e:
+        return None, str(e), timings
+    finally:
+        timings['worker_peak_rss_mb'] = peak_rss_mb()
+
+
+def make_pool(n_workers=None):
+    # A pool that can be reused across several featurize_dataframe calls
+    if n_workers == 1:
+        return nullcontext()
+    return ProcessPoolExecutor(max_workers=n_workers)
+
+
+def featurize_dataframe(df, n_workers=None, chunksize=8, cache=None, pool=None, errors=None, dedup=None):
+    rows = df[INPUT_COLUMNS].to_dict('records')
+    if not rows:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+
+    profiler = get_profiler()
+    chemsys = df['chemsys'].tolist() if 'chemsys' in df.columns else [None] * len(rows)
+    results = [None] * len(rows)
+    keys = [None] * len(rows)
+    if cache is not None:
+        for i, row in enumerate(rows):
+            try:
+                keys[i] = cache.key(row['structure'], FEATURIZER_VERSION)
+            except Exception:
+                continue
+            cached = cache.get(keys[i])
+            if cached is not None:
+                results[i] = (cached, None, None)
+        n_hits = sum(result is not None for result in results)
+        print(f"📦 Feature cache: {n_hits} hits, {len(rows) - n_hits} to compute")
+        profiler.count('feature_cache_hits', n_hits)
+
+    todo = [i for i, result in enumerate(results) if result is None]
+    copies, class_of = {}, {}
+    if dedup is not None and todo:
+        # Only one structure per equivalence class is featurized, the rest copy its features
+        reps = dedup.assign_all([rows[i]['material_id'] for i in todo], [rows[i]['structure'] for i in todo])
+        first = {}
+        for i, rep in zip(todo, reps):
+            if rep in dedup.features:
+                results[i] = (dedup.features[rep], None, None)
+            elif rep in first:
+                copies[i] = first[rep]
+            else:
+                first[rep] = i
+                class_of[i] = rep
+        todo = [i for i in todo if i in class_of]
+        print(f"🧬 Dedup: {len(reps) - len(todo)} of {len(reps)} structures reuse an equivalent structure's features")
+        profiler.count('dedup_reused', len(reps) - len(todo))
+
+    todo_rows = [rows[i] for i in todo]
+    if not todo_rows or (pool is None and n_workers == 1):
+        computed = [_featurize_safe(row) for row in todo_rows]
+    elif pool is not None:
+        computed = list(pool.map(_featurize_safe, todo_rows, chunksize=chunksize))
+    else:
+        n_workers = n_workers or os.cpu_count()
+        print(f"⚙️ Featurizing {len(todo_rows)} structures on {n_workers} workers (chunksize={chunksize})...")
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            # map keeps results in input order
+            computed = list(pool.map(_featurize_safe, todo_rows, chunksize=chunksize))
+
+    for i, result in zip(todo, computed):
+        results[i] = result
+        if result[2].pop('symmetry_fallback', False):
+            profiler.count('symmetry_fallback', chemsys=chemsys[i])
+        profiler.record_material(str(rows[i]['material_id']), chemsys=chemsys[i], **result[2])
+        profiler.count('featurized', chemsys=chemsys[i])
+        if cache is not None and keys[i] is not None and result[0] is not None:
+            cache.put(keys[i], result[0])
+        if i in class_of and result[0] is not None:
+            dedup.set_features(class_of[i], result[0])
+    for i, source in copies.items():
+        results[i] = results[source]
+    if cache is not None and todo:
+        cache.prune()
+
+    structure_rows = []
+    for row, (structure_features, error, _) in zip(rows, results):
+        if error is not None:
+            profiler.count('featurize_errors')
+            print(f"Error processing {row['material_id']}: {error}")
+            if errors is not None:
+                errors.append({'material_id': str(row['material_id']), 'error': error})
+            structure_features = {}
+        structure_rows.append({
+            'avg_coordination': structure_features.get('avg_coordination'),
+            'avg_bond_length': structure_features.get('avg_bond_length')
+        })
+
+    features = pd.DataFrame(structure_rows, index=df.index, dtype=float)
+    features.insert(0, 'material_id', df['material_id'])
+    features = features.join(chemistry_features(df))
+    features['symmetry_deviation'] = (~df['crystal_system'].isin(['Cubic', 'Hexagonal'])).astype(int)
+    return features[FEATURE_COLUMNS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute structural features for a chalcogenide CSV")
+    parser.add_argument('input', help="CSV with a structure column")
+    parser.add_argument('--output', help="Where to write the features (default: <input>_features.csv)")
+    parser.add_argument('--workers', type=int, default=None, help="Process count, 1 runs serially")
+    parser.add_argument('--chunksize', type=int, default=8)
+    parser.add_argument('--no-cache', action='store_true', help="Recompute every structure")
+    parser.add_argument('--dedup', action='store_true', help="Featurize one structure per StructureMatcher equivalence class")
+    parser.add_argument('--structures', choices=['auto', 'csv'], default='auto',
+                        help="auto reads structures from <input>.structures when it exists, csv always parses the CSV")
+    args = parser.parse_args(argv)
+
+    cache = None
+    if not args.no_cache:
+        from feature_cache import FeatureCache
+        cache = FeatureCache()
+
+    dedup = None
+    if args.dedup:
+        from dedup import Deduplicator
+        dedup = Deduplicator()
+
+    # Structures come from the packed store collection writes next to the CSV when there is one
+    from structure_store import read_csv_with_structures
+    df = read_csv_with_structures(args.input, use_store=args.structures != 'csv')
+    df_features = featurize_dataframe(df, n_workers=args.workers, chunksize=args.chunksize, cache=cache, dedup=dedup)
+
+    output = args.output or os.path.splitext(args.input)[0] + "_features.csv"
+    df_features.to_csv(output, index=False)
+    print(f"\n✅ Saved features for {len(df_features)} compounds to {output}")
+
+
+if __name__ == "__main__":
+    main()
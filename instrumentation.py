@@ -0,0 +1,186 @@
+import os
+import sys
+import csv
+import json
+import time
+import resource
+import threading
+import functools
+from datetime import datetime
+from contextlib import contextmanager
+
+
+def peak_rss_mb(children=False):
+    # ru_maxrss is KB on Linux and bytes on macOS
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return usage.ru_maxrss / scale
+
+
+class RunProfiler:
+    def __init__(self, keep_materials=False):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.timings = {}
+        self.counters = {}
+        # Per-material rows grow with the dataset, so they're only kept on request;
+        # material_stats always has the count/total/max of every per-material value
+        self.keep_materials = keep_materials
+        self.materials = []
+        self.material_stats = {}
+
+    def add_time(self, name, seconds, chemsys=None):
+        with self._lock:
+            timing = self.timings.setdefault((name, chemsys), {'calls': 0, 'total_s': 0.0, 'max_s': 0.0})
+            timing['calls'] += 1
+            timing['total_s'] += seconds
+            timing['max_s'] = max(timing['max_s'], seconds)
+
+    @contextmanager
+    def stage(self, name, chemsys=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, chemsys)
+
+    def count(self, name, n=1, chemsys=None):
+        with self._lock:
+            self.counters[(name, chemsys)] = self.counters.get((name, chemsys), 0) + n
+
+    def record_material(self, material_id, chemsys=None, **timings):
+        # timings come back from the featurization worker, e.g. crystalnn_s or worker_peak_rss_mb;
+        # keys ending in _s are also added to the stage totals
+        with self._lock:
+            if self.keep_materials:
+                self.materials.append(dict(material_id=material_id, chemsys=chemsys, **timings))
+            for name, value in timings.items():
+                stat = self.material_stats.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+                stat['count'] += 1
+                stat['total'] += value
+                stat['max'] = max(stat['max'], value)
+        for name, seconds in timings.items():
+            if name.endswith('_s'):
+                self.add_time(name[:-2], seconds, chemsys)
+
+    def report(self):
+        stages = {}
+        for (name, chemsys), timing in self.timings.items():
+            stage = stages.setdefault(name, {'calls': 0, 'total_s': 0.0, 'max_s': 0.0, 'by_chemsys': {}})
+            stage['calls'] += timing['calls']
+            stage['total_s'] += timing['total_s']
+            stage['max_s'] = max(stage['max_s'], timing['max_s'])
+            if chemsys is not None:
+                stage['by_chemsys'][chemsys] = timing
+
+        counters = {}
+        for (name, chemsys), value in self.counters.items():
+            counter = counters.setdefault(name, {'total': 0, 'by_chemsys': {}})
+            counter['total'] += value
+            if chemsys is not None:
+                counter['by_chemsys'][chemsys] = value
+
+        return {
+            'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'wall_s': time.time() - self.started,
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_rss_children_mb': peak_rss_mb(children=True),
+            'stages': stages,
+            'counters': counters,
+            'material_stats': self.material_stats,
+            'materials': self.materials
+        }
+
+    def write_report(self, path):
+        report = self.report()
+        if path.endswith('.csv'):
+            # Flat stage x chemsys table, per-material timings go next to it
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['stage', 'chemsys', 'calls', 'total_s', 'max_s'])
+                for (name, chemsys), timing in sorted(self.timings.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+                    writer.writerow([name, chemsys or '', timing['calls'], f"{timing['total_s']:.6f}", f"{timing['max_s']:.6f}"])
+            if self.materials:
+                materials_path = os.path.splitext(path)[0] + "_materials.csv"
+                columns = sorted({key for row in self.materials for key in row})
+                with open(materials_path, 'w', newline='') as f:
+                    writer = csv.DictWriter(f, fieldnames=columns)
+                    writer.writeheader()
+                    writer.writerows(self.materials)
+        else:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2, default=str)
+        return path
+
+    def save_report(self, directory, prefix):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        self.write_report(path)
+        print(f"📝 Run report saved to {path}")
+        return path
+
+    def print_summary(self):
+        report = self.report()
+        print(f"\n⏱️ Run took {report['wall_s']:.1f}s, peak RSS {report['peak_rss_mb']:.0f} MB")
+        for name, stage in sorted(report['stages'].items(), key=lambda item: -item[1]['total_s']):
+            print(f"  {name:<24} {stage['total_s']:9.3f}s over {stage['calls']} calls")
+
+
+# One profiler per process, so any module can add timings without passing it around
+_profiler = RunProfiler()
+
+
+def get_profiler():
+    return _profiler
+
+
+def reset_profiler(keep_materials=False):
+    global _profiler
+    _profiler = RunProfiler(keep_materials=keep_materials)
+    return _profiler
+
+
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_profiler().stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile_hook(output=None, backend='cprofile'):
+    # Optional whole-run profile on top of the stage timers
+    if backend is None:
+        yield
+        return
+
+    if backend == 'pyinstrument':
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            if output:
+                with open(output, 'w') as f:
+                    f.write(profiler.output_html())
+            else:
+                print(profiler.output_text())
+        return
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if output:
+            profiler.dump_stats(output)
+        else:
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
@@ -0,0 +1,258 @@
+import os
+import ast
+import json
+import sqlite3
+import hashlib
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from config import DATA_DIR
+
+DEFAULT_STORE_PATH = os.path.join(DATA_DIR, "materials.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS materials (
+    material_id TEXT PRIMARY KEY,
+    chemsys TEXT,
+    last_updated TEXT,
+    content_hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    stored_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_materials_chemsys ON materials (chemsys);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    material_id TEXT NOT NULL,
+    change TEXT NOT NULL,
+    old_hash TEXT,
+    new_hash TEXT,
+    changed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clusters (
+    material_id TEXT NOT NULL,
+    label_set TEXT NOT NULL,
+    cluster INTEGER NOT NULL,
+    k INTEGER NOT NULL,
+    assigned_at TEXT NOT NULL,
+    PRIMARY KEY (material_id, label_set)
+);
+CREATE TABLE IF NOT EXISTS structure_classes (
+    material_id TEXT PRIMARY KEY,
+    representative_id TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    assigned_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_structure_classes_bucket ON structure_classes (bucket);
+CREATE TABLE IF NOT EXISTS class_features (
+    representative_id TEXT PRIMARY KEY,
+    featurizer_version INTEGER NOT NULL,
+    features TEXT NOT NULL,
+    computed_at TEXT NOT NULL
+);
+"""
+
+
+def _to_json_value(value):
+    # NaN first: np.float32/np.float64 NaN would otherwise come out of .item() as a float NaN,
+    # which json writes as a bare NaN and which never hashes equal to a missing value
+    if isinstance(value, (float, np.floating)) and np.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def record_hash(record):
+    payload = json.dumps(record, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class MaterialStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def known_versions(self, chemsys=None):
+        query = "SELECT material_id, last_updated FROM materials"
+        params = ()
+        if chemsys is not None:
+            query += " WHERE chemsys = ?"
+            params = (chemsys,)
+        return dict(self.conn.execute(query, params).fetchall())
+
+    def content_hashes(self, material_ids, chunk_size=500):
+        # Stored hashes for just these ids; chunked to stay under SQLite's bound-variable limit
+        hashes = {}
+        for start in range(0, len(material_ids), chunk_size):
+            chunk = material_ids[start:start + chunk_size]
+            query = f"SELECT material_id, content_hash FROM materials WHERE material_id IN ({', '.join('?' * len(chunk))})"
+            hashes.update(self.conn.execute(query, chunk).fetchall())
+        return hashes
+
+    def upsert(self, records, run_id=None):
+        run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        now = datetime.now().isoformat(timespec='seconds')
+
+        # Later rows win when the same material_id shows up twice
+        deduped = {}
+        for record in records:
+            record = {key: _to_json_value(value) for key, value in record.items()}
+            deduped[str(record['material_id'])] = record
+
+        existing = self.content_hashes(list(deduped))
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+        with self.conn:
+            for material_id, record in deduped.items():
+                new_hash = record_hash(record)
+                old_hash = existing.get(material_id)
+                if old_hash == new_hash:
+                    counts['unchanged'] += 1
+                    continue
+
+                change = 'added' if old_hash is None else 'updated'
+                counts[change] += 1
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO materials VALUES (?, ?, ?, ?, ?, ?)",
+                    (material_id, record.get('chemsys'), record.get('last_updated'), new_hash,
+                     json.dumps(record, default=str), now)
+                )
+                self.conn.execute(
+                    "INSERT INTO changes (run_id, material_id, change, old_hash, new_hash, changed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (run_id, material_id, change, old_hash, new_hash, now)
+                )
+        return counts
+
+    def to_dataframe(self, chemsys=None):
+        query = "SELECT data FROM materials"
+        params = ()
+        if chemsys is not None:
+            query += " WHERE chemsys = ?"
+            params = (chemsys,)
+        query += " ORDER BY chemsys, material_id"
+        return pd.DataFrame([json.loads(data) for (data,) in self.conn.execute(query, params)])
+
+    def changes(self, run_id=None):
+        query = "SELECT run_id, material_id, change, old_hash, new_hash, changed_at FROM changes"
+        params = ()
+        if run_id is not None:
+            query += " WHERE run_id = ?"
+            params = (run_id,)
+        return pd.read_sql_query(query + " ORDER BY id", self.conn, params=params)
+
+    def save_clusters(self, label_set, material_ids, labels, k):
+        # Kept out of the material JSON so relabelling doesn't show up as a content change
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.execute("DELETE FROM clusters WHERE label_set = ?", (label_set,))
+            self.conn.executemany(
+                "INSERT INTO clusters VALUES (?, ?, ?, ?, ?)",
+                [(str(material_id), label_set, int(label), int(k), now) for material_id, label in zip(material_ids, labels)]
+            )
+        return len(labels)
+
+    def clusters(self, label_set=None):
+        query = "SELECT material_id, label_set, cluster, k, assigned_at FROM clusters"
+        params = ()
+        if label_set is not None:
+            query += " WHERE label_set = ?"
+            params = (label_set,)
+        return pd.read_sql_query(query + " ORDER BY label_set, material_id", self.conn, params=params)
+
+    def save_classes(self, assignments):
+        # assignments are (material_id, representative_id, bucket) from dedup.Deduplicator
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO structure_classes VALUES (?, ?, ?, ?)",
+                [(str(material_id), str(representative_id), bucket, now) for material_id, representative_id, bucket in assignments]
+            )
+        return len(assignments)
+
+    def save_class_features(self, features, featurizer_version):
+        # features is representative_id -> structure features, computed by that featurizer version
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO class_features VALUES (?, ?, ?, ?)",
+                [(str(rep), featurizer_version, json.dumps(values), now) for rep, values in features.items()]
+            )
+        return len(features)
+
+    def class_representatives(self, bucket, featurizer_version=None):
+        # (representative_id, material JSON, features JSON) for each class in a bucket that has
+        # its representative stored. Features from another featurizer version come back as None
+        query = (
+            "SELECT DISTINCT c.representative_id, m.data, f.features FROM structure_classes c "
+            "JOIN materials m ON m.material_id = c.representative_id "
+            "LEFT JOIN class_features f ON f.representative_id = c.representative_id AND f.featurizer_version = ? "
+            "WHERE c.bucket = ?"
+        )
+        return self.conn.execute(query, (featurizer_version, bucket)).fetchall()
+
+    def structure_classes(self):
+        return pd.read_sql_query(
+            "SELECT material_id, representative_id, bucket, assigned_at FROM structure_classes ORDER BY bucket, material_id",
+            self.conn
+        )
+
+    def import_csv(self, path):
+        df = pd.read_csv(path)
+        # Older snapshots store list/dict columns as Python repr strings
+        for column in ['elements', 'structure']:
+            if column in df.columns:
+                df[column] = df[column].map(
+                    lambda value: ast.literal_eval(value) if isinstance(value, str) and value[:1] in '[{' else value
+                )
+        run_id = f"import_{os.path.basename(path)}"
+        return self.upsert(df.to_dict('records'), run_id=run_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local material store")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="Upsert CSV snapshots into the store")
+    import_parser.add_argument('csv', nargs='+')
+    subparsers.add_parser('stats', help="Show store size and recent changes")
+    export_parser = subparsers.add_parser('export', help="Write the store out as one deduplicated CSV")
+    export_parser.add_argument('output')
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH)
+    args = parser.parse_args()
+
+    with MaterialStore(args.store) as store:
+        if args.command == 'import':
+            for path in args.csv:
+                counts = store.import_csv(path)
+                print(f"📥 {path}: {counts['added']} added, {counts['updated']} updated, {counts['unchanged']} unchanged")
+        elif args.command == 'stats':
+            df = store.to_dataframe()
+            print(f"\n📊 {len(df)} materials in {args.store}")
+            if len(df):
+                print(df['chemsys'].value_counts())
+            changes = store.changes()
+            print(f"\nChange log: {len(changes)} entries")
+            if len(changes):
+                print(changes.groupby(['run_id', 'change']).size())
+            classes = store.structure_classes()
+            if len(classes):
+                print(f"\nStructure classes: {len(classes)} materials in {classes['representative_id'].nunique()} classes")
+            clusters = store.clusters()
+            if len(clusters):
+                print(f"\nCluster labels: {len(clusters)} entries")
+                print(clusters.groupby(['label_set', 'k']).size())
+        else:
+            df = store.to_dataframe()
+            df.to_csv(args.output, index=False)
+            print(f"✅ Exported {len(df)} materials to {args.output}")
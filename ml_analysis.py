@@ -1,54 +1,76 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from sklearn.model_selection import train_test_split, GroupShuffleSplit
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from sklearn.metrics import mean_squared_error, r2_score, classification_report, confusion_matrix
 from sklearn.preprocessing import StandardScaler
 import os
+import time
+from instrumentation import get_profiler, timed
+from training import cross_validate_grid, leaderboard, make_estimator, score_fold, uses_bins, ESTIMATORS
+from model_artifacts import save_artifact
+from prepared_dataset import load_prepared, FEATURE_SETS
+from dataset_loader import load_dataset
 from config import DATA_DIR
 
 class MLModel:
     def __init__(self, filename):
         self.filepath = os.path.join(DATA_DIR, filename)
-        self.df = pd.read_csv(self.filepath)
+        # Full precision: float32 inputs (and band_gap target) shift the fitted models and their scores
+        self.df = load_dataset(self.filepath, downcast=False)
         self.scaler = StandardScaler()
+        self.target_band_gap = 'band_gap'
+        self.target_class = 'is_semiconductor'
 
-    def preprocess_data(self, drop_energy=True):
-        print("\n🔄 Preprocessing Data...")
-
-        # Drop non-numeric columns, except for 'chemsys'
-        numeric_cols = self.df.select_dtypes(include=[np.number]).columns.tolist()
-        self.df = self.df[numeric_cols]
+        # Numeric matrix, column stats and scaled values are computed once and shared by every variant;
+        # self.df itself is never modified
+        self.dataset = load_prepared(self.filepath, self.df)
+        self.groups = self.dataset.groups
+        band_gap = self.dataset.column('band_gap')
+        self.targets = {
+            self.target_band_gap: band_gap,
+            # 1 if band_gap > 0
+            self.target_class: (band_gap > 0).astype(int)
+        }
 
-        # Handle missing values by filling with mean
-        self.df.fillna(self.df.mean(), inplace=True)
+    @timed('preprocess_data')
+    def preprocess_data(self, drop_energy=True, features=None):
+        print("\n🔄 Preprocessing Data...")
 
         # Feature selection
-        self.features = ['volume', 'density', 'nsites']
-        if not drop_energy:
-            self.features.append('formation_energy_per_atom')
-        self.target_band_gap = 'band_gap'
-        self.target_class = 'is_semiconductor'
+        if features is None:
+            features = ['volume', 'density', 'nsites']
+            if not drop_energy:
+                features.append('formation_energy_per_atom')
+        self.features = list(features)
+
+        # Standardized columns come from the prepared dataset, the scaler is rebuilt from its stats
+        self.view = self.dataset.view(self.features)
+        self.scaler = self.view.scaler()
+        return self.view.X_scaled
 
-        # Add a binary column for classification (1 if band_gap > 0)
-        self.df[self.target_class] = (self.df['band_gap'] > 0).astype(int)
+    def grouped_split(self, test_size=0.2):
+        # Hold out whole chemical systems so the test score isn't inflated by near-duplicate compositions
+        splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=42)
+        return next(splitter.split(self.groups, groups=self.groups))
 
-        # Standardize features
-        X = self.df[self.features]
-        X_scaled = self.scaler.fit_transform(X)
-        return X_scaled
+    def train_test_indices(self, grouped=False, test_size=0.2):
+        # The plain row split is the baseline the reported scores were measured on
+        if grouped:
+            return self.grouped_split(test_size)
+        return train_test_split(np.arange(len(self.groups)), test_size=test_size, random_state=42)
 
-    def train_regression_model(self, X_scaled):
+    @timed('train_regression_model')
+    def train_regression_model(self, X_scaled, grouped=False, n_jobs=None):
         print("\n📈 Training Regression Model for Band Gap Prediction...")
-        y = self.df[self.target_band_gap]
+        y = self.targets[self.target_band_gap]
 
-        # Train-test split
-        X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+        # Train-test split, by row unless grouped by chemsys
+        train_idx, test_idx = self.train_test_indices(grouped)
+        X_train, X_test, y_train, y_test = X_scaled[train_idx], X_scaled[test_idx], y[train_idx], y[test_idx]
 
         # Model training
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
+        model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
         model.fit(X_train, y_train)
 
         # Predictions
@@ -68,15 +90,17 @@ class MLModel:
 
         return model
 
-    def train_classification_model(self, X_scaled):
+    @timed('train_classification_model')
+    def train_classification_model(self, X_scaled, grouped=False, n_jobs=None):
         print("\n📊 Training Classification Model for Metal vs Semiconductor...")
-        y = self.df[self.target_class]
+        y = self.targets[self.target_class]
 
-        # Train-test split
-        X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+        # Train-test split, by row unless grouped by chemsys
+        train_idx, test_idx = self.train_test_indices(grouped)
+        X_train, X_test, y_train, y_test = X_scaled[train_idx], X_scaled[test_idx], y[train_idx], y[test_idx]
 
         # Model training
-        model = RandomForestClassifier(n_estimators=100, random_state=42)
+        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
         model.fit(X_train, y_train)
 
         # Predictions
@@ -84,6 +108,9 @@ class MLModel:
 
         # Evaluation
         print(classification_report(y_test, y_pred))
+        # Plotting libraries are only loaded when a figure is drawn
+        from plotting import plt
+        import seaborn as sns
         cm = confusion_matrix(y_test, y_pred)
         sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
         plt.xlabel('Predicted')
@@ -94,18 +121,154 @@ class MLModel:
 
         return model
 
-if __name__ == "__main__":
+    def save_model(self, model, name, task, metrics=None, estimator='random_forest'):
+        # Stores the estimator with the scaler (or bin edges) and feature list it was trained with
+        target = self.target_band_gap if task == 'regression' else self.target_class
+        bin_edges = self.view.bin_edges() if uses_bins(estimator) else None
+        return save_artifact(name, model, self.scaler, self.features, task, target, metrics, bin_edges=bin_edges)
+
+    def model_input(self, estimator, X_scaled=None):
+        # Histogram models take the dataset's shared bin codes, forests the scaled matrix
+        if uses_bins(estimator):
+            return self.view.X_binned
+        return self.view.X_scaled if X_scaled is None else X_scaled
+
+    @timed('ablation')
+    def run_ablation(self, task='regression', feature_sets=None):
+        # Same grouped split and estimator for every feature set, only the columns change
+        print(f"\n🧪 Feature ablation for {task}...")
+        feature_sets = FEATURE_SETS if feature_sets is None else feature_sets
+        target = self.target_band_gap if task == 'regression' else self.target_class
+        y = self.targets[target]
+        train_idx, test_idx = self.grouped_split()
+
+        rows = []
+        for name, features in feature_sets.items():
+            if not self.dataset.has(features):
+                print(f"⚠️ Skipping {name}, missing {[f for f in features if f not in self.dataset.column_index]}")
+                continue
+            X = self.dataset.view(features).X_scaled
+            model = make_estimator(task).set_params(n_estimators=100, n_jobs=-1)
+            start = time.perf_counter()
+            model.fit(X[train_idx], y[train_idx])
+            fit_s = time.perf_counter() - start
+            rows.append(dict(variant=name, n_features=len(features), fit_s=fit_s,
+                             **score_fold(task, y[test_idx], model.predict(X[test_idx]))))
+
+        results = pd.DataFrame(rows)
+        print(results.to_string(index=False))
+        os.makedirs(f"{DATA_DIR}/reports", exist_ok=True)
+        results.to_csv(f"{DATA_DIR}/reports/ablation_{task}.csv", index=False)
+        return results
+
+    @timed('search_hyperparameters')
+    def search_hyperparameters(self, X_scaled, task='regression', param_grid=None, n_splits=5, n_jobs=-1,
+                               backend='threading', estimator='random_forest'):
+        print(f"\n🔎 Grouped {n_splits}-fold {estimator} search for {task}...")
+        target = self.target_band_gap if task == 'regression' else self.target_class
+        y = self.targets[target]
+
+        # The scaled (or binned) matrix is built once by the dataset and shared by every fold
+        X = self.model_input(estimator, X_scaled)
+        fold_results, candidates = cross_validate_grid(
+            X, y, self.groups, task=task, param_grid=param_grid, n_splits=n_splits, n_jobs=n_jobs,
+            backend=backend, estimator=estimator
+        )
+        board = leaderboard(fold_results, task)
+        print(board.head(10).to_string(index=False))
+
+        os.makedirs(f"{DATA_DIR}/reports", exist_ok=True)
+        suffix = f"{estimator}_{task}_{len(self.features)}features"
+        fold_results.to_csv(f"{DATA_DIR}/reports/cv_folds_{suffix}.csv", index=False)
+        board.to_csv(f"{DATA_DIR}/reports/leaderboard_{suffix}.csv", index=False)
+
+        # Refit the winner on all rows
+        best_params = candidates[board.loc[0, 'candidate']]
+        print(f"🏆 Best {task} params: {best_params}")
+        model = make_estimator(task, estimator).set_params(**best_params)
+        if 'n_jobs' in model.get_params():
+            model.set_params(n_jobs=n_jobs)
+        model.fit(X, y)
+        return model, board
+
+    @timed('compare_estimators')
+    def compare_estimators(self, task='regression', estimators=None, n_splits=5, n_jobs=-1, backend='threading'):
+        # Default settings of each backend on the same grouped folds, side by side
+        print(f"\n⚖️ Comparing estimators for {task}...")
+        target = self.target_band_gap if task == 'regression' else self.target_class
+        y = self.targets[target]
+
+        rows = []
+        for estimator in estimators or ESTIMATORS:
+            fold_results, _ = cross_validate_grid(
+                self.model_input(estimator), y, self.groups, task=task, param_grid={}, n_splits=n_splits,
+                n_jobs=n_jobs, backend=backend, estimator=estimator
+            )
+            row = leaderboard(fold_results, task).drop(columns=['rank', 'candidate', 'params']).iloc[0]
+            rows.append(dict(estimator=estimator, **row.to_dict()))
+
+        report = pd.DataFrame(rows)
+        print(report.to_string(index=False))
+        os.makedirs(f"{DATA_DIR}/reports", exist_ok=True)
+        report.to_csv(f"{DATA_DIR}/reports/estimators_{task}_{len(self.features)}features.csv", index=False)
+        return report
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train band gap and metal/semiconductor models")
+    parser.add_argument('--search', action='store_true', help="Run grouped K-fold hyperparameter search")
+    parser.add_argument('--ablation', action='store_true', help="Compare the feature sets in FEATURE_SETS")
+    parser.add_argument('--compare', action='store_true', help="Compare the estimator backends on grouped folds")
+    parser.add_argument('--estimator', default='random_forest', choices=sorted(ESTIMATORS),
+                        help="Estimator backend for --search")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--backend', default='threading', choices=['threading', 'loky'],
+                        help="joblib backend for the search, loky uses worker processes")
+    parser.add_argument('--grouped-split', action='store_true',
+                        help="Hold out whole chemical systems in the single-split models (changes their scores)")
+    args = parser.parse_args(argv)
+
     filename = "chalcogenides_latest.csv"
     ml_model = MLModel(filename)
 
     # Test without formation energy
     print("\n--- Model Without Formation Energy ---")
     X_scaled_no_energy = ml_model.preprocess_data(drop_energy=True)
-    reg_model_no_energy = ml_model.train_regression_model(X_scaled_no_energy)
-    clf_model_no_energy = ml_model.train_classification_model(X_scaled_no_energy)
+    reg_model_no_energy = ml_model.train_regression_model(X_scaled_no_energy, grouped=args.grouped_split)
+    clf_model_no_energy = ml_model.train_classification_model(X_scaled_no_energy, grouped=args.grouped_split)
+    ml_model.save_model(reg_model_no_energy, "band_gap_regression_no_energy", 'regression')
+    ml_model.save_model(clf_model_no_energy, "semiconductor_classifier_no_energy", 'classification')
 
     # Test with formation energy
     print("\n--- Model With Formation Energy ---")
     X_scaled_with_energy = ml_model.preprocess_data(drop_energy=False)
-    reg_model_with_energy = ml_model.train_regression_model(X_scaled_with_energy)
-    clf_model_with_energy = ml_model.train_classification_model(X_scaled_with_energy)
+    reg_model_with_energy = ml_model.train_regression_model(X_scaled_with_energy, grouped=args.grouped_split)
+    clf_model_with_energy = ml_model.train_classification_model(X_scaled_with_energy, grouped=args.grouped_split)
+    ml_model.save_model(reg_model_with_energy, "band_gap_regression", 'regression')
+    ml_model.save_model(clf_model_with_energy, "semiconductor_classifier", 'classification')
+
+    if args.ablation:
+        for task in ('regression', 'classification'):
+            ml_model.run_ablation(task)
+
+    if args.compare:
+        for task in ('regression', 'classification'):
+            ml_model.compare_estimators(task, n_splits=args.folds, n_jobs=args.n_jobs, backend=args.backend)
+
+    if args.search:
+        for task, name in (('regression', "band_gap_regression"), ('classification', "semiconductor_classifier")):
+            model, board = ml_model.search_hyperparameters(X_scaled_with_energy, task=task, n_splits=args.folds,
+                                                           n_jobs=args.n_jobs, backend=args.backend,
+                                                           estimator=args.estimator)
+            # The tuned model becomes the next version of the default artifact
+            ml_model.save_model(model, name, task, metrics=board.iloc[0].drop(['rank', 'candidate']).to_dict(),
+                                estimator=args.estimator)
+
+    get_profiler().print_summary()
+    get_profiler().save_report(f"{DATA_DIR}/reports", "training")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import os
+import glob
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from instrumentation import get_profiler
+from config import DATA_DIR
+
+MODEL_DIR = os.path.join(DATA_DIR, "models")
+ARTIFACT_FORMAT = 1
+
+STRUCTURE_COLUMNS = ['volume', 'density', 'nsites']
+CHEMISTRY_INPUTS = ['electronegativity_diff', 'radii_ratio', 'avg_atomic_mass', 'packing_efficiency', 'weighted_atomic_mass']
+FEATURIZER_INPUTS = ['avg_coordination', 'avg_bond_length']
+
+# Versioned model artifacts: data/models/<name>/v<N>.joblib. Artifacts are written
+# uncompressed so joblib can memory-map the tree arrays instead of copying them in.
+# joblib and sklearn are imported on first save/load, listing models needs neither
+
+
+def artifact_versions(name):
+    paths = glob.glob(os.path.join(MODEL_DIR, name, "v*.joblib"))
+    return sorted(int(os.path.basename(path)[1:-len(".joblib")]) for path in paths)
+
+
+def save_artifact(name, model, scaler, features, task, target, metrics=None, bin_edges=None):
+    import joblib
+    import sklearn
+    os.makedirs(os.path.join(MODEL_DIR, name), exist_ok=True)
+    versions = artifact_versions(name)
+    version = versions[-1] + 1 if versions else 1
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'name': name,
+        'version': version,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'sklearn_version': sklearn.__version__,
+        'task': task,
+        'target': target,
+        'features': list(features),
+        # Plain arrays rather than the fitted StandardScaler, applied with numpy at predict time
+        'scaler_mean': np.asarray(scaler.mean_, dtype=np.float64),
+        'scaler_scale': np.asarray(scaler.scale_, dtype=np.float64),
+        'model': model,
+        # Histogram models are trained on bin codes, these map raw features back onto them
+        'bin_edges': bin_edges,
+        'metrics': metrics or {}
+    }
+    path = os.path.join(MODEL_DIR, name, f"v{version}.joblib")
+    joblib.dump(artifact, path)
+    print(f"💾 Saved {task} model {name} v{version} to {path}")
+    return path
+
+
+class ModelArtifact:
+    def __init__(self, artifact, path):
+        self.path = path
+        self.artifact = artifact
+        self.model = artifact['model']
+        self.features = artifact['features']
+        self.task = artifact['task']
+        self.mean = artifact['scaler_mean']
+        self.scale = artifact['scaler_scale']
+
+    @classmethod
+    def load(cls, name, version=None, mmap_mode='r'):
+        import joblib
+        import sklearn
+        versions = artifact_versions(name)
+        if not versions:
+            raise FileNotFoundError(f"No saved versions of model {name} in {MODEL_DIR}")
+        version = versions[-1] if version is None else version
+        path = os.path.join(MODEL_DIR, name, f"v{version}.joblib")
+        with get_profiler().stage('model_load'):
+            artifact = joblib.load(path, mmap_mode=mmap_mode)
+        if artifact['sklearn_version'] != sklearn.__version__:
+            print(f"⚠️ {name} v{version} was saved with scikit-learn {artifact['sklearn_version']}, "
+                  f"running {sklearn.__version__}")
+        return cls(artifact, path)
+
+    @property
+    def version(self):
+        return self.artifact['version']
+
+    def prepare_features(self, df):
+        # Fill in whatever model inputs the candidates don't already carry
+        df = df.copy()
+        missing = [feature for feature in self.features if feature not in df.columns]
+        if missing and 'structure' in df.columns:
+            from featurizer import load_structure, get_featurizer
+            structures = [load_structure(value) for value in df['structure']]
+            for column, values in (
+                ('volume', [s.volume for s in structures]),
+                ('density', [float(s.density) for s in structures]),
+                ('nsites', [len(s) for s in structures]),
+                ('formula', [s.composition.reduced_formula for s in structures]),
+                ('elements', [', '.join(el.symbol for el in s.composition.elements) for s in structures])
+            ):
+                if column not in df.columns:
+                    df[column] = values
+            if any(feature in missing for feature in FEATURIZER_INPUTS):
+                featurizer = get_featurizer()
+                rows = [featurizer.featurize(structure) for structure in structures]
+                for feature in FEATURIZER_INPUTS:
+                    if feature not in df.columns:
+                        df[feature] = [row[feature] for row in rows]
+        if any(feature not in df.columns for feature in CHEMISTRY_INPUTS if feature in self.features) and 'elements' in df.columns:
+            from element_table import chemistry_features
+            chemistry = chemistry_features(df)
+            for feature in CHEMISTRY_INPUTS:
+                if feature not in df.columns:
+                    df[feature] = chemistry[feature]
+
+        missing = [feature for feature in self.features if feature not in df.columns]
+        if missing:
+            raise ValueError(f"Missing model inputs {missing} and no structure column to derive them from")
+        X = df[self.features].to_numpy(dtype=np.float64)
+        # Unknown values get the training mean, i.e. 0 after scaling, as in preprocess_data
+        return np.where(np.isnan(X), self.mean, X)
+
+    def transform(self, X):
+        if self.artifact.get('bin_edges') is not None:
+            from prepared_dataset import apply_bins
+            return np.column_stack([apply_bins(X[:, i], edges) for i, edges in enumerate(self.artifact['bin_edges'])])
+        return (X - self.mean) / self.scale
+
+    def predict_batch(self, df, batch_size=10000):
+        X = self.transform(self.prepare_features(df))
+        predictions = []
+        probabilities = []
+        with get_profiler().stage('predict_batch'):
+            for start in range(0, len(X), batch_size):
+                X_batch = X[start:start + batch_size]
+                predictions.append(self.model.predict(X_batch))
+                if self.task == 'classification':
+                    probabilities.append(self.model.predict_proba(X_batch)[:, -1])
+
+        result = pd.DataFrame(index=df.index)
+        if 'material_id' in df.columns:
+            result['material_id'] = df['material_id']
+        result[f"predicted_{self.artifact['target']}"] = np.concatenate(predictions) if predictions else []
+        if self.task == 'classification':
+            result[f"probability_{self.artifact['target']}"] = np.concatenate(probabilities) if probabilities else []
+        return result
+
+
+def predict_batch(name, df, version=None, batch_size=10000):
+    return ModelArtifact.load(name, version).predict_batch(df, batch_size=batch_size)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Score candidate materials with a saved model")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    list_parser = subparsers.add_parser('list', help="Show saved models and versions")
+    predict_parser = subparsers.add_parser('predict', help="Predict for a CSV of candidates")
+    predict_parser.add_argument('model', help="Model name, e.g. band_gap_regression")
+    predict_parser.add_argument('input', help="CSV with the model features or a structure column")
+    predict_parser.add_argument('--version', type=int, help="Defaults to the latest version")
+    predict_parser.add_argument('--batch-size', type=int, default=10000)
+    predict_parser.add_argument('--output', help="Default: <input>_<model>_predictions.csv")
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for path in sorted(glob.glob(os.path.join(MODEL_DIR, "*"))):
+            name = os.path.basename(path)
+            print(f"{name}: versions {artifact_versions(name)}")
+    else:
+        artifact = ModelArtifact.load(args.model, args.version)
+        df = pd.read_csv(args.input)
+        start = time.perf_counter()
+        predictions = artifact.predict_batch(df, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        output = args.output or f"{os.path.splitext(args.input)[0]}_{args.model}_predictions.csv"
+        predictions.to_csv(output, index=False)
+        print(f"✅ Scored {len(df)} candidates with {args.model} v{artifact.version} in {elapsed:.2f}s "
+              f"({len(df) / max(elapsed, 1e-9):.0f}/s), saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import os
+import gzip
+import json
+import time
+import pickle
+import threading
+import hashlib
+import argparse
+from instrumentation import get_profiler
+from config import API_KEY, DATA_DIR, SETTINGS
+
+DEFAULT_CACHE_DIR = os.path.join(DATA_DIR, "mp_cache")
+MODES = ('record', 'replay', 'refresh', 'off')
+
+# Record/replay cache for Materials Project searches. Responses are the document lists
+# the search returned, pickled and gzipped, keyed by endpoint + query. 'record' serves
+# entries younger than the TTL and fetches (and stores) the rest, 'replay' never touches
+# the network and fails on a miss, 'refresh' always fetches, 'off' bypasses the cache
+
+
+class CacheMiss(LookupError):
+    pass
+
+
+def query_key(endpoint, query):
+    # Argument order and list order don't change the answer, so neither changes the key
+    normalized = {
+        name: sorted(str(item) for item in value) if isinstance(value, (list, tuple, set)) else value
+        for name, value in query.items()
+    }
+    payload = json.dumps({'endpoint': endpoint, 'query': normalized}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=None, mode=None):
+        self.cache_dir = cache_dir
+        self.ttl = SETTINGS['mp_cache_ttl'] if ttl is None else ttl
+        self.mode = mode or SETTINGS['mp_cache']
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown MP cache mode {self.mode!r}, expected one of {MODES}")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl.gz")
+
+    def get(self, key, ignore_ttl=False):
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if not ignore_ttl and self.ttl and time.time() - entry['created'] > self.ttl:
+            return None
+        return entry['response']
+
+    def put(self, key, endpoint, query, response):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {'created': time.time(), 'endpoint': endpoint, 'query': query, 'response': response}
+        # Write then rename, so concurrent queries never see half a file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def fetch(self, endpoint, search, query):
+        if self.mode == 'off':
+            return search(**query)
+        profiler = get_profiler()
+        key = query_key(endpoint, query)
+        if self.mode != 'refresh':
+            response = self.get(key, ignore_ttl=self.mode == 'replay')
+            if response is not None:
+                profiler.count('mp_cache_hits')
+                return response
+            if self.mode == 'replay':
+                raise CacheMiss(f"No recorded {endpoint} response for {query}, record it first without --mp-cache replay")
+        profiler.count('mp_cache_misses')
+        response = search(**query)
+        self.put(key, endpoint, query, response)
+        return response
+
+    def entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.pkl.gz'):
+                    yield os.path.join(root, name)
+
+    def clear(self, expired_only=False):
+        removed = 0
+        for path in list(self.entries()):
+            if expired_only:
+                with gzip.open(path, 'rb') as f:
+                    if time.time() - pickle.load(f)['created'] <= self.ttl:
+                        continue
+            os.remove(path)
+            removed += 1
+        return removed
+
+
+class CachedSearch:
+    def __init__(self, endpoint, search, cache):
+        self.endpoint = endpoint
+        self.search = search
+        self.cache = cache
+
+    def __call__(self, **query):
+        return self.cache.fetch(self.endpoint, self.search, query)
+
+
+class _Endpoint:
+    # Stands in for mpr.materials.summary / mpr.summary, only search is cached
+    def __init__(self, rester):
+        self._rester = rester
+
+    @property
+    def search(self):
+        return CachedSearch('summary', self._rester.live_search, self._rester.cache)
+
+    def __getattr__(self, name):
+        return getattr(self._rester.live().materials.summary, name)
+
+
+class _Materials:
+    def __init__(self, rester):
+        self.summary = _Endpoint(rester)
+
+
+class CachedMPRester:
+    # Drop-in for MPRester: summary searches go through the cache, anything else goes to
+    # a real MPRester. That one is only created on the first cache miss, so fully cached
+    # runs never open a session, and replay mode refuses to create one at all
+    def __init__(self, api_key=None, cache=None, mode=None, ttl=None):
+        self.api_key = api_key or API_KEY
+        self.cache = cache or ResponseCache(mode=mode, ttl=ttl)
+        self.mpr = None
+        self._lock = threading.Lock()
+        self.materials = _Materials(self)
+        self.summary = self.materials.summary
+
+    def live(self):
+        if self.cache.mode == 'replay':
+            raise CacheMiss("Replay mode only serves recorded summary searches")
+        with self._lock:
+            if self.mpr is None:
+                from mp_api.client import MPRester
+                self.mpr = MPRester(self.api_key)
+        return self.mpr
+
+    def live_search(self, **query):
+        return self.live().materials.summary.search(**query)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.mpr is not None:
+            self.mpr.__exit__(*exc)
+            self.mpr = None
+        return False
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.live(), name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the Materials Project response cache")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--clear', action='store_true', help="Remove every recorded response")
+    parser.add_argument('--clear-expired', action='store_true', help="Remove responses older than the TTL")
+    args = parser.parse_args(argv)
+
+    cache = ResponseCache(cache_dir=args.cache_dir, mode='record')
+    if args.clear or args.clear_expired:
+        print(f"🧹 Removed {cache.clear(expired_only=args.clear_expired)} responses from {args.cache_dir}")
+        return
+
+    now = time.time()
+    paths = list(cache.entries())
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"{len(paths)} recorded responses, {size / 1e6:.1f} MB in {args.cache_dir} (TTL {cache.ttl}s)")
+    for path in paths:
+        with gzip.open(path, 'rb') as f:
+            entry = pickle.load(f)
+        age = now - entry['created']
+        status = 'expired' if cache.ttl and age > cache.ttl else 'fresh'
+        print(f"  {entry['endpoint']:<8} {len(entry['response']):>5} docs  {age / 3600:7.1f} h  {status:<7} {entry['query']}")
+
+
+if __name__ == "__main__":
+    main()
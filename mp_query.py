@@ -0,0 +1,94 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from instrumentation import get_profiler
+from mp_cache import CacheMiss
+
+SUMMARY_FIELDS = [
+    "material_id", "formula_pretty", "volume", "density", "symmetry",
+    "nsites", "elements", "chemsys", "band_gap", "formation_energy_per_atom",
+    "structure"
+]
+
+
+class RateLimiter:
+    def __init__(self, max_per_second=5.0):
+        self.min_interval = 1.0 / max_per_second if max_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        # Each caller reserves the next free slot, then sleeps outside the lock
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_time)
+            self._next_time = slot + self.min_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class QueryScheduler:
+    def __init__(self, search, fields=SUMMARY_FIELDS, max_workers=4, max_per_second=5.0,
+                 max_retries=3, backoff=1.0):
+        # search is the shared session's search method, e.g. mpr.materials.summary.search,
+        # so a fake can be passed in for offline runs
+        self.search = search
+        self.fields = fields
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(max_per_second)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def call(self, label=None, **query):
+        # Rate limited search with retry, shared by chemsys queries and follow-up fetches
+        profiler = get_profiler()
+        for attempt in range(self.max_retries + 1):
+            with profiler.stage('rate_limit_wait', label):
+                self.rate_limiter.wait()
+            try:
+                with profiler.stage('mp_query', label):
+                    return self.search(**query)
+            except CacheMiss:
+                # Replaying offline, asking again won't record anything
+                raise
+            except Exception as e:
+                profiler.count('mp_query_errors', chemsys=label)
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+                print(f"⚠️ Query failed ({e}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def search_chemsys(self, metal, chalcogen):
+        return self.call(label=f"{metal}-{chalcogen}", elements=[metal, chalcogen], num_elements=2, fields=self.fields)
+
+    def run(self, pairs, max_in_flight=None):
+        # Yields (metal, chalcogen, entries, error) as each query finishes, not in submission order.
+        # At most max_in_flight queries (default 2 x workers) are pending, and a result is dropped
+        # from here as soon as it's yielded, so finished systems don't pile up in memory
+        max_in_flight = max_in_flight or 2 * self.max_workers
+        pending_pairs = iter(pairs)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {}
+
+            def submit_next():
+                for metal, chalcogen in pending_pairs:
+                    futures[pool.submit(self.search_chemsys, metal, chalcogen)] = (metal, chalcogen)
+                    return
+
+            for _ in range(max_in_flight):
+                submit_next()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                while done:
+                    future = done.pop()
+                    metal, chalcogen = futures.pop(future)
+                    submit_next()
+                    try:
+                        entries, error = future.result(), None
+                    except Exception as e:
+                        entries, error = None, e
+                    del future
+                    yield metal, chalcogen, entries, error
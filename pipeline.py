@@ -0,0 +1,136 @@
+import os
+import pandas as pd
+from featurizer import featurize_dataframe
+from material_store import MaterialStore
+from instrumentation import get_profiler
+
+# Generator stages for the collector: records -> batches -> featurized frames -> sinks.
+# Only one batch is held at a time, and the query scheduler keeps a bounded window of
+# chemsys results in flight, so memory stays flat however many systems come through.
+
+
+def batched(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def featurize_stage(batches, pool=None, chunksize=8, cache=None, errors=None, dedup=None, n_workers=1):
+    for batch in batches:
+        df = pd.DataFrame(batch)
+        # Batches go to the shared pool when there is one. Without it n_workers is passed on as is,
+        # and the default of 1 featurizes in this process rather than spinning a pool up per batch
+        with get_profiler().stage('featurize_batch'):
+            df_features = featurize_dataframe(
+                df, n_workers=None if pool is not None else n_workers, chunksize=chunksize, cache=cache, pool=pool, errors=errors,
+                dedup=dedup
+            )
+        if dedup is not None:
+            dedup.save()
+        # Features come back in row order, so join on the index
+        yield df.join(df_features.drop(columns=['material_id']))
+
+
+class CsvSink:
+    # drop_columns are left out of the file, e.g. structure when a StructureStoreSink keeps it
+    def __init__(self, path, append=False, drop_columns=()):
+        self.path = path
+        self.drop_columns = list(drop_columns)
+        self.columns = None
+        self.rows = 0
+        self.on_disk = set()
+        # Resumed runs keep appending under the header already on disk. A run can stop after
+        # a batch is written but before it's checkpointed, so ids already in the file are skipped
+        if append and os.path.exists(path):
+            self.columns = list(pd.read_csv(path, nrows=0).columns)
+            self.on_disk = set(pd.read_csv(path, usecols=['material_id'], dtype=str)['material_id'])
+
+    def write(self, df):
+        if self.on_disk:
+            df = df[~df['material_id'].astype(str).isin(self.on_disk)]
+            if df.empty:
+                return
+        df = df.drop(columns=[column for column in self.drop_columns if column in df.columns])
+        with get_profiler().stage('csv_write'):
+            if self.columns is None:
+                self.columns = list(df.columns)
+                df.to_csv(self.path, index=False)
+            else:
+                # Later batches may be missing optional columns, keep the header layout
+                df.reindex(columns=self.columns).to_csv(self.path, mode='a', header=False, index=False)
+        self.rows += len(df)
+
+
+class StructureStoreSink:
+    # Packs each batch into a structure store next to the CSV, so later runs can load
+    # structures from memory-mapped arrays instead of parsing the CSV's structure column
+    def __init__(self, path, append=False):
+        from structure_store import StructureStore, store_exists
+        self.path = path
+        self.rows = 0
+        self.on_disk = set()
+        if append and store_exists(path):
+            self.on_disk = set(StructureStore(path, columns=['material_id']).table['material_id'].astype(str))
+        elif os.path.exists(path):
+            import shutil
+            shutil.rmtree(path)
+
+    def write(self, df):
+        from structure_store import write_structure_store
+        if self.on_disk:
+            df = df[~df['material_id'].astype(str).isin(self.on_disk)]
+            if df.empty:
+                return
+        with get_profiler().stage('structure_store_write'):
+            write_structure_store(df, self.path, append=True)
+        self.rows += len(df)
+
+
+class StoreSink:
+    def __init__(self, store_path, run_id=None):
+        self.store_path = store_path
+        self.run_id = run_id
+        self.rows = 0
+        self.counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+        # Upserts are idempotent, a batch written again after a crash just counts as unchanged
+
+    def write(self, df):
+        with get_profiler().stage('store_write'), MaterialStore(self.store_path) as store:
+            counts = store.upsert(df.to_dict('records'), run_id=self.run_id)
+        for key, value in counts.items():
+            self.counts[key] += value
+        self.rows += len(df)
+
+
+def run_pipeline(units, sinks, batch_size=256, pool=None, chunksize=8, cache=None, checkpoint=None, dedup=None,
+                 n_workers=1):
+    # units yields (unit, records) with one unit per chemsys. Every batch is on disk
+    # and checkpointed before the next one is featurized, so a crash keeps what's done
+    for unit, records in units:
+        if checkpoint is not None:
+            records = (record for record in records if not checkpoint.is_written(unit, str(record['material_id'])))
+
+        errors = []
+        for df in featurize_stage(batched(records, batch_size), pool=pool, chunksize=chunksize, cache=cache, errors=errors,
+                                  dedup=dedup, n_workers=n_workers):
+            for sink in sinks:
+                sink.write(df)
+            print(f"💾 Wrote batch of {len(df)} {unit} compounds ({sinks[0].rows} so far)")
+
+            if checkpoint is not None:
+                systems = dict(zip(df['material_id'].astype(str), zip(df['metal'], df['chalcogen'])))
+                failures = []
+                for error in errors:
+                    metal, chalcogen = systems[error['material_id']]
+                    failures.append(dict(error, unit=unit, stage='featurize', metal=metal, chalcogen=chalcogen))
+                checkpoint.record_batch(unit, df['material_id'].tolist(), failures)
+            errors.clear()
+
+        if checkpoint is not None:
+            checkpoint.complete(unit)
+    return sinks
@@ -0,0 +1,142 @@
+import os
+import json
+import hashlib
+import matplotlib
+# Headless: figures only ever go to files, also in pool workers
+matplotlib.use('Agg', force=True)
+import numpy as np
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import get_profiler
+from config import DATA_DIR
+
+PLOT_MANIFEST = os.path.join(DATA_DIR, "plot_manifest.json")
+# Above this many points scatter plots switch to hexbin density
+HEXBIN_THRESHOLD = 5000
+# Heatmaps only get per-cell numbers up to this many columns
+ANNOTATE_MAX_COLUMNS = 20
+
+# A figure is (kind, path, data, options): data is a dict of arrays and is what
+# gets hashed, options are small JSON-able settings like labels and titles
+
+
+def render_scatter(path, data, options):
+    x, y = data['x'], data['y']
+    plt.figure(figsize=(8, 6))
+    if len(x) > options.get('hexbin_threshold', HEXBIN_THRESHOLD):
+        # Aggregate instead of drawing every point
+        mask = ~(np.isnan(x) | np.isnan(y))
+        plt.hexbin(x[mask], y[mask], gridsize=options.get('gridsize', 60), bins='log', cmap='viridis', mincnt=1)
+        plt.colorbar(label='count (log scale)')
+    elif 'hue' in data:
+        import seaborn as sns
+        sns.scatterplot(x=x, y=y, hue=data['hue'], palette='viridis')
+    else:
+        import seaborn as sns
+        sns.scatterplot(x=x, y=y, alpha=0.6)
+    plt.xlabel(options.get('xlabel', ''))
+    plt.ylabel(options.get('ylabel', ''))
+    plt.title(options.get('title', ''))
+    plt.savefig(path)
+    plt.close()
+
+
+def render_heatmap(path, data, options):
+    import seaborn as sns
+    matrix, labels = data['matrix'], list(data['labels'])
+    size = max(10, len(labels) * 0.5)
+    plt.figure(figsize=(size, size * 0.8))
+    annotate = len(labels) <= options.get('annotate_max_columns', ANNOTATE_MAX_COLUMNS)
+    sns.heatmap(matrix, xticklabels=labels, yticklabels=labels, annot=annotate, cmap='coolwarm', fmt='.2f',
+                linewidths=0.5 if annotate else 0, vmin=options.get('vmin'), vmax=options.get('vmax'))
+    plt.title(options.get('title', ''))
+    plt.savefig(path, bbox_inches='tight')
+    plt.close()
+
+
+RENDERERS = {
+    'scatter': render_scatter,
+    'heatmap': render_heatmap
+}
+
+
+def figure_hash(kind, data, options):
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'kind': kind, 'options': options}, sort_keys=True, default=str).encode())
+    for name in sorted(data):
+        array = np.asarray(data[name])
+        if array.dtype == object:
+            array = array.astype(str)
+        digest.update(name.encode())
+        digest.update(str((array.dtype, array.shape)).encode())
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def _render(figure):
+    kind, path, data, options = figure
+    RENDERERS[kind](path, data, options)
+    return path
+
+
+class PlotRenderer:
+    def __init__(self, n_workers=None, use_cache=True, manifest_path=PLOT_MANIFEST):
+        self.n_workers = n_workers or os.cpu_count()
+        self.use_cache = use_cache
+        self.manifest_path = manifest_path
+        self.manifest = {}
+        if use_cache and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        self._pool = None
+
+    def _get_pool(self):
+        # One pool for the whole analysis, started on the first batch that needs it
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.n_workers)
+        return self._pool
+
+    def render(self, figures):
+        # Render every figure whose data or settings changed since the last run
+        todo, hashes = [], {}
+        for kind, path, data, options in figures:
+            key = figure_hash(kind, data, options)
+            if self.use_cache and self.manifest.get(path) == key and os.path.exists(path):
+                continue
+            hashes[path] = key
+            todo.append((kind, path, data, options))
+
+        skipped = len(figures) - len(todo)
+        get_profiler().count('plots_skipped', skipped)
+        with get_profiler().stage('render_plots'):
+            if len(todo) <= 1 or self.n_workers == 1:
+                rendered = [_render(figure) for figure in todo]
+            else:
+                rendered = list(self._get_pool().map(_render, todo))
+        get_profiler().count('plots_rendered', len(rendered))
+
+        if rendered:
+            for path in rendered:
+                self.manifest[path] = hashes[path]
+            if self.use_cache:
+                self._save_manifest()
+        print(f"🖼️ Rendered {len(rendered)} figures, {skipped} unchanged")
+        return rendered
+
+    def _save_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
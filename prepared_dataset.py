@@ -0,0 +1,150 @@
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from instrumentation import get_profiler
+
+# Matrix column order. Ablation variants are mostly prefixes of this list, and a
+# prefix (or any other contiguous run) comes back as a view of the shared matrix
+FEATURE_ORDER = [
+    'volume', 'density', 'nsites', 'formation_energy_per_atom',
+    'avg_coordination', 'avg_bond_length', 'electronegativity_diff', 'radii_ratio',
+    'avg_atomic_mass', 'packing_efficiency', 'weighted_atomic_mass', 'symmetry_deviation'
+]
+
+MAX_BINS = 255
+
+# Named feature subsets for ablation runs, skipped when the CSV lacks a column
+FEATURE_SETS = {
+    'base': ['volume', 'density', 'nsites'],
+    'base+energy': ['volume', 'density', 'nsites', 'formation_energy_per_atom'],
+    'base+energy+structure': ['volume', 'density', 'nsites', 'formation_energy_per_atom',
+                              'avg_coordination', 'avg_bond_length'],
+    'base+energy+structure+chemistry': ['volume', 'density', 'nsites', 'formation_energy_per_atom',
+                                        'avg_coordination', 'avg_bond_length', 'electronegativity_diff',
+                                        'radii_ratio', 'avg_atomic_mass'],
+    'structure+chemistry': ['avg_coordination', 'avg_bond_length', 'electronegativity_diff',
+                            'radii_ratio', 'avg_atomic_mass']
+}
+
+
+def quantile_edges(values, max_bins=MAX_BINS):
+    distinct = np.unique(values[~np.isnan(values)])
+    if len(distinct) <= max_bins:
+        return (distinct[:-1] + distinct[1:]) / 2
+    return np.unique(np.quantile(values[~np.isnan(values)], np.linspace(0, 1, max_bins + 1)[1:-1]))
+
+
+def apply_bins(values, edges):
+    return np.searchsorted(edges, values, side='right').astype(np.uint8)
+
+
+class FeatureView:
+    def __init__(self, dataset, features):
+        self.dataset = dataset
+        self.features = list(features)
+        self.indices = np.array([dataset.column_index[feature] for feature in self.features])
+
+    @property
+    def is_view(self):
+        return len(self.indices) > 0 and np.array_equal(self.indices, np.arange(self.indices[0], self.indices[0] + len(self.indices)))
+
+    @property
+    def X_scaled(self):
+        if self.is_view:
+            return self.dataset.scaled[:, self.indices[0]:self.indices[0] + len(self.indices)]
+        return self.dataset.scaled[:, self.indices]
+
+    @property
+    def X_binned(self):
+        binned = self.dataset.binned()
+        if self.is_view:
+            return binned[:, self.indices[0]:self.indices[0] + len(self.indices)]
+        return binned[:, self.indices]
+
+    def bin_edges(self):
+        edges = self.dataset.bin_edges()
+        return [edges[i] for i in self.indices]
+
+    def scaler(self):
+        # A fitted StandardScaler built from the dataset stats instead of another pass over the data
+        scaler = StandardScaler()
+        scaler.mean_ = self.dataset.mean[self.indices].copy()
+        scaler.var_ = self.dataset.var[self.indices].copy()
+        scaler.scale_ = self.dataset.scale[self.indices].copy()
+        scaler.n_features_in_ = len(self.indices)
+        scaler.n_samples_seen_ = self.dataset.n_rows
+        scaler.feature_names_in_ = np.array(self.features, dtype=object)
+        return scaler
+
+
+class PreparedDataset:
+    def __init__(self, df):
+        # Numeric columns, NaN filled with the column mean, standardized once.
+        # The arrays are read-only so nothing downstream can change them under another variant
+        numeric = df.select_dtypes(include=[np.number])
+        columns = [c for c in FEATURE_ORDER if c in numeric.columns] + [c for c in numeric.columns if c not in FEATURE_ORDER]
+        values = numeric[columns].to_numpy(dtype=np.float64, copy=True)
+
+        self.columns = columns
+        self.column_index = {column: i for i, column in enumerate(columns)}
+        self.n_rows = len(values)
+        with warnings.catch_warnings():
+            # All-NaN columns get a mean of 0, like fillna leaves them scaled to 0
+            warnings.simplefilter('ignore', RuntimeWarning)
+            self.mean = np.nan_to_num(np.nanmean(values, axis=0) if len(values) else np.zeros(len(columns)))
+        self.filled = np.where(np.isnan(values), self.mean, values)
+        self.var = self.filled.var(axis=0)
+        self.scale = np.where(self.var > 0, np.sqrt(self.var), 1.0)
+        self.scaled = (self.filled - self.mean) / self.scale
+        self.groups = df['chemsys'].to_numpy() if 'chemsys' in df.columns else np.arange(len(df))
+
+        for array in (self.mean, self.var, self.scale, self.filled, self.scaled):
+            array.flags.writeable = False
+        self._bin_edges = None
+        self._binned = None
+
+    def bin_edges(self):
+        # Quantile edges per column, computed on first use. Columns with fewer distinct
+        # values than bins split halfway between neighbouring values instead
+        if self._bin_edges is None:
+            self._bin_edges = [quantile_edges(self.filled[:, i]) for i in range(len(self.columns))]
+        return self._bin_edges
+
+    def binned(self):
+        # uint8 bin codes for the whole matrix, shared by every histogram model and fold
+        if self._binned is None:
+            with get_profiler().stage('bin_features'):
+                binned = np.empty(self.filled.shape, dtype=np.uint8)
+                for i, edges in enumerate(self.bin_edges()):
+                    binned[:, i] = apply_bins(self.filled[:, i], edges)
+                binned.flags.writeable = False
+                self._binned = binned
+        return self._binned
+
+    def has(self, features):
+        return all(feature in self.column_index for feature in features)
+
+    def view(self, features):
+        return FeatureView(self, features)
+
+    def column(self, name):
+        # Mean-filled values, read-only
+        return self.filled[:, self.column_index[name]]
+
+    def stats(self):
+        return pd.DataFrame({'mean': self.mean, 'std': self.scale, 'var': self.var}, index=self.columns)
+
+
+# One prepared dataset per (path, mtime), shared by every MLModel in the process
+_datasets = {}
+
+
+def load_prepared(path, df=None):
+    # A caller that loaded only some columns gets its own entry, not everyone else's
+    key = (os.path.abspath(path), os.path.getmtime(path), None if df is None else tuple(df.columns))
+    if key not in _datasets:
+        with get_profiler().stage('prepare_dataset'):
+            _datasets[key] = PreparedDataset(pd.read_csv(path) if df is None else df)
+    return _datasets[key]
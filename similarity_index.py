@@ -0,0 +1,238 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from instrumentation import get_profiler
+from config import DATA_DIR
+
+INDEX_DIR = os.path.join(DATA_DIR, "similarity")
+DEFAULT_NAME = "features"
+DEFAULT_FEATURES = ['avg_coordination', 'avg_bond_length', 'electronegativity_diff', 'radii_ratio', 'packing_efficiency']
+TREES = ('kd', 'ball')
+
+# Rebuild the tree once this share of rows sits in the update buffer or is stale
+REBUILD_FRACTION = 0.1
+
+STATE = ['features', 'mean', 'scale', 'tree_type', 'leaf_size', 'ids', 'X', 'stale', 'n_tree', 'tree']
+
+# k-NN and radius search over the standardized feature matrix. Scaling stats are frozen
+# when the index is built so distances stay comparable across updates. New or changed
+# materials go into a small buffer that is searched by brute force next to the tree,
+# and the tree is rebuilt from scratch once the buffer gets big
+
+
+class SimilarityIndex:
+    def __init__(self, features, mean, scale, material_ids, X_scaled, tree='kd', leaf_size=40):
+        if tree not in TREES:
+            raise ValueError(f"Unknown tree {tree!r}, expected one of {TREES}")
+        self.features = list(features)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.tree_type = tree
+        self.leaf_size = leaf_size
+        self.ids = np.asarray([str(material_id) for material_id in material_ids], dtype=object)
+        self.X = np.ascontiguousarray(X_scaled, dtype=np.float64)
+        self.stale = np.zeros(len(self.X), dtype=bool)
+        self.rebuild()
+
+    @classmethod
+    def from_dataset(cls, dataset, material_ids, features=DEFAULT_FEATURES, tree='kd'):
+        # Reuses the standardized matrix and stats MLModel already prepared
+        features = [feature for feature in features if dataset.has([feature])]
+        # All-NaN columns are filled to a constant, and a constant column puts every point
+        # at the same coordinate, so neither can tell materials apart
+        flat = [feature for feature in features if dataset.var[dataset.column_index[feature]] == 0]
+        if flat:
+            print(f"⚠️ Leaving out features that are all NaN or constant: {', '.join(flat)}")
+            features = [feature for feature in features if feature not in flat]
+        if not features:
+            raise ValueError("No usable features for the similarity index, each is missing, all NaN or constant")
+        view = dataset.view(features)
+        return cls(features, dataset.mean[view.indices], dataset.scale[view.indices], material_ids, view.X_scaled, tree=tree)
+
+    @classmethod
+    def from_csv(cls, path, features=DEFAULT_FEATURES, tree='kd'):
+        from prepared_dataset import load_prepared
+        from dataset_loader import load_dataset
+        # Full precision like MLModel, the index is float64 anyway
+        df = load_dataset(path, columns=['material_id', 'chemsys'] + list(features), downcast=False)
+        return cls.from_dataset(load_prepared(path, df), df['material_id'], features=features, tree=tree)
+
+    def rebuild(self):
+        from sklearn.neighbors import BallTree, KDTree
+        live = ~self.stale
+        self.ids = self.ids[live]
+        self.X = np.ascontiguousarray(self.X[live])
+        self.row = {material_id: i for i, material_id in enumerate(self.ids)}
+        self.stale = np.zeros(len(self.X), dtype=bool)
+        # Rows [0, n_tree) are in the tree, later rows are the update buffer
+        self.n_tree = len(self.X)
+        with get_profiler().stage('similarity_build'):
+            self.tree = (KDTree if self.tree_type == 'kd' else BallTree)(self.X, leaf_size=self.leaf_size)
+
+    def scale_vectors(self, X):
+        # Raw feature values -> index space, unknown values sit at the mean
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        if X.shape[1] != len(self.features):
+            raise ValueError(f"Expected {len(self.features)} values ({', '.join(self.features)}), got {X.shape[1]}")
+        return np.nan_to_num((X - self.mean) / self.scale)
+
+    def _query_point(self, material_id, vector):
+        if material_id is not None:
+            material_id = str(material_id)
+            if material_id not in self.row:
+                raise KeyError(f"{material_id} is not in the similarity index")
+            return self.X[self.row[material_id]][None, :], material_id
+        return self.scale_vectors(vector), None
+
+    def _result(self, rows, distances, exclude):
+        rows = np.asarray(rows, dtype=int)
+        distances = np.asarray(distances, dtype=np.float64)
+        keep = ~self.stale[rows]
+        if exclude is not None:
+            keep &= self.ids[rows] != exclude
+        rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return pd.DataFrame({'material_id': self.ids[rows[order]], 'distance': distances[order]})
+
+    def neighbors(self, material_id=None, vector=None, k=5):
+        # The k nearest materials, never including the query material itself
+        point, exclude = self._query_point(material_id, vector)
+        # Ask the tree for enough extra rows to cover stale ones and the query itself
+        n_extra = int(self.stale[:self.n_tree].sum()) + (exclude is not None)
+        distances, rows = self.tree.query(point, k=min(k + n_extra, self.n_tree))
+        rows, distances = list(rows[0]), list(distances[0])
+        if len(self.X) > self.n_tree:
+            buffer = np.linalg.norm(self.X[self.n_tree:] - point, axis=1)
+            rows += list(range(self.n_tree, len(self.X)))
+            distances += list(buffer)
+        return self._result(rows, distances, exclude).head(k).reset_index(drop=True)
+
+    def within(self, material_id=None, vector=None, radius=1.0):
+        point, exclude = self._query_point(material_id, vector)
+        rows, distances = self.tree.query_radius(point, r=radius, return_distance=True)
+        rows, distances = list(rows[0]), list(distances[0])
+        if len(self.X) > self.n_tree:
+            buffer = np.linalg.norm(self.X[self.n_tree:] - point, axis=1)
+            close = np.flatnonzero(buffer <= radius)
+            rows += list(self.n_tree + close)
+            distances += list(buffer[close])
+        return self._result(rows, distances, exclude)
+
+    def update(self, material_ids, X):
+        # New ids are appended, changed ones replace their old row. Returns (added, updated)
+        X_scaled = self.scale_vectors(X)
+        # An id repeated within the batch counts once, with its last row
+        latest = {}
+        for material_id, vector in zip(material_ids, X_scaled):
+            latest[str(material_id)] = vector
+        added = updated = 0
+        new_ids, new_rows = [], []
+        for material_id, vector in latest.items():
+            if material_id in self.row:
+                if np.allclose(self.X[self.row[material_id]], vector, equal_nan=True):
+                    continue
+                self.stale[self.row[material_id]] = True
+                updated += 1
+            else:
+                added += 1
+            self.row[material_id] = len(self.X) + len(new_rows)
+            new_ids.append(material_id)
+            new_rows.append(vector)
+        if new_rows:
+            self.ids = np.concatenate([self.ids, np.asarray(new_ids, dtype=object)])
+            self.X = np.vstack([self.X, new_rows])
+            self.stale = np.concatenate([self.stale, np.zeros(len(new_rows), dtype=bool)])
+            if len(self.X) - self.n_tree + self.stale.sum() > REBUILD_FRACTION * self.n_tree:
+                self.rebuild()
+        return added, updated
+
+    def update_from_frame(self, df):
+        missing = [feature for feature in self.features if feature not in df.columns]
+        if missing:
+            raise ValueError(f"Can't update the similarity index, missing columns {missing}")
+        return self.update(df['material_id'], df[self.features].to_numpy(dtype=np.float64))
+
+    def __len__(self):
+        return int((~self.stale).sum())
+
+    def save(self, name=DEFAULT_NAME):
+        # Saved as plain arrays plus the fitted tree, so loading doesn't depend on where the class lived
+        import joblib
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        path = os.path.join(INDEX_DIR, f"{name}.joblib")
+        joblib.dump({key: getattr(self, key) for key in STATE}, path)
+        return path
+
+    @classmethod
+    def load(cls, name=DEFAULT_NAME):
+        import joblib
+        path = os.path.join(INDEX_DIR, f"{name}.joblib")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No similarity index {name} in {INDEX_DIR}, build one first")
+        with get_profiler().stage('similarity_load'):
+            state = joblib.load(path)
+        index = cls.__new__(cls)
+        index.__dict__.update(state)
+        index.row = {material_id: i for i, material_id in enumerate(index.ids) if not index.stale[i]}
+        return index
+
+
+def refresh_saved_index(df, name=DEFAULT_NAME):
+    # Called after collection: folds new or changed materials into a saved index, if there is one
+    if not os.path.exists(os.path.join(INDEX_DIR, f"{name}.joblib")):
+        return None
+    index = SimilarityIndex.load(name)
+    added, updated = index.update_from_frame(df)
+    if added or updated:
+        index.save(name)
+    return added, updated
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find materials with similar engineered features")
+    parser.add_argument('--name', default=DEFAULT_NAME, help="Index name under <DATA_DIR>/similarity")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Build an index from a featurized CSV")
+    build_parser.add_argument('input', nargs='?', default=os.path.join(DATA_DIR, "chalcogenides_latest.csv"))
+    build_parser.add_argument('--features', nargs='+', default=DEFAULT_FEATURES)
+    build_parser.add_argument('--tree', choices=TREES, default='kd')
+    update_parser = subparsers.add_parser('update', help="Add new or changed materials from a CSV")
+    update_parser.add_argument('input')
+    query_parser = subparsers.add_parser('query', help="Nearest neighbours of a material or a feature vector")
+    query_parser.add_argument('material_id', nargs='?')
+    query_parser.add_argument('--vector', help="Comma separated raw feature values, in the index's feature order")
+    query_parser.add_argument('-k', type=int, default=5)
+    query_parser.add_argument('--radius', type=float, help="Everything within this distance instead of the k nearest")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        index = SimilarityIndex.from_csv(args.input, features=args.features, tree=args.tree)
+        path = index.save(args.name)
+        print(f"✅ Indexed {len(index)} materials on {', '.join(index.features)} ({args.tree} tree), saved to {path}")
+        return
+
+    index = SimilarityIndex.load(args.name)
+    if args.command == 'update':
+        added, updated = index.update_from_frame(pd.read_csv(args.input))
+        index.save(args.name)
+        print(f"✅ {added} added, {updated} updated, {len(index)} materials indexed")
+        return
+
+    if (args.material_id is None) == (args.vector is None):
+        parser.error("query needs either a material_id or --vector")
+    vector = None if args.vector is None else [float(value) for value in args.vector.split(',')]
+    start = time.perf_counter()
+    if args.radius is not None:
+        result = index.within(args.material_id, vector, radius=args.radius)
+    else:
+        result = index.neighbors(args.material_id, vector, k=args.k)
+    elapsed = time.perf_counter() - start
+    print(result.to_string(index=False))
+    print(f"⏱️ {len(result)} matches in {1000 * elapsed:.3f} ms over {len(index)} materials")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from pymatgen.core.lattice import Lattice
+from pymatgen.core.periodic_table import DummySpecies, Element, Species
+from pymatgen.core.structure import Structure
+from featurizer import load_structure
+
+# A store directory is a list of chunks, one per write, so appending a batch never
+# touches what's already stored:
+#   index.json                          chunk directories in order, and the row each one starts at
+#   chunk_00000/table.parquet           scalar columns, one row per material
+#   chunk_00000/lattices.npy            (n, 3, 3) lattice matrices
+#   chunk_00000/site_offsets.npy        (n + 1,) start of each material's sites, empty range = no structure
+#   chunk_00000/species.npy             (chunk_sites,) atomic numbers
+#   chunk_00000/frac_coords.npy         (chunk_sites, 3) fractional coordinates
+#   chunk_00000/oxidation_states.npy    (chunk_sites,) oxidation state per site, NaN where none is set
+# Site properties (magmom etc.) are kept as JSON in the table's site_properties column.
+# Structure-level properties and site labels are not kept. Stores packed before chunks
+# have the files directly in the directory and no index.json; they open as one chunk
+ARRAY_FILES = ['lattices', 'site_offsets', 'species', 'frac_coords', 'oxidation_states']
+SITE_PROPERTIES_COLUMN = 'site_properties'
+INDEX_FILE = "index.json"
+
+
+def _scalar_value(value):
+    # Parquet can't hold arbitrary Python objects, keep lists as JSON text
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value)
+    return value
+
+
+def _json_value(value):
+    return value.tolist() if isinstance(value, np.ndarray) else value
+
+
+def pack_structures(structures):
+    # Structures (or their dict/str forms, None for missing) -> the store's arrays plus
+    # one JSON string of site properties per material
+    n = len(structures)
+    lattices = np.zeros((n, 3, 3), dtype=np.float64)
+    site_offsets = np.zeros(n + 1, dtype=np.int64)
+    species, frac_coords, oxidation_states, site_properties = [], [], [], [None] * n
+
+    for i, value in enumerate(structures):
+        site_offsets[i + 1] = site_offsets[i]
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            continue
+        structure = load_structure(value)
+        if not structure.is_ordered:
+            raise ValueError(f"Disordered structure in row {i} can't be packed")
+        if any(isinstance(site.specie, DummySpecies) for site in structure):
+            raise ValueError(f"Structure in row {i} has dummy species, which can't be packed")
+
+        lattices[i] = structure.lattice.matrix
+        species.append(np.array([site.specie.Z for site in structure], dtype=np.int16))
+        frac_coords.append(structure.frac_coords)
+        oxidation_states.append(np.array([
+            np.nan if getattr(site.specie, 'oxi_state', None) is None else site.specie.oxi_state for site in structure
+        ], dtype=np.float64))
+        if structure.site_properties:
+            site_properties[i] = json.dumps({
+                name: [_json_value(value) for value in values] for name, values in structure.site_properties.items()
+            })
+        site_offsets[i + 1] += len(structure)
+
+    arrays = {
+        'lattices': lattices,
+        'site_offsets': site_offsets,
+        'species': np.concatenate(species) if species else np.zeros(0, dtype=np.int16),
+        'frac_coords': np.concatenate(frac_coords) if frac_coords else np.zeros((0, 3)),
+        'oxidation_states': np.concatenate(oxidation_states) if oxidation_states else np.zeros(0)
+    }
+    return arrays, site_properties
+
+
+def read_index(path):
+    # {'chunks': [directory names], 'offsets': [first row of each chunk..., total rows]}
+    index_path = os.path.join(path, INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            return json.load(f)
+    if os.path.exists(os.path.join(path, "table.parquet")):
+        n = len(np.load(os.path.join(path, "lattices.npy"), mmap_mode='r'))
+        return {'chunks': ["."], 'offsets': [0, n]}
+    return {'chunks': [], 'offsets': [0]}
+
+
+def store_exists(path):
+    return os.path.exists(os.path.join(path, INDEX_FILE)) or os.path.exists(os.path.join(path, "table.parquet"))
+
+
+def _clear_store(path):
+    # Only what a store writes, the directory may hold other files
+    import shutil
+    for name in read_index(path)['chunks']:
+        if name != ".":
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    for name in [INDEX_FILE, "table.parquet"] + [f"{name}.npy" for name in ARRAY_FILES]:
+        if os.path.exists(os.path.join(path, name)):
+            os.remove(os.path.join(path, name))
+
+
+def write_structure_store(df, path, structure_column='structure', append=False):
+    # append=True adds the rows as a new chunk after whatever the store at path already holds
+    os.makedirs(path, exist_ok=True)
+    if not append:
+        _clear_store(path)
+    arrays, site_properties = pack_structures(list(df[structure_column]))
+
+    table = df.drop(columns=[structure_column]).reset_index(drop=True)
+    for column in table.columns:
+        if table[column].dtype == object:
+            table[column] = table[column].map(_scalar_value)
+    table[SITE_PROPERTIES_COLUMN] = pd.Series(site_properties, dtype=object)
+
+    # The chunk is written under a temporary name and renamed, then the index is replaced,
+    # so a reader never sees a chunk that isn't complete
+    index = read_index(path)
+    name = f"chunk_{len(index['chunks']):05d}"
+    tmp_dir = os.path.join(path, f"{name}.tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    for array_name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{array_name}.npy"), array)
+    table.to_parquet(os.path.join(tmp_dir, "table.parquet"), index=False)
+    os.replace(tmp_dir, os.path.join(path, name))
+
+    index['chunks'].append(name)
+    index['offsets'].append(index['offsets'][-1] + len(table))
+    tmp_path = os.path.join(path, f"{INDEX_FILE}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(path, INDEX_FILE))
+    return path
+
+
+def store_path_for(csv_path):
+    # Where collection packs the structures of a CSV snapshot
+    return os.path.splitext(csv_path)[0] + ".structures"
+
+
+def read_csv_with_structures(csv_path, use_store=True):
+    # A snapshot CSV with its structure column. Collection leaves that column out of the CSV
+    # when it packs the structures next to it, so they come from the store when there is one
+    store_path = store_path_for(csv_path)
+    if use_store and store_exists(store_path):
+        df = pd.read_csv(csv_path, usecols=lambda column: column != 'structure')
+        store = StructureStore(store_path, columns=['material_id'])
+        df['structure'] = [store.get(material_id) for material_id in df['material_id']]
+        print(f"📦 Loaded structures from {store_path}")
+        return df
+    df = pd.read_csv(csv_path)
+    if 'structure' not in df.columns:
+        raise ValueError(f"{csv_path} has no structure column and there is no structure store at {store_path}")
+    return df
+
+
+class StructureStore:
+    def __init__(self, path, columns=None):
+        self.path = path
+        index = read_index(path)
+        self.chunk_paths = [os.path.join(path, name) for name in index['chunks']]
+        self.offsets = np.array(index['offsets'], dtype=np.int64)
+        self.table = pd.concat(
+            [pd.read_parquet(os.path.join(chunk_path, "table.parquet"), columns=columns) for chunk_path in self.chunk_paths],
+            ignore_index=True
+        ) if self.chunk_paths else pd.DataFrame(columns=columns)
+        # Memory-mapped, so opening the store doesn't read any structure data
+        self.chunks = []
+        for chunk_path in self.chunk_paths:
+            arrays = {}
+            for name in ARRAY_FILES:
+                array_path = os.path.join(chunk_path, f"{name}.npy")
+                if name == 'oxidation_states' and not os.path.exists(array_path):
+                    # Stores packed before oxidation states were kept
+                    arrays[name] = None
+                    continue
+                arrays[name] = np.load(array_path, mmap_mode='r')
+            self.chunks.append(arrays)
+        self._index = None
+        self._symbols = {}
+        self._site_property_values = None
+
+    def __len__(self):
+        return len(self.table)
+
+    def _read_column(self, column):
+        # One table column from every chunk, for when the store was opened with a column subset.
+        # None when a chunk was packed before the column existed
+        import pyarrow.parquet as pq
+        values = []
+        for chunk_path, start, stop in zip(self.chunk_paths, self.offsets[:-1], self.offsets[1:]):
+            table_path = os.path.join(chunk_path, "table.parquet")
+            if column in pq.read_schema(table_path).names:
+                values.append(pd.read_parquet(table_path, columns=[column])[column])
+            else:
+                values.append(pd.Series([None] * (stop - start), dtype=object))
+        return pd.concat(values, ignore_index=True) if values else pd.Series([], dtype=object)
+
+    def index_of(self, material_id):
+        if self._index is None:
+            ids = self.table['material_id'] if 'material_id' in self.table.columns else self._read_column('material_id')
+            self._index = {material_id: i for i, material_id in enumerate(ids)}
+        return self._index[material_id]
+
+    def _locate(self, i):
+        # Row i of the store -> (its chunk's arrays, row within the chunk)
+        c = int(np.searchsorted(self.offsets, i, side='right')) - 1
+        return self.chunks[c], i - self.offsets[c]
+
+    def site_arrays(self, i):
+        # Zero-copy views into the mapped arrays
+        chunk, j = self._locate(i)
+        start, stop = chunk['site_offsets'][j], chunk['site_offsets'][j + 1]
+        return chunk['lattices'][j], chunk['species'][start:stop], chunk['frac_coords'][start:stop]
+
+    def _symbol(self, z):
+        if z not in self._symbols:
+            self._symbols[z] = Element.from_Z(int(z)).symbol
+        return self._symbols[z]
+
+    def _site_properties(self, i):
+        if self._site_property_values is None:
+            if SITE_PROPERTIES_COLUMN in self.table.columns:
+                self._site_property_values = self.table[SITE_PROPERTIES_COLUMN]
+            else:
+                # Opened with a column subset, or packed before site properties were kept
+                self._site_property_values = self._read_column(SITE_PROPERTIES_COLUMN)
+        value = self._site_property_values.iat[i]
+        return json.loads(value) if isinstance(value, str) else None
+
+    def _oxidation_states(self, i):
+        chunk, j = self._locate(i)
+        if chunk['oxidation_states'] is None:
+            return None
+        return chunk['oxidation_states'][chunk['site_offsets'][j]:chunk['site_offsets'][j + 1]]
+
+    def structure(self, i):
+        lattice, species, frac_coords = self.site_arrays(i)
+        if len(species) == 0:
+            return None
+        symbols = [self._symbol(z) for z in species]
+        oxidation_states = self._oxidation_states(i)
+        if oxidation_states is not None and not np.isnan(oxidation_states).all():
+            symbols = [Species(symbol, None if np.isnan(oxi) else float(oxi)) for symbol, oxi in zip(symbols, oxidation_states)]
+        return Structure(
+            Lattice(np.array(lattice)), symbols, np.array(frac_coords), site_properties=self._site_properties(i)
+        )
+
+    def get(self, material_id):
+        return self.structure(self.index_of(material_id))
+
+    def structures(self):
+        for i in range(len(self)):
+            yield self.structure(i)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a CSV with stringified structures into a columnar store")
+    parser.add_argument('input', help="CSV with a structure column")
+    parser.add_argument('output', nargs='?', help="Store directory (default: <input>.structures)")
+    args = parser.parse_args()
+
+    output = args.output or store_path_for(args.input)
+    df = pd.read_csv(args.input)
+    write_structure_store(df, output)
+
+    csv_size = os.path.getsize(args.input)
+    store_size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(output) for name in names)
+    print(f"✅ Packed {len(df)} compounds into {output}")
+    print(f"Size: {csv_size / 1024:.0f} KB as CSV, {store_size / 1024:.0f} KB as store")
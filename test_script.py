@@ -1,20 +1,19 @@
 import pandas as pd
-from mp_api.client import MPRester
+from mp_cache import CachedMPRester
 from pymatgen.core.structure import Structure
-from pymatgen.analysis.local_env import CrystalNN
+from featurizer import get_featurizer
 import os
-from config import API_KEY
+from config import API_KEY, DATA_DIR
 
 # Configurations
-DATA_DIR = "/Users/Student/Desktop/chalcogenide-study/data"
 FILENAME = "test_bond_lengths.csv"
 
 # Ensure data directory exists
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
-# Initialize MPRester
-mpr = MPRester(API_KEY)
+# Initialize MPRester, searches are recorded so reruns (and CHALCO_MP_CACHE=replay) skip the network
+mpr = CachedMPRester(API_KEY)
 
 # Define test query
 elements = ["Cu", "S"]  # Test with Cu-S compounds
@@ -31,18 +30,9 @@ try:
     for entry in entries:
         try:
             structure = Structure.from_dict(entry.structure.as_dict())
-            nn = CrystalNN()
 
-            # Calculate bond lengths
-            bond_lengths = []
-            for i in range(len(structure)):
-                neighbors = nn.get_nn_info(structure, i)
-                for n in neighbors:
-                    bond_length = structure[i].distance(n['site'])  # Euclidean distance
-                    bond_lengths.append(bond_length)
-
-            # Average bond length
-            avg_bond_length = sum(bond_lengths) / len(bond_lengths) if bond_lengths else None
+            # Average bond length over each neighbor's actual periodic image
+            avg_bond_length = get_featurizer().featurize(structure)['avg_bond_length']
 
             # Save data
             data.append({
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Modules read DATA_DIR from config at import time, so point it at a scratch
+# directory before any of them are imported
+os.environ['CHALCO_DATA_DIR'] = tempfile.mkdtemp(prefix="chalco_tests_")
+os.environ.setdefault('CHALCO_MP_CACHE', 'record')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+import threading
+from types import SimpleNamespace
+from pymatgen.core import Lattice, Structure
+
+# Offline stand-ins for the Materials Project client, shared by the collection tests
+
+
+def zincblende(metal, chalcogen, a=5.6):
+    return Structure.from_spacegroup("F-43m", Lattice.cubic(a), [metal, chalcogen], [[0, 0, 0], [0.25, 0.25, 0.25]])
+
+
+class FakeSearch:
+    # Stands in for mpr.materials.summary.search. fail_first maps "Metal-Chalcogen" to the
+    # number of calls that raise before it answers, None meaning it never answers, and
+    # delays make earlier systems finish later
+    def __init__(self, fail_first=None, delays=None):
+        self.fail_first = dict(fail_first or {})
+        self.delays = delays or {}
+        self.calls = {}
+        self.issued = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, elements=None, material_ids=None, **query):
+        if material_ids is not None:
+            # Follow-up fetch by id, answers for ids an earlier search handed out
+            return [self.entry(*self.issued[material_id]) for material_id in material_ids if material_id in self.issued]
+        unit = f"{elements[0]}-{elements[1]}"
+        with self._lock:
+            self.calls[unit] = self.calls.get(unit, 0) + 1
+            calls = self.calls[unit]
+        threading.Event().wait(self.delays.get(unit, 0))
+        if unit in self.fail_first and (self.fail_first[unit] is None or calls <= self.fail_first[unit]):
+            raise ConnectionError(f"{unit} unavailable")
+        return [self.entry(elements[0], elements[1], i) for i in range(2)]
+
+    def entry(self, metal, chalcogen, i):
+        self.issued[f"mp-{metal}{chalcogen}-{i}"] = (metal, chalcogen, i)
+        return SimpleNamespace(
+            material_id=f"mp-{metal}{chalcogen}-{i}", formula_pretty=f"{metal}{chalcogen}", volume=175.6, density=4.1,
+            symmetry=SimpleNamespace(crystal_system='Cubic'), nsites=8, elements=[metal, chalcogen],
+            chemsys='-'.join(sorted([metal, chalcogen])), structure=zincblende(metal, chalcogen), last_updated="2024-01-01"
+        )
+
+
+class FakeMPRester:
+    def __init__(self, search):
+        self.materials = SimpleNamespace(summary=SimpleNamespace(search=search))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
@@ -0,0 +1,78 @@
+import os
+import glob
+import pandas as pd
+import pytest
+import checkpoint
+import mp_query
+import feature_engineering
+from checkpoint import RunCheckpoint, load_failure_manifest
+from structure_store import StructureStore, store_path_for
+from fakes import FakeSearch, FakeMPRester, zincblende
+
+RECORD_BATCH = RunCheckpoint.record_batch
+
+
+@pytest.fixture
+def collector(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, 'CHECKPOINT_DIR', str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(feature_engineering, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(feature_engineering, 'CATIONS', ['Cu', 'Zn'])
+    monkeypatch.setattr(feature_engineering, 'CHALCOGENS', ['S', 'Se'])
+    monkeypatch.setattr(mp_query.time, 'sleep', lambda seconds: None)
+    return feature_engineering.DataCollector(n_workers=1, use_cache=False, batch_size=1)
+
+
+def use_search(monkeypatch, search):
+    monkeypatch.setattr(feature_engineering, 'CachedMPRester', lambda *args, **kwargs: FakeMPRester(search))
+
+
+def crash_after_first_write(monkeypatch):
+    # The batch reaches the sink, then the run dies before it's checkpointed
+    def failing(self, unit, material_ids, failures=()):
+        raise RuntimeError("killed")
+
+    monkeypatch.setattr(RunCheckpoint, 'record_batch', failing)
+
+
+def test_resumed_run_writes_every_material_once(collector, monkeypatch):
+    use_search(monkeypatch, FakeSearch())
+    crash_after_first_write(monkeypatch)
+    collector.collect()
+    interrupted = RunCheckpoint.latest()
+    assert interrupted is not None and not interrupted.state['finished']
+
+    monkeypatch.setattr(RunCheckpoint, 'record_batch', RECORD_BATCH)
+    collector.collect(resume=True)
+    df = pd.read_csv(interrupted.state['output'])
+    assert len(df) == 8
+    assert df['material_id'].is_unique
+    assert 'structure' not in df.columns
+    # The packed structures next to the CSV got the same rows, also once each
+    store = StructureStore(store_path_for(interrupted.state['output']))
+    assert sorted(store.table['material_id']) == sorted(df['material_id'])
+    assert store.get("mp-CuS-0") == zincblende('Cu', 'S')
+    assert RunCheckpoint.load(interrupted.path).state['finished']
+
+
+def test_resuming_a_retry_run_keeps_its_failures(collector, monkeypatch, tmp_path):
+    use_search(monkeypatch, FakeSearch(fail_first={'Zn-Se': None}))
+    collector.collect()
+    manifest = glob.glob(str(tmp_path / "checkpoints" / "*_failures.json"))[0]
+    assert [failure['unit'] for failure in load_failure_manifest(manifest)] == ['Zn-Se']
+
+    search = FakeSearch()
+    use_search(monkeypatch, search)
+    crash_after_first_write(monkeypatch)
+    collector.collect(retry_failed=manifest)
+    interrupted = RunCheckpoint.latest()
+    assert interrupted.run_id.endswith("_retry")
+    assert interrupted.state['retry'] == load_failure_manifest(manifest)
+
+    monkeypatch.setattr(RunCheckpoint, 'record_batch', RECORD_BATCH)
+    collector.collect(resume=True)
+    # Only the failed system is queried again, and its rows land in the retry output once
+    assert set(search.calls) == {'Zn-Se'}
+    df = pd.read_csv(interrupted.state['output'])
+    assert sorted(df['material_id']) == ["mp-ZnSe-0", "mp-ZnSe-1"]
+    assert os.path.basename(interrupted.state['output']).endswith("_retry.csv")
+
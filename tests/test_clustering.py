@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from clustering import clustering_matrix, standardize_chunked, sweep_k, best_k
+
+
+def test_clustering_matrix_drops_flat_columns_and_fills_gaps():
+    df = pd.DataFrame({
+        'a': np.array([1.0, np.nan, 3.0, 5.0], dtype=np.float32),
+        'empty': [np.nan] * 4,
+        'constant': [2.0] * 4,
+        'single': [np.nan, 7.0, np.nan, np.nan],
+        'b': [0, 1, 0, 1]
+    })
+    X, columns = clustering_matrix(df)
+    assert columns == ['a', 'b']
+    assert X.dtype == np.float64
+    np.testing.assert_allclose(X[:, 0], [1.0, 3.0, 3.0, 5.0])
+
+
+def test_standardize_in_place_matches_standard_scaler():
+    X = np.random.default_rng(0).normal(5, 3, (1003, 4))
+    expected = StandardScaler().fit_transform(X)
+    scaled = standardize_chunked(X, chunk_size=100, copy=False)
+    assert scaled is X
+    np.testing.assert_allclose(scaled, expected, atol=1e-10)
+
+
+def test_sweep_finds_separated_blobs():
+    rng = np.random.default_rng(1)
+    X = rng.permutation(np.concatenate([rng.normal(center, 0.1, (300, 2)) for center in ([0, 0], [5, 5], [0, 5])]))
+    scores, models = sweep_k(X, ks=range(2, 6), sample_size=500, chunk_size=200, n_jobs=1)
+    assert best_k(scores) == 3
+    assert set(models) == {2, 3, 4, 5}
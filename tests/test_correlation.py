@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import pearsonr, spearmanr
+from correlation import correlation_matrices, correlation_table
+
+
+def test_pearson_survives_a_large_offset():
+    rng = np.random.default_rng(0)
+    x = 1e5 + 1e-3 * rng.standard_normal(500)
+    y = rng.standard_normal(500) + 0.02 * (x - 1e5) / 1e-3
+    r, p, n = correlation_matrices(np.column_stack([x, y]))
+    expected = pearsonr(x, y)
+    assert r[0, 1] == pytest.approx(expected[0], abs=1e-9)
+    assert p[0, 1] == pytest.approx(expected[1], rel=1e-6)
+    assert n[0, 1] == 500
+
+
+@pytest.mark.parametrize('method, reference', [('pearson', pearsonr), ('spearman', spearmanr)])
+def test_pairs_with_gaps_match_scipy_on_the_shared_rows(method, reference):
+    rng = np.random.default_rng(1)
+    X = rng.standard_normal((200, 4))
+    X[:, 1] += X[:, 0] ** 3
+    X[:, 3] = np.exp(X[:, 2])
+    X[rng.random(200) < 0.3, 1] = np.nan
+    X[rng.random(200) < 0.2, 2] = np.nan
+    r, p, n = correlation_matrices(X, method)
+    for i in range(4):
+        for j in range(i + 1, 4):
+            shared = ~np.isnan(X[:, i]) & ~np.isnan(X[:, j])
+            expected = reference(X[shared, i], X[shared, j])
+            assert r[i, j] == pytest.approx(expected[0], abs=1e-10)
+            assert p[i, j] == pytest.approx(expected[1], rel=1e-6, abs=1e-300)
+            assert n[i, j] == shared.sum()
+
+
+def test_table_lists_each_target_pair_once():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame(rng.standard_normal((50, 3)), columns=['a', 'band_gap', 'formation_energy_per_atom'])
+    table = correlation_table(df, targets=['band_gap', 'formation_energy_per_atom'])
+    assert len(table) == 3
+    assert {'spearman_r', 'spearman_q', 'n'} <= set(table.columns)
+
+
+def test_spearman_ranks_once_per_pair_of_missing_patterns(monkeypatch):
+    # Features that fail together share a pattern; 100 columns in 4 patterns take
+    # 1 + 6 ranking passes, not one per pair of columns
+    import correlation
+    rng = np.random.default_rng(3)
+    X = rng.standard_normal((2000, 100))
+    for block in range(3):
+        X[rng.random(2000) < 0.05, 25 * block:25 * (block + 1)] = np.nan
+    calls = []
+    column_ranks = correlation.column_ranks
+    monkeypatch.setattr(correlation, 'column_ranks', lambda X: calls.append(X.shape) or column_ranks(X))
+    r, _, _ = correlation_matrices(X, 'spearman')
+    assert len(calls) == 7
+    assert correlation.spearman_is_exact(X).all()
+    shared = ~np.isnan(X[:, 0]) & ~np.isnan(X[:, 99])
+    assert r[0, 99] == pytest.approx(spearmanr(X[shared, 0], X[shared, 99])[0], abs=1e-10)
+
+
+def test_scattered_gaps_fall_back_to_single_pass_ranks():
+    import time
+    import correlation
+    rng = np.random.default_rng(4)
+    X = rng.standard_normal((5000, 100))
+    X[rng.random(X.shape) < 0.01] = np.nan
+    start = time.perf_counter()
+    correlation_table(pd.DataFrame(X))
+    assert time.perf_counter() - start < 5
+    exact = correlation.spearman_is_exact(X)
+    assert exact.diagonal().all() and not exact[0, 1]
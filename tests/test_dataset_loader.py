@@ -0,0 +1,56 @@
+import os
+import numpy as np
+import pandas as pd
+from dataset_loader import load_dataset
+
+
+def write_csv(path, band_gaps):
+    pd.DataFrame({
+        'material_id': [f"mp-{i}" for i in range(len(band_gaps))],
+        'chemsys': ['S-Zn'] * len(band_gaps),
+        'band_gap': band_gaps,
+        'nsites': [8] * len(band_gaps)
+    }).to_csv(path, index=False)
+
+
+def test_downcast_is_opt_out(tmp_path):
+    path = tmp_path / "data.csv"
+    write_csv(path, [1.2345678901, 2.5])
+    full = load_dataset(path, downcast=False, cache_dir=tmp_path / "cache")
+    assert full['band_gap'].dtype == np.float64
+    assert full['band_gap'].iloc[0] == 1.2345678901
+    assert full['nsites'].dtype == np.int64
+    small = load_dataset(path, cache_dir=tmp_path / "cache")
+    assert small['band_gap'].dtype == np.float32
+    assert small['nsites'].dtype == np.int32
+
+
+def test_sidecar_follows_edits_that_keep_the_mtime(tmp_path):
+    path = tmp_path / "data.csv"
+    cache_dir = tmp_path / "cache"
+    write_csv(path, [1.0, 2.0])
+    stat = os.stat(path)
+    assert load_dataset(path, cache_dir=cache_dir)['band_gap'].tolist() == [1.0, 2.0]
+
+    # Rewritten and its mtime put back, as a copy that preserves timestamps would
+    write_csv(path, [3.0, 4.0, 5.0])
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_dataset(path, cache_dir=cache_dir)['band_gap'].tolist() == [3.0, 4.0, 5.0]
+
+    # Same size and mtime, different contents
+    write_csv(path, [6.0, 7.0, 8.0])
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_dataset(path, cache_dir=cache_dir)['band_gap'].tolist() == [6.0, 7.0, 8.0]
+
+    # Only the current version's sidecar is kept
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_sidecar_is_reused(tmp_path):
+    path = tmp_path / "data.csv"
+    write_csv(path, [1.0])
+    first = load_dataset(path, cache_dir=tmp_path / "cache")
+    sidecar = os.listdir(tmp_path / "cache")
+    again = load_dataset(path, cache_dir=tmp_path / "cache")
+    assert os.listdir(tmp_path / "cache") == sidecar
+    pd.testing.assert_frame_equal(first, again)
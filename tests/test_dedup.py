@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pymatgen.core import Lattice, Structure
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer, SymmetryUndeterminedError
+import dedup
+from dedup import Deduplicator
+import featurizer
+from featurizer import featurize_dataframe
+from material_store import MaterialStore
+from instrumentation import get_profiler, reset_profiler
+from fakes import zincblende
+
+
+def wurtzite(metal, chalcogen):
+    return Structure.from_spacegroup("P6_3mc", Lattice.hexagonal(3.82, 6.26), [metal, chalcogen],
+                                     [[1 / 3, 2 / 3, 0], [1 / 3, 2 / 3, 0.375]])
+
+
+def variants(structure):
+    # The same crystal written differently: shifted origin, permuted sites, as a supercell
+    shifted = structure.copy()
+    shifted.translate_sites(list(range(len(shifted))), [0.1, 0.2, 0.3])
+    permuted = Structure.from_sites(list(reversed(structure.sites)))
+    return [shifted, permuted, structure * (1, 1, 2)]
+
+
+def test_equivalent_structures_share_a_class():
+    dedup = Deduplicator()
+    zinc = zincblende('Zn', 'S')
+    structures = [zinc] + variants(zinc) + [wurtzite('Zn', 'S'), zincblende('Cd', 'Te', a=6.5)]
+    ids = [f"mp-{i}" for i in range(len(structures))]
+    representatives = dedup.assign_all(ids, structures, n_jobs=1)
+    # The supercell has more sites, so it lands in its own bucket and class
+    assert representatives == ["mp-0", "mp-0", "mp-0", "mp-3", "mp-4", "mp-5"]
+    assert dedup.stats() == {'materials': 6, 'classes': 4, 'buckets': 4}
+    # Seen again, an id keeps its class without another match
+    assert dedup.assign("mp-2", structures[2]) == "mp-0"
+
+
+def test_a_different_lattice_constant_is_a_different_class():
+    dedup = Deduplicator()
+    assert dedup.assign_all(["mp-0", "mp-1"], [zincblende('Zn', 'S'), zincblende('Zn', 'S', a=6.2)], n_jobs=1) == ["mp-0", "mp-1"]
+
+
+def test_bucket_without_a_spacegroup(monkeypatch):
+    def undetermined(self, *args, **kwargs):
+        raise SymmetryUndeterminedError("no symmetry")
+
+    monkeypatch.setattr(SpacegroupAnalyzer, 'get_space_group_number', undetermined)
+    assert Deduplicator().bucket(zincblende('Zn', 'S')) == "ZnS|0|8"
+
+
+def test_bucket_does_not_swallow_other_errors(monkeypatch):
+    def broken(self, *args, **kwargs):
+        raise RuntimeError("bug")
+
+    monkeypatch.setattr(SpacegroupAnalyzer, 'get_space_group_number', broken)
+    with pytest.raises(RuntimeError):
+        Deduplicator().bucket(zincblende('Zn', 'S'))
+
+
+def test_classes_persist_across_runs(tmp_path, monkeypatch):
+    store_path = str(tmp_path / "store.db")
+    zinc = zincblende('Zn', 'S')
+    with MaterialStore(store_path) as store:
+        store.upsert([{'material_id': "mp-old", 'chemsys': "S-Zn", 'structure': zinc.as_dict()}])
+    first = Deduplicator(store_path=store_path)
+    first.assign_all(["mp-old"], [zinc], n_jobs=1)
+    first.set_features("mp-old", {'avg_coordination': 4.0, 'avg_bond_length': 2.42})
+    assert first.save() == 1
+
+    later = Deduplicator(store_path=store_path)
+    assert later.assign("mp-new", variants(zinc)[0]) == "mp-old"
+    assert later.features["mp-old"] == {'avg_coordination': 4.0, 'avg_bond_length': 2.42}
+
+    # Features from another featurizer version are recomputed, the class itself still holds
+    monkeypatch.setattr(dedup, 'FEATURIZER_VERSION', featurizer.FEATURIZER_VERSION + 1)
+    bumped = Deduplicator(store_path=store_path)
+    assert bumped.assign("mp-new", variants(zinc)[0]) == "mp-old"
+    assert "mp-old" not in bumped.features
+
+
+def test_featurize_copies_features_within_a_class():
+    zinc = zincblende('Zn', 'S')
+    structures = [zinc, variants(zinc)[0], zincblende('Cd', 'Te', a=6.5)]
+    df = pd.DataFrame({
+        'material_id': ["mp-0", "mp-1", "mp-2"],
+        'elements': [['Zn', 'S'], ['Zn', 'S'], ['Cd', 'Te']],
+        'crystal_system': ['Cubic'] * 3,
+        'density': [float(s.density) for s in structures],
+        'volume': [s.volume for s in structures],
+        'structure': [s.as_dict() for s in structures]
+    })
+    reset_profiler()
+    features = featurize_dataframe(df, n_workers=1, dedup=Deduplicator())
+    plain = featurize_dataframe(df, n_workers=1)
+    assert get_profiler().counters[('dedup_reused', None)] == 1
+    np.testing.assert_allclose(features['avg_bond_length'], plain['avg_bond_length'])
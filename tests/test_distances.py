@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from pymatgen.core import Lattice, Structure
+from pymatgen.analysis.local_env import CrystalNN
+from distances import neighbor_distances, minimum_image_distances, check_against_pymatgen
+
+
+def random_structure(rng):
+    # Triclinic cell, angles kept where every triple is a valid lattice
+    lengths = rng.uniform(3, 12, 3)
+    angles = rng.uniform(70, 110, 3)
+    n_sites = int(rng.integers(1, 10))
+    return Structure(Lattice.from_parameters(*lengths, *angles), ['Cu'] * n_sites, rng.random((n_sites, 3)))
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_neighbor_distances_match_get_distance(seed):
+    rng = np.random.default_rng(seed)
+    structure = random_structure(rng)
+    n_pairs = 50
+    centers = rng.integers(0, len(structure), n_pairs)
+    neighbors = rng.integers(0, len(structure), n_pairs)
+    images = rng.integers(-2, 3, (n_pairs, 3))
+    ours = neighbor_distances(structure.lattice.matrix, structure.frac_coords, centers, neighbors, images)
+    theirs = [structure.get_distance(i, j, jimage=image) for i, j, image in zip(centers, neighbors, images)]
+    np.testing.assert_allclose(ours, theirs, rtol=0, atol=1e-8)
+
+
+def test_neighbor_distances_with_crystalnn_images():
+    structure = Structure.from_spacegroup("P6_3mc", Lattice.hexagonal(3.82, 6.26), ['Zn', 'S'], [[1 / 3, 2 / 3, 0], [1 / 3, 2 / 3, 0.375]])
+    centers, neighbors, images, expected = [], [], [], []
+    for i in range(len(structure)):
+        for n in CrystalNN().get_nn_info(structure, i):
+            centers.append(i)
+            neighbors.append(n['site_index'])
+            images.append(n['image'])
+            expected.append(structure[i].distance(n['site']))
+    ours = neighbor_distances(structure.lattice.matrix, structure.frac_coords, np.array(centers), np.array(neighbors), np.array(images))
+    np.testing.assert_allclose(ours, expected, rtol=0, atol=1e-8)
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_minimum_image_distances_match_get_distance(seed):
+    structure = random_structure(np.random.default_rng(seed))
+    ok, max_error = check_against_pymatgen(structure, n_pairs=50, seed=seed)
+    assert ok, f"max error {max_error:.2e}"
+
+
+def test_minimum_image_distances_in_a_skewed_cell():
+    # Sheared cell where the 27 images around the wrapped fractional difference miss the
+    # closest one unless the basis is reduced first
+    structure = Structure(Lattice([[10, 0, 0], [29.7, 1, 0], [0, 0, 3]]), ['Cu', 'Cu'], [[0, 0, 0], [0.64, 0.27, 0.04]])
+    ours = minimum_image_distances(structure.lattice.matrix, structure.frac_coords, np.array([0]), np.array([1]))
+    assert ours[0] == pytest.approx(structure.get_distance(0, 1), abs=1e-8)
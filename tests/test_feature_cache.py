@@ -0,0 +1,86 @@
+import os
+import time
+import pandas as pd
+from pymatgen.core import Structure
+from feature_cache import FeatureCache, structure_hash
+from featurizer import featurize_dataframe, FEATURIZER_VERSION
+from instrumentation import get_profiler, reset_profiler
+from fakes import zincblende
+
+
+def test_key_ignores_site_order_serialization_and_wrapping():
+    structure = zincblende('Zn', 'S')
+    key = structure_hash(structure, FEATURIZER_VERSION)
+    shuffled = Structure.from_sites(list(reversed(structure.sites)))
+    wrapped = structure.as_dict()
+    wrapped['sites'][0]['abc'] = [value + 1.0 for value in wrapped['sites'][0]['abc']]
+    assert structure_hash(shuffled, FEATURIZER_VERSION) == key
+    assert structure_hash(str(structure.as_dict()), FEATURIZER_VERSION) == key
+    assert structure_hash(wrapped, FEATURIZER_VERSION) == key
+
+
+def test_key_changes_with_version_and_geometry():
+    structure = zincblende('Zn', 'S')
+    key = structure_hash(structure, FEATURIZER_VERSION)
+    assert structure_hash(structure, FEATURIZER_VERSION + 1) != key
+    assert structure_hash(zincblende('Zn', 'S', a=5.7), FEATURIZER_VERSION) != key
+    assert structure_hash(zincblende('Zn', 'Se'), FEATURIZER_VERSION) != key
+
+
+def test_key_changes_with_oxidation_states_and_site_properties():
+    structure = zincblende('Mn', 'S')
+    key = structure_hash(structure, FEATURIZER_VERSION)
+    charged = structure.copy()
+    charged.add_oxidation_state_by_element({'Mn': 2, 'S': -2})
+    charged_float = structure.copy()
+    charged_float.add_oxidation_state_by_element({'Mn': 2.0, 'S': -2.0})
+    magnetic = structure.copy()
+    magnetic.add_site_property('magmom', [5.0] * 4 + [0.0] * 4)
+    flipped = structure.copy()
+    flipped.add_site_property('magmom', [5.0, -5.0] * 2 + [0.0] * 4)
+    keys = {structure_hash(s, FEATURIZER_VERSION) for s in (structure, charged, magnetic, flipped)}
+    assert len(keys) == 4
+    assert structure_hash(charged_float, FEATURIZER_VERSION) == structure_hash(charged, FEATURIZER_VERSION)
+    assert structure_hash(Structure.from_sites(list(reversed(magnetic.sites))), FEATURIZER_VERSION) == structure_hash(magnetic, FEATURIZER_VERSION)
+
+
+def frame(structures):
+    return pd.DataFrame({
+        'material_id': [f"mp-{i}" for i in range(len(structures))],
+        'elements': [[str(el) for el in s.composition.elements] for s in structures],
+        'crystal_system': ['Cubic'] * len(structures),
+        'density': [float(s.density) for s in structures],
+        'volume': [s.volume for s in structures],
+        'structure': [s.as_dict() for s in structures]
+    })
+
+
+def test_featurize_reuses_cached_features_until_the_structure_changes(tmp_path):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    first = featurize_dataframe(frame([zincblende('Zn', 'S'), zincblende('Cd', 'Te', a=6.5)]), n_workers=1, cache=cache)
+
+    reset_profiler()
+    again = featurize_dataframe(frame([zincblende('Zn', 'S'), zincblende('Cd', 'Te', a=6.5)]), n_workers=1, cache=cache)
+    pd.testing.assert_frame_equal(first, again)
+    assert get_profiler().counters[('feature_cache_hits', None)] == 2
+    assert ('featurized', None) not in get_profiler().counters
+
+    reset_profiler()
+    changed = featurize_dataframe(frame([zincblende('Zn', 'S'), zincblende('Cd', 'Te', a=6.8)]), n_workers=1, cache=cache)
+    assert get_profiler().counters[('feature_cache_hits', None)] == 1
+    assert get_profiler().counters[('featurized', None)] == 1
+    assert changed['avg_bond_length'].iloc[1] > first['avg_bond_length'].iloc[1]
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    now = time.time()
+    for i, key in enumerate(['aa1', 'bb2', 'cc3']):
+        cache.put(key, {'avg_coordination': float(i)})
+        os.utime(cache._path(key), (now - 100 + i, now - 100 + i))
+    # Reading an entry makes it the most recently used
+    assert cache.get('aa1') == {'avg_coordination': 0.0}
+    size = os.path.getsize(cache._path('aa1'))
+    assert cache.prune(max_bytes=2 * size) == 1
+    assert cache.get('bb2') is None
+    assert cache.get('aa1') is not None and cache.get('cc3') is not None
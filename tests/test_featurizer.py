@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+from pymatgen.core import Lattice, Structure
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer, SymmetryUndeterminedError
+from featurizer import StructureFeaturizer, featurize_dataframe
+from instrumentation import get_profiler, reset_profiler
+from fakes import zincblende
+
+
+def frame(structures):
+    return pd.DataFrame({
+        'material_id': [f"mp-{i}" for i in range(len(structures))],
+        'elements': [[str(el) for el in s.composition.elements] for s in structures],
+        'chemsys': [s.composition.chemical_system for s in structures],
+        'crystal_system': ['Cubic'] * len(structures),
+        'density': [float(s.density) for s in structures],
+        'volume': [s.volume for s in structures],
+        'structure': [s.as_dict() for s in structures]
+    })
+
+
+def test_symmetry_and_all_sites_agree():
+    structure = zincblende('Zn', 'S')
+    assert StructureFeaturizer().featurize(structure) == pytest.approx(StructureFeaturizer(use_symmetry=False).featurize(structure))
+
+
+def test_failed_symmetry_detection_falls_back_and_is_counted(monkeypatch):
+    def undetermined(self, *args, **kwargs):
+        raise SymmetryUndeterminedError("no symmetry")
+
+    monkeypatch.setattr(SpacegroupAnalyzer, 'get_symmetry_dataset', undetermined)
+    reset_profiler()
+    features = featurize_dataframe(frame([zincblende('Zn', 'S'), zincblende('Cd', 'Te', a=6.5)]), n_workers=1)
+    assert features['avg_coordination'].tolist() == [4.0, 4.0]
+    assert get_profiler().counters[('symmetry_fallback', 'S-Zn')] == 1
+    assert get_profiler().counters[('symmetry_fallback', 'Cd-Te')] == 1
+    assert 'symmetry_fallback' not in get_profiler().material_stats
+
+
+def test_other_errors_are_not_swallowed(monkeypatch):
+    def broken(self, *args, **kwargs):
+        raise RuntimeError("bug")
+
+    monkeypatch.setattr(SpacegroupAnalyzer, 'get_symmetry_dataset', broken)
+    reset_profiler()
+    errors = []
+    features = featurize_dataframe(frame([zincblende('Zn', 'S')]), n_workers=1, errors=errors)
+    assert errors == [{'material_id': "mp-0", 'error': "bug"}]
+    assert features['avg_coordination'].isna().all()
+    assert ('symmetry_fallback', 'S-Zn') not in get_profiler().counters
+
+
+def test_structure_without_neighbours_is_a_failure():
+    isolated = Structure(Lattice.cubic(4.2), ['Cu', 'S'], [[0, 0, 0], [0.5, 0.5, 0.5]])
+    errors = []
+    features = featurize_dataframe(frame([isolated, zincblende('Zn', 'S')]), n_workers=1, errors=errors)
+    assert [error['material_id'] for error in errors] == ["mp-0"]
+    assert "no neighbours" in errors[0]['error']
+    assert features['avg_bond_length'].isna().tolist() == [True, False]
@@ -0,0 +1,15 @@
+from instrumentation import RunProfiler
+
+
+def test_profiler_aggregates_materials_unless_asked():
+    profiler = RunProfiler()
+    for i in range(100):
+        profiler.record_material(f"mp-{i}", chemsys="S-Zn", crystalnn_s=0.5, worker_peak_rss_mb=100 + i)
+    assert profiler.materials == []
+    assert profiler.material_stats['crystalnn_s']['count'] == 100
+    assert profiler.material_stats['worker_peak_rss_mb']['max'] == 199
+    assert profiler.report()['stages']['crystalnn']['calls'] == 100
+
+    detailed = RunProfiler(keep_materials=True)
+    detailed.record_material("mp-1", crystalnn_s=0.1)
+    assert detailed.materials == [{'material_id': "mp-1", 'chemsys': None, 'crystalnn_s': 0.1}]
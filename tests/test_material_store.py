@@ -0,0 +1,30 @@
+import json
+import numpy as np
+from material_store import MaterialStore
+
+
+def test_numpy_nan_is_stored_as_null(tmp_path):
+    record = {'material_id': "mp-1", 'chemsys': "S-Zn", 'band_gap': np.float32('nan'), 'density': np.float64(4.1),
+              'nsites': np.int64(8), 'volume': float('nan')}
+    with MaterialStore(str(tmp_path / "store.db")) as store:
+        assert store.upsert([record])['added'] == 1
+        (data,) = store.conn.execute("SELECT data FROM materials").fetchone()
+        stored = json.loads(data)
+        assert stored['band_gap'] is None and stored['volume'] is None
+        assert stored['density'] == 4.1 and stored['nsites'] == 8
+        assert 'NaN' not in data
+
+        # The same material read back from a CSV, NaN as a plain float, is unchanged
+        again = dict(record, band_gap=float('nan'), density=4.1, nsites=8)
+        assert store.upsert([again]) == {'added': 0, 'updated': 0, 'unchanged': 1}
+
+
+def test_upsert_only_looks_up_the_batch(tmp_path):
+    with MaterialStore(str(tmp_path / "store.db")) as store:
+        store.upsert([{'material_id': f"mp-{i}", 'chemsys': "S-Zn", 'band_gap': float(i)} for i in range(1200)])
+        assert store.content_hashes(["mp-5", "mp-1100", "mp-missing"], chunk_size=2).keys() == {"mp-5", "mp-1100"}
+        batch = [{'material_id': "mp-5", 'chemsys': "S-Zn", 'band_gap': 5.0},
+                 {'material_id': "mp-7", 'chemsys': "S-Zn", 'band_gap': 0.5},
+                 {'material_id': "mp-new", 'chemsys': "S-Zn", 'band_gap': 1.0}]
+        assert store.upsert(batch) == {'added': 1, 'updated': 1, 'unchanged': 1}
+        assert store.conn.execute("SELECT COUNT(*) FROM materials").fetchone()[0] == 1201
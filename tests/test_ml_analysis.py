@@ -0,0 +1,35 @@
+import os
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from config import DATA_DIR
+from ml_analysis import MLModel
+
+
+def write_dataset(name, n=60):
+    rng = np.random.default_rng(0)
+    chemsys = np.array(['S-Zn', 'Se-Zn', 'Cd-S', 'Cd-Te', 'Cu-S', 'Cu-Se'])[rng.integers(0, 6, n)]
+    pd.DataFrame({
+        'material_id': [f"mp-{i}" for i in range(n)],
+        'chemsys': chemsys,
+        'volume': rng.uniform(40, 400, n),
+        'density': rng.uniform(3, 8, n),
+        'nsites': rng.integers(2, 40, n),
+        'formation_energy_per_atom': rng.normal(-0.5, 0.2, n),
+        'band_gap': np.clip(rng.normal(1.5, 1, n), 0, None)
+    }).to_csv(os.path.join(DATA_DIR, name), index=False)
+    return MLModel(name)
+
+
+def test_default_split_is_the_plain_row_split():
+    model = write_dataset("split_check.csv")
+    train_idx, test_idx = model.train_test_indices()
+    expected_train, expected_test = train_test_split(np.arange(60), test_size=0.2, random_state=42)
+    assert list(train_idx) == list(expected_train) and list(test_idx) == list(expected_test)
+
+
+def test_grouped_split_holds_out_whole_systems():
+    model = write_dataset("grouped_check.csv")
+    train_idx, test_idx = model.train_test_indices(grouped=True)
+    assert not set(model.groups[train_idx]) & set(model.groups[test_idx])
+    assert len(train_idx) + len(test_idx) == 60
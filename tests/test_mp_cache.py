@@ -0,0 +1,81 @@
+import pytest
+import mp_cache
+from mp_cache import CachedMPRester, CacheMiss, ResponseCache, query_key
+from instrumentation import get_profiler, reset_profiler
+
+
+class CountingSearch:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, **query):
+        self.calls += 1
+        return [f"doc-{self.calls}"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(mp_cache.time, 'time', lambda: now[0])
+    reset_profiler()
+    return now
+
+
+def test_key_ignores_argument_and_list_order():
+    assert query_key('summary', {'elements': ['Zn', 'S'], 'num_elements': 2}) == \
+        query_key('summary', {'num_elements': 2, 'elements': ['S', 'Zn']})
+    assert query_key('summary', {'elements': ['Zn', 'S']}) != query_key('summary', {'elements': ['Zn', 'Se']})
+
+
+def test_record_serves_fresh_entries_and_refetches_expired_ones(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), ttl=3600, mode='record')
+    search = CountingSearch()
+    query = {'elements': ['Zn', 'S'], 'num_elements': 2}
+    assert cache.fetch('summary', search, query) == ["doc-1"]
+    clock[0] += 1800
+    assert cache.fetch('summary', search, query) == ["doc-1"]
+    assert search.calls == 1
+    clock[0] += 3600
+    assert cache.fetch('summary', search, query) == ["doc-2"]
+    counters = get_profiler().counters
+    assert counters[('mp_cache_hits', None)] == 1 and counters[('mp_cache_misses', None)] == 2
+
+
+def test_replay_ignores_the_ttl_and_never_searches(tmp_path, clock):
+    ResponseCache(str(tmp_path), ttl=60, mode='record').fetch('summary', CountingSearch(), {'elements': ['Zn', 'S']})
+    clock[0] += 10 * 60
+    replay = ResponseCache(str(tmp_path), ttl=60, mode='replay')
+    search = CountingSearch()
+    assert replay.fetch('summary', search, {'elements': ['S', 'Zn']}) == ["doc-1"]
+    with pytest.raises(CacheMiss):
+        replay.fetch('summary', search, {'elements': ['Cu', 'S']})
+    assert search.calls == 0
+
+
+def test_refresh_and_off(tmp_path, clock):
+    query = {'elements': ['Zn', 'S']}
+    search = CountingSearch()
+    ResponseCache(str(tmp_path), mode='record').fetch('summary', search, query)
+    assert ResponseCache(str(tmp_path), mode='refresh').fetch('summary', search, query) == ["doc-2"]
+    assert ResponseCache(str(tmp_path), mode='record').fetch('summary', search, query) == ["doc-2"]
+    off = ResponseCache(str(tmp_path / "off"), mode='off')
+    assert off.fetch('summary', search, query) == ["doc-3"]
+    assert list(off.entries()) == []
+
+
+def test_clear_expired_keeps_fresh_entries(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), ttl=100, mode='record')
+    cache.fetch('summary', CountingSearch(), {'elements': ['Zn', 'S']})
+    clock[0] += 200
+    cache.fetch('summary', CountingSearch(), {'elements': ['Cd', 'Te']})
+    assert cache.clear(expired_only=True) == 1
+    assert len(list(cache.entries())) == 1
+
+
+def test_replay_rester_never_opens_a_session(tmp_path, clock):
+    ResponseCache(str(tmp_path), mode='record').fetch('summary', CountingSearch(), {'elements': ['Zn', 'S'], 'fields': ['material_id']})
+    with CachedMPRester("key", cache=ResponseCache(str(tmp_path), mode='replay')) as mpr:
+        assert mpr.materials.summary.search(elements=['Zn', 'S'], fields=['material_id']) == ["doc-1"]
+        with pytest.raises(CacheMiss):
+            mpr.materials.summary.search(elements=['Cu', 'S'], fields=['material_id'])
+        assert mpr.mpr is None
@@ -0,0 +1,49 @@
+import pytest
+import mp_query
+import feature_engineering
+from instrumentation import reset_profiler, get_profiler
+from mp_query import QueryScheduler
+from fakes import FakeSearch, FakeMPRester
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(mp_query.time, 'sleep', lambda seconds: None)
+    reset_profiler()
+
+
+def test_retries_until_the_query_succeeds():
+    search = FakeSearch(fail_first={'Zn-S': 2})
+    scheduler = QueryScheduler(search, max_workers=2, max_per_second=None, max_retries=3)
+    results = {(metal, chalcogen): (entries, error) for metal, chalcogen, entries, error in scheduler.run([('Zn', 'S'), ('Cu', 'S')])}
+    entries, error = results[('Zn', 'S')]
+    assert error is None and len(entries) == 2
+    assert search.calls == {'Zn-S': 3, 'Cu-S': 1}
+    assert get_profiler().counters[('mp_query_errors', 'Zn-S')] == 2
+
+
+def test_reports_a_system_that_keeps_failing():
+    search = FakeSearch(fail_first={'Cu-Se': None})
+    scheduler = QueryScheduler(search, max_workers=2, max_per_second=None, max_retries=2)
+    results = {(metal, chalcogen): (entries, error) for metal, chalcogen, entries, error in scheduler.run([('Cu', 'Se'), ('Cu', 'S')])}
+    entries, error = results[('Cu', 'Se')]
+    assert entries is None and isinstance(error, ConnectionError)
+    assert search.calls['Cu-Se'] == 3
+    assert results[('Cu', 'S')][1] is None
+
+
+def test_get_compounds_keeps_system_order(monkeypatch):
+    # Earlier systems answer last and one system needs a retry, the frame still comes out
+    # in CATIONS x CHALCOGENS order
+    search = FakeSearch(fail_first={'Cu-Se': 1}, delays={'Cu-S': 0.2, 'Cu-Se': 0.1})
+    monkeypatch.setattr(feature_engineering, 'CATIONS', ['Cu', 'Zn'])
+    monkeypatch.setattr(feature_engineering, 'CHALCOGENS', ['S', 'Se'])
+    monkeypatch.setattr(feature_engineering, 'CachedMPRester', lambda *args, **kwargs: FakeMPRester(search))
+
+    collector = feature_engineering.DataCollector(n_workers=1, use_cache=False, batch_size=2)
+    df = collector.get_compounds()
+    assert list(zip(df['metal'], df['chalcogen'])) == [
+        ('Cu', 'S'), ('Cu', 'S'), ('Cu', 'Se'), ('Cu', 'Se'), ('Zn', 'S'), ('Zn', 'S'), ('Zn', 'Se'), ('Zn', 'Se')
+    ]
+    assert list(df['material_id'][:2]) == ["mp-CuS-0", "mp-CuS-1"]
+    assert df['avg_coordination'].notna().all()
@@ -0,0 +1,37 @@
+import threading
+import time
+from mp_query import QueryScheduler
+
+
+class CountingSearch:
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, elements, **query):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return [f"{elements[0]}{elements[1]}"] * 3
+
+
+def test_run_keeps_a_bounded_window_in_flight():
+    search = CountingSearch()
+    scheduler = QueryScheduler(search, max_workers=2, max_per_second=None)
+    pairs = [(f"M{i}", "S") for i in range(20)]
+    submitted = []
+    original = scheduler.search_chemsys
+    scheduler.search_chemsys = lambda metal, chalcogen: submitted.append(metal) or original(metal, chalcogen)
+
+    results = scheduler.run(pairs, max_in_flight=3)
+    first = next(results)
+    # Nothing beyond the window has been submitted while the consumer holds the first result
+    assert len(submitted) <= 4
+    rest = list(results)
+    assert sorted(metal for metal, *_ in [first] + rest) == sorted(metal for metal, _ in pairs)
+    assert search.max_active <= 2
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+from prepared_dataset import PreparedDataset
+from similarity_index import SimilarityIndex
+
+
+def make_index(n=50, seed=0, **kwargs):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'material_id': [f"mp-{i}" for i in range(n)],
+        'a': rng.normal(size=n),
+        'b': rng.normal(size=n),
+        **kwargs
+    })
+    features = ['a', 'b'] + list(kwargs)
+    return SimilarityIndex.from_dataset(PreparedDataset(df), df['material_id'], features=features), df
+
+
+def brute_force(index, point, exclude=None):
+    live = [i for i in range(len(index.X)) if not index.stale[i] and index.ids[i] != exclude]
+    distances = np.linalg.norm(index.X[live] - point, axis=1)
+    order = np.argsort(distances, kind='stable')
+    return list(index.ids[live][order]), distances[order]
+
+
+def test_neighbors_match_brute_force():
+    index, _ = make_index()
+    result = index.neighbors('mp-3', k=5)
+    ids, distances = brute_force(index, index.X[index.row['mp-3']], exclude='mp-3')
+    assert list(result['material_id']) == ids[:5]
+    np.testing.assert_allclose(result['distance'], distances[:5])
+
+
+def test_update_with_duplicate_ids_in_one_batch():
+    index, _ = make_index()
+    added, updated = index.update(['new1', 'new1'], [[0, 0], [1, 1]])
+    assert (added, updated) == (1, 0)
+    np.testing.assert_allclose(index.X[index.row['new1']], index.scale_vectors([[1, 1]])[0])
+
+    added, updated = index.update(['mp-0', 'mp-0', 'new2'], [[5, 5], [6, 6], [2, 2]])
+    assert (added, updated) == (1, 1)
+    assert len(index) == 52
+    np.testing.assert_allclose(index.X[index.row['mp-0']], index.scale_vectors([[6, 6]])[0])
+
+
+def test_buffer_and_stale_rows_are_searched_correctly():
+    index, _ = make_index(n=200)
+    # Small enough to stay in the buffer without a rebuild
+    index.update(['mp-1', 'new'], [[0.1, 0.1], [0.0, 0.0]])
+    assert index.n_tree == 200 and len(index.X) == 202
+    point = index.scale_vectors([[0.0, 0.0]])
+    result = index.neighbors(vector=[0.0, 0.0], k=10)
+    ids, distances = brute_force(index, point[0])
+    assert list(result['material_id']) == ids[:10]
+    within = index.within(vector=[0.0, 0.0], radius=0.5)
+    assert list(within['material_id']) == [i for i, d in zip(ids, distances) if d <= 0.5]
+
+
+def test_update_triggers_rebuild_and_drops_stale_rows():
+    index, _ = make_index(n=20)
+    index.update([f"mp-{i}" for i in range(5)], np.zeros((5, 2)) + 3)
+    assert index.n_tree == 20 and not index.stale.any()
+    assert len(index.ids) == len(set(index.ids)) == 20
+
+
+def test_all_nan_and_constant_columns_are_left_out():
+    index, _ = make_index(c=np.full(50, np.nan), d=np.ones(50))
+    assert index.features == ['a', 'b']
+    with pytest.raises(ValueError):
+        SimilarityIndex.from_dataset(
+            PreparedDataset(pd.DataFrame({'material_id': ['x', 'y'], 'c': [np.nan, np.nan]})), ['x', 'y'], features=['c']
+        )
+
+
+def test_save_and_load_round_trip():
+    index, _ = make_index()
+    index.update(['new'], [[0.5, 0.5]])
+    index.save('test')
+    loaded = SimilarityIndex.load('test')
+    pd.testing.assert_frame_equal(loaded.neighbors('new', k=5), index.neighbors('new', k=5))
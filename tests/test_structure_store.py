@@ -0,0 +1,103 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from pymatgen.core import Lattice, Structure
+from pymatgen.core.periodic_table import DummySpecies
+from structure_store import StructureStore, pack_structures, read_csv_with_structures, store_path_for, write_structure_store
+from fakes import zincblende
+
+
+def frame(structures, prefix="mp"):
+    return pd.DataFrame({
+        'material_id': [f"{prefix}-{i}" for i in range(len(structures))],
+        'elements': [['Zn', 'S']] * len(structures),
+        'structure': [structure.as_dict() if structure is not None else None for structure in structures]
+    })
+
+
+def test_round_trip_keeps_oxidation_states_and_site_properties(tmp_path):
+    plain = zincblende('Zn', 'S')
+    charged = zincblende('Zn', 'S')
+    charged.add_oxidation_state_by_element({'Zn': 2, 'S': -2})
+    magnetic = zincblende('Mn', 'Se')
+    magnetic.add_site_property('magmom', [4.5] * 4 + [0.0] * 4)
+
+    write_structure_store(frame([plain, charged, None, magnetic]), tmp_path / "store")
+    store = StructureStore(tmp_path / "store")
+    assert store.get("mp-0") == plain
+    assert store.get("mp-1") == charged
+    assert [site.specie.oxi_state for site in store.get("mp-1")][::4] == [2, -2]
+    assert store.get("mp-2") is None
+    assert store.get("mp-3").site_properties == {'magmom': [4.5] * 4 + [0.0] * 4}
+    assert store.get("mp-0").site_properties == {}
+    # A column subset still brings the site properties back
+    assert StructureStore(tmp_path / "store", columns=['material_id']).get("mp-3").site_properties['magmom'][0] == 4.5
+
+
+def test_append_adds_after_existing_rows(tmp_path):
+    path = tmp_path / "store"
+    first = [zincblende('Zn', 'S'), zincblende('Cd', 'Te', a=6.5)]
+    second = [zincblende('Cu', 'Se', a=5.8)]
+    write_structure_store(frame(first, "a"), path, append=True)
+    write_structure_store(frame(second, "b"), path, append=True)
+    store = StructureStore(path)
+    assert list(store.table['material_id']) == ["a-0", "a-1", "b-0"]
+    assert [store.structure(i) for i in range(3)] == first + second
+    assert list(store.offsets) == [0, 2, 3]
+
+
+def test_append_leaves_existing_chunks_alone(tmp_path):
+    path = tmp_path / "store"
+    write_structure_store(frame([zincblende('Zn', 'S')], "a"), path)
+    before = {name: os.stat(path / "chunk_00000" / name).st_mtime_ns for name in os.listdir(path / "chunk_00000")}
+    for batch in range(3):
+        write_structure_store(frame([zincblende('Cd', 'Te', a=6.5)], f"b{batch}"), path, append=True)
+    assert {name: os.stat(path / "chunk_00000" / name).st_mtime_ns for name in os.listdir(path / "chunk_00000")} == before
+    assert StructureStore(path).get("b2-0") == zincblende('Cd', 'Te', a=6.5)
+    # Without append the store starts over
+    write_structure_store(frame([zincblende('Zn', 'S')], "c"), path)
+    assert sorted(os.listdir(path)) == ["chunk_00000", "index.json"]
+    assert list(StructureStore(path).table['material_id']) == ["c-0"]
+
+
+def test_rejects_what_it_cannot_pack(tmp_path):
+    disordered = Structure(Lattice.cubic(4), [{'Zn': 0.5, 'Cd': 0.5}], [[0, 0, 0]])
+    with pytest.raises(ValueError, match="Disordered"):
+        write_structure_store(frame([disordered]), tmp_path / "disordered")
+    dummy = Structure(Lattice.cubic(4), [DummySpecies('X')], [[0, 0, 0]])
+    with pytest.raises(ValueError, match="dummy"):
+        write_structure_store(frame([dummy]), tmp_path / "dummy")
+
+
+def test_opens_and_appends_to_stores_packed_before_chunks(tmp_path):
+    # The old layout: one set of files directly in the directory, without oxidation
+    # states or site properties
+    path = tmp_path / "store"
+    os.makedirs(path)
+    structure = zincblende('Zn', 'S')
+    arrays, _ = pack_structures([structure.as_dict()])
+    for name in ['lattices', 'site_offsets', 'species', 'frac_coords']:
+        np.save(path / f"{name}.npy", arrays[name])
+    frame([structure]).drop(columns=['structure']).to_parquet(path / "table.parquet")
+    store = StructureStore(path)
+    assert store.get("mp-0") == structure
+    assert np.isclose(store.get("mp-0").lattice.a, 5.6)
+
+    charged = zincblende('Zn', 'S')
+    charged.add_oxidation_state_by_element({'Zn': 2, 'S': -2})
+    write_structure_store(frame([charged], "b"), path, append=True)
+    store = StructureStore(path, columns=['material_id'])
+    assert list(store.table['material_id']) == ["mp-0", "b-0"]
+    assert store.get("mp-0") == structure and store.get("b-0") == charged
+
+
+def test_csv_without_structures_reads_them_from_the_store(tmp_path):
+    structures = [zincblende('Zn', 'S'), zincblende('Cd', 'Te', a=6.5)]
+    df = frame(structures)
+    csv_path = str(tmp_path / "snapshot.csv")
+    write_structure_store(df, store_path_for(csv_path))
+    df.drop(columns=['structure']).to_csv(csv_path, index=False)
+    assert list(read_csv_with_structures(csv_path)['structure']) == structures
+    with pytest.raises(ValueError, match="no structure column"):
+        read_csv_with_structures(csv_path, use_store=False)
@@ -0,0 +1,42 @@
+import contextlib
+import numpy as np
+import pytest
+import training
+from training import cross_validate_grid, leaderboard
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    # Records the OpenMP cap each fit ran under
+    seen = []
+
+    @contextlib.contextmanager
+    def recording(limits=None, user_api=None):
+        seen.append((limits, user_api))
+        yield
+
+    monkeypatch.setattr(training, 'threadpool_limits', recording)
+    return seen
+
+
+def data(n=120):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n, 3))
+    y = X[:, 0] * 2 + rng.normal(scale=0.1, size=n)
+    groups = np.repeat(np.arange(12), n // 12)
+    return X, y, groups
+
+
+def test_parallel_fits_run_single_threaded_inside(limits):
+    X, y, groups = data()
+    folds, candidates = cross_validate_grid(X, y, groups, param_grid={'max_iter': [20, 40]}, n_splits=3,
+                                            n_jobs=2, backend='threading', estimator='hist_gradient_boosting')
+    assert limits == [(1, 'openmp')] * 6
+    assert len(folds) == 6 and len(candidates) == 2
+    assert leaderboard(folds, 'regression')['mse_mean'].iloc[0] < 1
+
+
+def test_serial_fits_keep_every_thread(limits):
+    X, y, groups = data()
+    cross_validate_grid(X, y, groups, param_grid={'n_estimators': [10]}, n_splits=3, n_jobs=1)
+    assert limits == [(None, 'openmp')] * 3
@@ -0,0 +1,171 @@
+import time
+import itertools
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
+from sklearn.base import clone
+from sklearn.model_selection import GroupKFold
+from sklearn.ensemble import (RandomForestRegressor, RandomForestClassifier,
+                              HistGradientBoostingRegressor, HistGradientBoostingClassifier)
+from sklearn.metrics import (mean_squared_error, mean_absolute_error, r2_score,
+                             accuracy_score, f1_score, balanced_accuracy_score)
+from instrumentation import get_profiler
+
+# Estimator backends. 'binned' ones are trained on the dataset's precomputed
+# uint8 bin codes instead of the scaled floats
+ESTIMATORS = {
+    'random_forest': {
+        'regression': lambda random_state: RandomForestRegressor(random_state=random_state, n_jobs=1),
+        'classification': lambda random_state: RandomForestClassifier(random_state=random_state, n_jobs=1),
+        'binned': False
+    },
+    'hist_gradient_boosting': {
+        # Early stopping on a held-out 10% of each training fold
+        'regression': lambda random_state: HistGradientBoostingRegressor(
+            max_iter=500, early_stopping=True, validation_fraction=0.1, n_iter_no_change=10, random_state=random_state
+        ),
+        'classification': lambda random_state: HistGradientBoostingClassifier(
+            max_iter=500, early_stopping=True, validation_fraction=0.1, n_iter_no_change=10, random_state=random_state
+        ),
+        'binned': True
+    }
+}
+
+# Default search spaces, kept small so a full grid x 5 folds still runs in seconds
+PARAM_GRIDS = {
+    'random_forest': {
+        'regression': {
+            'n_estimators': [100, 300],
+            'max_depth': [None, 10],
+            'min_samples_leaf': [1, 3],
+            'max_features': [1.0, 'sqrt']
+        },
+        'classification': {
+            'n_estimators': [100, 300],
+            'max_depth': [None, 10],
+            'min_samples_leaf': [1, 3],
+            'class_weight': [None, 'balanced']
+        }
+    },
+    'hist_gradient_boosting': {
+        'regression': {
+            'learning_rate': [0.05, 0.1],
+            'max_leaf_nodes': [15, 31],
+            'min_samples_leaf': [5, 20],
+            'l2_regularization': [0.0, 1.0]
+        },
+        'classification': {
+            'learning_rate': [0.05, 0.1],
+            'max_leaf_nodes': [15, 31],
+            'min_samples_leaf': [5, 20],
+            'class_weight': [None, 'balanced']
+        }
+    }
+}
+
+# Metric the leaderboard is ranked by, and whether lower is better
+RANK_METRIC = {'regression': ('mse', True), 'classification': ('f1', False)}
+
+
+def make_estimator(task, estimator='random_forest', random_state=42):
+    # Forests get n_jobs=1 inside each fit: the parallelism is across fits, not trees
+    return ESTIMATORS[estimator][task](random_state)
+
+
+def uses_bins(estimator):
+    return ESTIMATORS[estimator]['binned']
+
+
+def param_combinations(param_grid):
+    keys = sorted(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[key] for key in keys))]
+
+
+def grouped_folds(groups, n_splits=5):
+    # Every chemsys lands wholly in one test fold, so scores measure how well
+    # the model carries over to chemical systems it hasn't seen
+    groups = np.asarray(groups)
+    n_splits = min(n_splits, len(np.unique(groups)))
+    dummy = np.zeros(len(groups))
+    return list(GroupKFold(n_splits=n_splits).split(dummy, groups=groups))
+
+
+def score_fold(task, y_true, y_pred):
+    if task == 'regression':
+        return {
+            'mse': mean_squared_error(y_true, y_pred),
+            'mae': mean_absolute_error(y_true, y_pred),
+            'r2': r2_score(y_true, y_pred) if len(np.unique(y_true)) > 1 else np.nan
+        }
+    return {
+        'accuracy': accuracy_score(y_true, y_pred),
+        'balanced_accuracy': balanced_accuracy_score(y_true, y_pred),
+        'f1': f1_score(y_true, y_pred, zero_division=0)
+    }
+
+
+def fit_fold(estimator, task, X, y, train_idx, test_idx, inner_threads=None):
+    # X is the one scaled (or binned) matrix shared by all folds; folds only index into it.
+    # inner_threads caps the OpenMP pool HistGradientBoosting fits and predicts with. The
+    # OpenMP setting is per thread, so each job sets its own, whatever backend it runs on
+    with threadpool_limits(limits=inner_threads, user_api='openmp'):
+        start = time.perf_counter()
+        estimator.fit(X[train_idx], y[train_idx])
+        fit_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        y_pred = estimator.predict(X[test_idx])
+        predict_s = time.perf_counter() - start
+
+    result = dict(score_fold(task, y[test_idx], y_pred), fit_s=fit_s, predict_s=predict_s,
+                  n_train=len(train_idx), n_test=len(test_idx))
+    if hasattr(estimator, 'n_iter_'):
+        # Boosting rounds actually used after early stopping
+        result['n_iter'] = estimator.n_iter_
+    return result
+
+
+def cross_validate_grid(X, y, groups, task='regression', param_grid=None, n_splits=5,
+                        n_jobs=-1, backend='threading', random_state=42, estimator='random_forest'):
+    # Fits every (params, fold) pair in one joblib batch. 'threading' shares X
+    # without copies; 'loky' runs separate processes and memory-maps large X
+    X = np.ascontiguousarray(X) if uses_bins(estimator) else np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    folds = grouped_folds(groups, n_splits)
+    candidates = param_combinations(PARAM_GRIDS[estimator][task] if param_grid is None else param_grid)
+    base = make_estimator(task, estimator, random_state)
+    groups = np.asarray(groups)
+
+    tasks = [(i, params, fold, train_idx, test_idx)
+             for i, params in enumerate(candidates)
+             for fold, (train_idx, test_idx) in enumerate(folds)]
+    print(f"🔁 {estimator}: {len(candidates)} candidates x {len(folds)} grouped folds = {len(tasks)} fits ({backend}, n_jobs={n_jobs})")
+
+    # Parallel across fits means one thread inside each fit, otherwise every job would start
+    # a full OpenMP pool. Run serially, a fit gets all the cores to itself
+    inner_threads = None if n_jobs == 1 else 1
+    with get_profiler().stage('cross_validate'):
+        results = Parallel(n_jobs=n_jobs, backend=backend)(
+            delayed(fit_fold)(clone(base).set_params(**params), task, X, y, train_idx, test_idx, inner_threads)
+            for _, params, _, train_idx, test_idx in tasks
+        )
+
+    rows = []
+    for (i, params, fold, _, test_idx), result in zip(tasks, results):
+        held_out = ','.join(sorted(np.unique(groups[test_idx]).astype(str)))
+        rows.append(dict(candidate=i, params=str(params), fold=fold, held_out=held_out, **result))
+    return pd.DataFrame(rows), candidates
+
+
+def leaderboard(fold_results, task):
+    # One row per candidate: mean/std of each fold metric plus fit times, best first
+    metric, lower_is_better = RANK_METRIC[task]
+    metrics = [column for column in fold_results.columns
+               if column not in ('candidate', 'params', 'fold', 'held_out', 'n_train', 'n_test')]
+    board = fold_results.groupby(['candidate', 'params'])[metrics].agg(['mean', 'std'])
+    board.columns = [f"{name}_{stat}" for name, stat in board.columns]
+    board['total_fit_s'] = fold_results.groupby(['candidate', 'params'])['fit_s'].sum()
+    board = board.sort_values(f"{metric}_mean", ascending=lower_is_better).reset_index()
+    board.insert(0, 'rank', np.arange(1, len(board) + 1))
+    return board
@@ -1,87 +1,143 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+from plotting import PlotRenderer
 from sklearn.cluster import KMeans
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
-from scipy.stats import pearsonr, spearmanr
+from instrumentation import get_profiler, timed
+from clustering import clustering_matrix, standardize_chunked, project_chunked, sweep_k, best_k, predict_chunked
+from material_store import MaterialStore
+from correlation import correlation_matrices, correlation_table
+from dataset_loader import load_dataset
 from config import DATA_DIR
 
 class DataAnalyzer:
-    def __init__(self, filename):
+    def __init__(self, filename, plot_workers=None, use_plot_cache=True):
         self.filepath = os.path.join(DATA_DIR, filename)
-        self.df = pd.read_csv(self.filepath)
-        self.numeric_df = self.df.select_dtypes(include=['float64', 'int64'])
+        # Typed load without the structure column, repeat loads come from the parquet sidecar
+        self.df = load_dataset(self.filepath)
+        self.numeric_df = self.df.select_dtypes(include='number')
         self.scaler = StandardScaler()
+        self.renderer = PlotRenderer(n_workers=plot_workers, use_cache=use_plot_cache)
 
-    def correlation_analysis(self):
+    @timed('correlation_analysis')
+    def correlation_analysis(self, targets=('band_gap', 'formation_energy_per_atom'), bootstrap=0):
         print("\n📊 Correlation Analysis...")
-        correlations = self.numeric_df.corr()
-        plt.figure(figsize=(10, 8))
-        sns.heatmap(correlations, annot=True, cmap='coolwarm', fmt='.2f', linewidths=0.5)
-        plt.title('Correlation Matrix')
-        plt.savefig(f"{DATA_DIR}/correlation_matrix.png")
-        plt.close()
+        correlations, _, _ = correlation_matrices(self.numeric_df.to_numpy(dtype=float))
+        self.renderer.render([
+            ('heatmap', f"{DATA_DIR}/correlation_matrix.png",
+             {'matrix': correlations, 'labels': self.numeric_df.columns.to_numpy()},
+             {'title': 'Correlation Matrix'})
+        ])
+
+        # Every feature against each target in one pass, with p-values (and CIs when bootstrapping)
+        table = correlation_table(self.numeric_df, targets=list(targets), bootstrap=bootstrap)
+        os.makedirs(f"{DATA_DIR}/reports", exist_ok=True)
+        table.to_csv(f"{DATA_DIR}/reports/correlations.csv", index=False)
+        print(table.head(10)[['feature', 'target', 'n', 'pearson_r', 'pearson_q', 'spearman_r', 'spearman_q']].to_string(index=False))
 
         # Pearson and Spearman correlations for Band Gap vs Formation Energy
-        pearson_corr, _ = pearsonr(self.df['formation_energy_per_atom'], self.df['band_gap'])
-        spearman_corr, _ = spearmanr(self.df['formation_energy_per_atom'], self.df['band_gap'])
-        print(f"Pearson correlation: {pearson_corr:.3f}")
-        print(f"Spearman correlation: {spearman_corr:.3f}")
+        pair = table[(table['feature'] == 'formation_energy_per_atom') & (table['target'] == 'band_gap')]
+        if len(pair):
+            print(f"Pearson correlation: {pair['pearson_r'].iloc[0]:.3f} (p={pair['pearson_p'].iloc[0]:.2g})")
+            print(f"Spearman correlation: {pair['spearman_r'].iloc[0]:.3f} (p={pair['spearman_p'].iloc[0]:.2g})")
+        return table
 
-    def clustering_analysis(self):
+    @timed('clustering_analysis')
+    def clustering_analysis(self, scalable=False, ks=range(2, 11), chunk_size=10000, sample_size=5000,
+                            n_jobs=-1, store_path=None, label_set='kmeans'):
         print("\n📊 Clustering Analysis...")
 
-        # Standardize features for clustering
-        scaled_data = self.scaler.fit_transform(self.numeric_df)
+        # All-NaN and constant columns are dropped, other gaps filled with the column mean
+        X, columns = clustering_matrix(self.numeric_df)
+
+        if scalable:
+            # Chunked standardize -> IncrementalPCA -> MiniBatchKMeans for every k in parallel.
+            # X isn't needed unscaled, so it's standardized in place
+            scaled_data = standardize_chunked(X, chunk_size, copy=False)
+            reduced_data, pca = project_chunked(scaled_data, n_components=2, chunk_size=chunk_size)
+            scores, models = sweep_k(scaled_data, ks=ks, sample_size=sample_size, chunk_size=chunk_size, n_jobs=n_jobs)
+            k = best_k(scores)
+            print(scores.to_string(index=False))
+            print(f"🏆 Best k by silhouette on a {min(sample_size, len(X))}-row sample: {k}")
+            os.makedirs(f"{DATA_DIR}/reports", exist_ok=True)
+            scores.to_csv(f"{DATA_DIR}/reports/cluster_sweep.csv", index=False)
+            clusters = predict_chunked(models[k], scaled_data, chunk_size)
+        else:
+            # Standardize features for clustering
+            scaled_data = self.scaler.fit_transform(X)
 
-        # PCA for visualization
-        pca = PCA(n_components=2)
-        reduced_data = pca.fit_transform(scaled_data)
+            # PCA for visualization
+            pca = PCA(n_components=2)
+            reduced_data = pca.fit_transform(scaled_data)
 
-        # Apply KMeans clustering
-        kmeans = KMeans(n_clusters=3, random_state=42)
-        clusters = kmeans.fit_predict(scaled_data)
+            # Apply KMeans clustering
+            k = 3
+            kmeans = KMeans(n_clusters=k, random_state=42)
+            clusters = kmeans.fit_predict(scaled_data)
         self.df['cluster'] = clusters
 
+        if store_path is not None and 'material_id' in self.df.columns:
+            with MaterialStore(store_path) as store:
+                n = store.save_clusters(label_set, self.df['material_id'], clusters, k)
+            print(f"💾 Saved {n} '{label_set}' cluster labels to {store_path}")
+
         # Plot PCA with clusters
-        plt.figure(figsize=(8, 6))
-        sns.scatterplot(x=reduced_data[:, 0], y=reduced_data[:, 1], hue=clusters, palette='viridis')
-        plt.xlabel('Principal Component 1')
-        plt.ylabel('Principal Component 2')
-        plt.title('PCA Clustering Analysis')
-        plt.savefig(f"{DATA_DIR}/pca_clustering.png")
-        plt.close()
+        self.renderer.render([
+            ('scatter', f"{DATA_DIR}/pca_clustering.png",
+             {'x': reduced_data[:, 0], 'y': reduced_data[:, 1], 'hue': clusters},
+             {'xlabel': 'Principal Component 1', 'ylabel': 'Principal Component 2', 'title': 'PCA Clustering Analysis'})
+        ])
+        return clusters
 
+    @timed('trend_analysis')
     def trend_analysis(self):
         print("\n📊 Trend Analysis...")
 
         # Relationships with Band Gap
         features = ['avg_bond_length', 'electronegativity_diff', 'symmetry_deviation']
+        figures = []
         for feature in features:
-            plt.figure(figsize=(8, 6))
-            sns.scatterplot(x=self.df[feature], y=self.df['band_gap'], alpha=0.6)
-            plt.xlabel(feature)
-            plt.ylabel('Band Gap (eV)')
-            plt.title(f'Band Gap vs {feature}')
-            plt.savefig(f"{DATA_DIR}/band_gap_vs_{feature}.png")
-            plt.close()
+            figures.append(('scatter', f"{DATA_DIR}/band_gap_vs_{feature}.png",
+                            {'x': self.df[feature].to_numpy(dtype=float), 'y': self.df['band_gap'].to_numpy(dtype=float)},
+                            {'xlabel': feature, 'ylabel': 'Band Gap (eV)', 'title': f'Band Gap vs {feature}'}))
 
         # Relationships with Formation Energy
         for feature in features:
-            plt.figure(figsize=(8, 6))
-            sns.scatterplot(x=self.df[feature], y=self.df['formation_energy_per_atom'], alpha=0.6)
-            plt.xlabel(feature)
-            plt.ylabel('Formation Energy per Atom (eV)')
-            plt.title(f'Formation Energy vs {feature}')
-            plt.savefig(f"{DATA_DIR}/formation_energy_vs_{feature}.png")
-            plt.close()
+            figures.append(('scatter', f"{DATA_DIR}/formation_energy_vs_{feature}.png",
+                            {'x': self.df[feature].to_numpy(dtype=float),
+                             'y': self.df['formation_energy_per_atom'].to_numpy(dtype=float)},
+                            {'xlabel': feature, 'ylabel': 'Formation Energy per Atom (eV)',
+                             'title': f'Formation Energy vs {feature}'}))
+
+        # All six render side by side in the renderer's process pool
+        self.renderer.render(figures)
 
         print("✅ Trend visualizations saved!")
 
-if __name__ == "__main__":
-    analyzer = DataAnalyzer("chalcogenides_20250106_1734.csv")
-    analyzer.correlation_analysis()
-    analyzer.clustering_analysis()
+def main(argv=None):
+    import argparse
+    from material_store import DEFAULT_STORE_PATH
+
+    parser = argparse.ArgumentParser(description="Correlation, clustering and trend plots for a collected CSV")
+    parser.add_argument('filename', nargs='?', default="chalcogenides_20250106_1734.csv")
+    parser.add_argument('--scalable', action='store_true', help="Chunked IncrementalPCA/MiniBatchKMeans with a k sweep")
+    parser.add_argument('--k-max', type=int, default=10)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--sample-size', type=int, default=5000, help="Rows used for the silhouette score")
+    parser.add_argument('--bootstrap', type=int, default=0, help="Bootstrap resamples for correlation CIs")
+    parser.add_argument('--store', nargs='?', const=DEFAULT_STORE_PATH, help="Save cluster labels to the material store")
+    args = parser.parse_args(argv)
+
+    analyzer = DataAnalyzer(args.filename)
+    analyzer.correlation_analysis(bootstrap=args.bootstrap)
+    analyzer.clustering_analysis(scalable=args.scalable, ks=range(2, args.k_max + 1), chunk_size=args.chunk_size,
+                                 sample_size=args.sample_size, store_path=args.store,
+                                 label_set='minibatch_kmeans' if args.scalable else 'kmeans')
     analyzer.trend_analysis()
+    analyzer.renderer.close()
+    get_profiler().print_summary()
+    get_profiler().save_report(f"{DATA_DIR}/reports", "analysis")
+
+
+if __name__ == "__main__":
+    main()